@@ -0,0 +1,70 @@
+"""
+Measures the per request Python overhead of GET /book across filter combinations, building
+the statement on every request against reusing it from the statement cache.
+
+    python -m benchmarks.bench_book_filters [number_of_requests]
+"""
+import itertools
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.cache import StatementCache
+from sql_alchemy_lambda.dbmodels import BaseModel, Book
+from sql_alchemy_lambda.lambda_handler import get_book
+
+FILTERS = {"id": "7", "title": "Title 7", "author": "Author 7", "publisher": "Publisher", "year": "1907"}
+
+
+def build_session(number_of_books: int = 1000):
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(
+        Book.__table__.insert(),
+        [
+            {"id": i, "title": "Title {}".format(i), "author": "Author {}".format(i % 100),
+             "publisher": "Publisher", "year": 1900 + i % 120}
+            for i in range(1, number_of_books + 1)
+        ],
+    )
+    session.commit()
+    return session
+
+
+def requests(number_of_requests: int) -> list:
+    # Every one of the 2^5 combinations of the equality filters, round robin
+    combinations = [
+        {name: FILTERS[name] for name in names}
+        for size in range(len(FILTERS) + 1)
+        for names in itertools.combinations(FILTERS, size)
+    ]
+    return [dict(combinations[i % len(combinations)], limit="10") for i in range(number_of_requests)]
+
+
+def timed(session, params_list: list, statements: StatementCache) -> list:
+    latencies = []
+    for params in params_list:
+        start = time.perf_counter()
+        get_book(session, params, statements=statements)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main(number_of_requests: int = 5000):
+    session = build_session()
+    params_list = requests(number_of_requests)
+    for name, statements in [("built per request", StatementCache(max_entries=0)), ("statement cache", StatementCache())]:
+        timed(session, params_list[:100], statements)
+        latencies = timed(session, params_list, statements)
+        print("{:<20} p50 {:>7.1f} us  mean {:>7.1f} us  {}".format(
+            name, statistics.median(latencies) * 1e6, statistics.mean(latencies) * 1e6, statements.stats()
+        ))
+    session.close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
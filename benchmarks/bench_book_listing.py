@@ -0,0 +1,63 @@
+"""
+Compares the ORM ``as_dict()`` book listing against the column projection path used by get_book.
+
+    python -m benchmarks.bench_book_listing [number_of_books]
+"""
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book
+from sql_alchemy_lambda.lambda_handler import BOOK_COLUMNS, BOOK_FIELDS
+
+
+def build_session(number_of_books: int):
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    with Session() as session:
+        session.execute(
+            Book.__table__.insert(),
+            [
+                {"id": i, "title": "Title {}".format(i), "author": "Author {}".format(i % 100),
+                 "publisher": "Publisher", "year": 1900 + i % 120}
+                for i in range(1, number_of_books + 1)
+            ],
+        )
+        session.commit()
+    return Session
+
+
+def orm_as_dict(Session) -> list:
+    with Session() as session:
+        return [book.as_dict() for book in session.query(Book).order_by(Book.id)]
+
+
+def column_projection(Session) -> list:
+    with Session() as session:
+        query = session.query(*BOOK_COLUMNS.values()).order_by(Book.id)
+        return [dict(zip(BOOK_FIELDS, row)) for row in query]
+
+
+def timed(function, Session, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(Session)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(number_of_books: int = 50000):
+    Session = build_session(number_of_books)
+    assert orm_as_dict(Session) == column_projection(Session)
+    for name, function in [("orm as_dict", orm_as_dict), ("column projection", column_projection)]:
+        seconds = timed(function, Session)
+        print("{:<20} {:>10.1f} ms {:>12.0f} rows/s".format(name, seconds * 1000, number_of_books / seconds))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
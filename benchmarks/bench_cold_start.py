@@ -0,0 +1,167 @@
+"""
+Cold starts of both lambda handlers. Every run is a fresh interpreter, started with -X importtime,
+that imports the handler and answers one request, like the first invocation of a new container.
+Reports the import time, the time to the first response and the packages that took longest to
+import, the min and median over the runs, and whether the fastest run kept within its budget.
+
+    python -m benchmarks.bench_cold_start [runs]
+
+The handlers' tests check the budgets too when COLD_START_BUDGET=1 is set, they are left out of
+regular runs since wall clock times depend on the machine.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the fresh interpreter, prints its measurements as JSON on the last line of stdout
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from {module} import handler
+imported = time.perf_counter()
+response = handler(json.loads(sys.argv[1]), None)
+done = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - start) * 1000,
+    "first_response_ms": (done - start) * 1000,
+    "status_code": response["statusCode"],
+    "modules": sorted(sys.modules),
+}}))
+"""
+
+# GET of a route that doesn't exist, which never needs dynamodb
+LAMBDA_CODE_EVENT = {"httpMethod": "GET", "pathParameters": {"proxy": "missing"}, "body": None}
+BOOK_EVENT = {
+    "httpMethod": "GET",
+    "pathParameters": {"proxy": "book"},
+    "queryStringParameters": {"limit": "10"},
+    "body": None,
+}
+
+# Milliseconds the fastest run may take, by handler and measurement. Loading boto3 alone takes about
+# twice the lambdaCode budget, sqlalchemy itself takes most of the sql_alchemy_lambda one.
+BUDGETS_MS = {
+    "lambdaCode.lambda_handler": ("import_ms", 120),
+    "sql_alchemy_lambda.lambda_handler": ("first_response_ms", 1500),
+}
+
+
+def parse_importtime(stderr: str) -> Counter:
+    """
+    Args:
+        stderr (str): -X importtime output
+    Returns:
+        Counter: microseconds of import work by top level package, self times summed
+    """
+    packages = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        packages[name.strip().split(".")[0]] += int(self_us)
+    return packages
+
+
+def cold_start(module: str, event: dict, env: dict = None, runs: int = 5) -> dict:
+    """
+        Runs the handler of ``module`` cold, ``runs`` times
+    Args:
+        module (str): handler module, e.g. "lambdaCode.lambda_handler"
+        event (dict): the first request
+        env (dict): environment variables on top of this process's
+        runs (int): fresh interpreters to start
+    Returns:
+        dict: min and median of import_ms, first_response_ms and process_ms (interpreter start
+        to exit), the median import microseconds of the top packages, the status code and the
+        modules loaded by the first response
+    """
+    samples = []
+    packages = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD.format(module=module), json.dumps(event)],
+            cwd=ROOT,
+            env=dict(os.environ, **(env or {})),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        process_ms = (time.perf_counter() - start) * 1000
+        sample = json.loads(completed.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = process_ms
+        samples.append(sample)
+        packages.append(parse_importtime(completed.stderr))
+
+    report = {"module": module, "runs": runs, "status_code": samples[-1]["status_code"]}
+    for key in ("import_ms", "first_response_ms", "process_ms"):
+        values = [sample[key] for sample in samples]
+        report[key] = {"min": round(min(values), 1), "median": round(statistics.median(values), 1)}
+    names = set().union(*packages)
+    medians = {name: statistics.median(run[name] for run in packages) for name in names}
+    report["top_packages_us"] = dict(sorted(medians.items(), key=lambda item: -item[1])[:10])
+    report["modules"] = samples[-1]["modules"]
+    return report
+
+
+def make_book_database(path: str) -> str:
+    """
+        Creates an empty books database for the sql_alchemy_lambda handler
+    Returns:
+        str: SQLALCHEMY_DATABASE_URI
+    """
+    from sqlalchemy import create_engine
+
+    from sql_alchemy_lambda.dbmodels import BaseModel
+
+    uri = "sqlite:///" + path
+    engine = create_engine(uri)
+    BaseModel.metadata.create_all(engine)
+    engine.dispose()
+    return uri
+
+
+def within_budget(report: dict) -> bool:
+    """
+    Args:
+        report (dict): from cold_start
+    Returns:
+        bool: True if the fastest run kept within the handler's budget, or it has none
+    """
+    if report["module"] not in BUDGETS_MS:
+        return True
+    key, budget = BUDGETS_MS[report["module"]]
+    return report[key]["min"] < budget
+
+
+def print_report(report: dict):
+    print("{} ({} runs, status {})".format(report["module"], report["runs"], report["status_code"]))
+    for key in ("import_ms", "first_response_ms", "process_ms"):
+        print("  {:<18} min {:>7.1f} ms   median {:>7.1f} ms".format(key, report[key]["min"], report[key]["median"]))
+    if report["module"] in BUDGETS_MS:
+        key, budget = BUDGETS_MS[report["module"]]
+        status = "ok" if within_budget(report) else "OVER"
+        print("  {:<18} budget {:>5} ms   {}".format(key, budget, status))
+    print("  modules loaded: {}".format(len(report["modules"])))
+    for name, us in report["top_packages_us"].items():
+        print("    {:<24} {:>8.1f} ms".format(name, us / 1000))
+
+
+def main(runs: int = 5):
+    print_report(cold_start("lambdaCode.lambda_handler", LAMBDA_CODE_EVENT, runs=runs))
+    with tempfile.TemporaryDirectory() as directory:
+        uri = make_book_database(os.path.join(directory, "books.db"))
+        print_report(cold_start("sql_alchemy_lambda.lambda_handler", BOOK_EVENT, {"SQLALCHEMY_DATABASE_URI": uri}, runs))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
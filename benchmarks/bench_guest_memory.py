@@ -0,0 +1,107 @@
+"""
+Holds guests in memory the way a bulk import does, comparing the original dict based Guest with
+the slotted one, and times building their dynamodb items. Memory is what the guests add on top of
+the strings of their input rows.
+
+    python -m benchmarks.bench_guest_memory [number_of_guests]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from boto3.dynamodb.types import TypeSerializer
+
+from lambdaCode.models.guest import Guest
+
+
+class LegacyGuest(object):
+    # Guest as it was before __slots__
+    def __init__(self, first_name, last_name, phone_number, email_address, total_number_of_guests_attending, not_attending):
+        self.first_name = first_name
+        self.first_name_lower = first_name.lower()
+        self.last_name = last_name
+        self.last_name_lower = last_name.lower()
+        self.phone_number = phone_number
+        self.email_address = email_address
+        self.total_number_of_guests_attending = total_number_of_guests_attending
+        self.last_updated = datetime.now()
+        self.not_attending = not_attending
+
+
+def legacy_to_item(guest: LegacyGuest, serializer: TypeSerializer) -> dict:
+    # guest_to_item plus the TypeSerializer pass the boto3 resource made on every write
+    item = {
+        "name": guest.first_name_lower + " " + guest.last_name_lower,
+        "g_first_name": guest.first_name,
+        "g_last_name": guest.last_name,
+        "g_email_address": guest.email_address,
+        "g_phone_number": guest.phone_number,
+        "total_number_of_guests_attending": guest.total_number_of_guests_attending,
+        "last_updated": guest.last_updated.strftime("%m-%d-%Y, %H:%M:%S"),
+        "not_attending": guest.not_attending,
+    }
+    return {key: serializer.serialize(value) for key, value in item.items()}
+
+
+def make_rows(number_of_guests: int) -> list:
+    return [
+        (
+            "First{}".format(i),
+            "Last{}".format(i % 1000),
+            "+1202555{}".format(str(i % 10000).zfill(4)),
+            "guest{}@email.com".format(i),
+            i % 5,
+            i % 3 == 0,
+        )
+        for i in range(number_of_guests)
+    ]
+
+
+def measure(guest_class, rows: list) -> tuple:
+    """
+    Returns:
+        tuple: bytes taken by the guests on top of their input strings, and seconds to build them
+    """
+    gc.collect()
+    tracemalloc.start()
+    guests = [guest_class(*row) for row in rows]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del guests
+    gc.collect()
+    start = time.perf_counter()
+    guests = [guest_class(*row) for row in rows]
+    seconds = time.perf_counter() - start
+    del guests
+    return size, seconds
+
+
+def main(number_of_guests: int = 1000000):
+    rows = make_rows(number_of_guests)
+    for name, guest_class in (("dict", LegacyGuest), ("slotted", Guest)):
+        size, seconds = measure(guest_class, rows)
+        print("{:>8} guests  {:<8} {:8.1f} MB  {:6.1f} bytes/guest  built in {:6.2f} s".format(
+            number_of_guests, name, size / 2 ** 20, size / number_of_guests, seconds
+        ))
+
+    sample = rows[:100000]
+    serializer = TypeSerializer()
+    legacy_guests = [LegacyGuest(*row) for row in sample]
+    start = time.perf_counter()
+    for guest in legacy_guests:
+        legacy_to_item(guest, serializer)
+    legacy_seconds = time.perf_counter() - start
+    guests = [Guest(*row) for row in sample]
+    start = time.perf_counter()
+    for guest in guests:
+        guest.to_item()
+    seconds = time.perf_counter() - start
+    print("{:>8} items   TypeSerializer {:6.2f} us/item  to_item {:6.2f} us/item".format(
+        len(sample), legacy_seconds / len(sample) * 1e6, seconds / len(sample) * 1e6
+    ))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,90 @@
+"""
+Validates synthetic RSVP bodies with the original per field validate_guest and with the
+compiled GUEST_SCHEMA batch validator.
+
+    python -m benchmarks.bench_guest_validation [number_of_guests]
+"""
+import sys
+import time
+
+from lambdaCode.lambda_handler import validate_guests
+from lambdaCode.models.guest import Guest
+
+PHONE_FORMATS = ("1{}{}{}", "({}) {}-{}", "{}.{}.{}", "+1 {} {} {}")
+
+
+def make_bodies(number_of_guests: int) -> list:
+    return [
+        {
+            "first_name": " First{} ".format(i),
+            "last_name": "Last{}".format(i % 1000),
+            "email_address": "guest{}@email.com".format(i),
+            "phone_number": PHONE_FORMATS[i % 4].format(200 + i % 800, 555, str(i % 10000).zfill(4)),
+            "total_number_of_guests_attending": str(i % 5),
+            "not_attending": "false" if i % 3 else "true",
+        }
+        for i in range(number_of_guests)
+    ]
+
+
+def legacy_validate_guest(body: dict) -> Guest:
+    # validate_guest as it was before the schema, bool("false") and all
+    def validate_str_section(section):
+        if section in body and body[section] is not None and body[section].strip() != "":
+            return body[section].strip()
+        return None
+
+    first_name = validate_str_section("first_name")
+    if first_name is None:
+        raise ValueError("first_name: is required")
+    last_name = validate_str_section("last_name")
+    if last_name is None:
+        raise ValueError("last_name: is required")
+    email_address = validate_str_section("email_address")
+    phone_number = None
+    if "phone_number" in body and type(body["phone_number"]) == str and body["phone_number"].strip() != "":
+        phone_number = "".join(filter(lambda x: x.isdigit(), body["phone_number"]))
+        if phone_number.startswith("1"):
+            phone_number = phone_number[1::]
+        if len(phone_number) != 10:
+            phone_number = None
+    total = 0
+    if "total_number_of_guests_attending" in body and body["total_number_of_guests_attending"].strip() != "":
+        total = int("".join(filter(lambda x: x.isdigit(), body["total_number_of_guests_attending"])))
+    not_attending = validate_str_section("not_attending")
+    if not_attending is None:
+        raise ValueError("not_attending: is required and must be a bool")
+    return Guest(first_name, last_name, phone_number, email_address, total, bool(not_attending))
+
+
+def legacy_validate_guests(bodies: list) -> list:
+    guests = []
+    for body in bodies:
+        try:
+            guests.append(legacy_validate_guest(body))
+        except ValueError as e:
+            guests.append(e)
+    return guests
+
+
+def main(number_of_guests: int = 100000, repeat: int = 5):
+    bodies = make_bodies(number_of_guests)
+    errors = [guest for guest in validate_guests(bodies) if isinstance(guest, ValueError)]
+    assert len(errors) == 0, errors[0]
+    validators = (("per field", legacy_validate_guests), ("compiled", validate_guests))
+    # Alternating runs, so machine noise hits both validators
+    times = {name: [] for name, _ in validators}
+    for _ in range(repeat):
+        for name, validate in validators:
+            start = time.perf_counter()
+            validate(bodies)
+            times[name].append(time.perf_counter() - start)
+    for name, _ in validators:
+        seconds = min(times[name])
+        print("{:>7} guests  {:<9}  {:8.1f} ms  {:6.2f} us/guest".format(
+            number_of_guests, name, seconds * 1000, seconds / number_of_guests * 1e6
+        ))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,64 @@
+"""
+Times encoding books to JSON, with and without their reviews, on each available backend.
+
+    python -m benchmarks.bench_json_encoder [number_of_books] [reviews_per_book]
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import selectinload, sessionmaker
+
+from sql_alchemy_lambda import utilities
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, Review
+from sql_alchemy_lambda.utilities import dumps
+
+
+def load_books(number_of_books: int, reviews_per_book: int) -> list:
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(
+        Book.__table__.insert(),
+        [
+            {"id": i, "title": "Title {}".format(i), "author": "Author {}".format(i % 100),
+             "publisher": "Publisher", "year": 1900 + i % 120}
+            for i in range(1, number_of_books + 1)
+        ],
+    )
+    session.execute(
+        Review.__table__.insert(),
+        [
+            {"reviewer": "Reviewer {}".format(r), "rate": 1 + r % 5, "review": "Review text", "book_id": i}
+            for i in range(1, number_of_books + 1)
+            for r in range(reviews_per_book)
+        ],
+    )
+    session.commit()
+    # Reviews are loaded up front so the timings below measure encoding, not lazy loads
+    return session.query(Book).options(selectinload(Book.reviews)).order_by(Book.id).all()
+
+
+def timed(books: list, include: tuple, repeat: int = 5) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        dumps(books, include=include)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(number_of_books: int = 10000, reviews_per_book: int = 3):
+    books = load_books(number_of_books, reviews_per_book)
+    backends = ["stdlib"] + (["orjson"] if utilities.orjson is not None else [])
+    for backend in backends:
+        os.environ["JSON_BACKEND"] = backend
+        for label, include in [("books", ()), ("books + reviews", ("reviews",))]:
+            seconds = timed(books, include)
+            print("{:<8} {:<16} {:>10.1f} ms".format(backend, label, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,70 @@
+"""
+Reports GET /search query latency as the corpus grows, on the SQLite FTS5 backend.
+
+    python -m benchmarks.bench_search [number_of_books ...]
+"""
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, Review
+from sql_alchemy_lambda.lambda_handler import get_search
+from sql_alchemy_lambda.search import rebuild_search
+
+WORDS = ["dragon", "garden", "river", "night", "stone", "winter", "glass", "forest", "ember", "harbor",
+         "silver", "shadow", "crown", "storm", "echo", "meadow", "iron", "lantern", "tide", "orchard"]
+QUERIES = ["dragon", "silver river", "night storm", "lantern", "crown of iron", "meadow tide ember"]
+
+
+def build_session(number_of_books: int, reviews_per_book: int = 3):
+    rng = random.Random(42)
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(
+        Book.__table__.insert(),
+        [
+            {"id": i, "title": " ".join(rng.sample(WORDS, 3)), "author": "Author {}".format(i % 500),
+             "publisher": "Publisher", "year": 1900 + i % 120}
+            for i in range(1, number_of_books + 1)
+        ],
+    )
+    session.execute(
+        Review.__table__.insert(),
+        [
+            {"reviewer": "Reviewer", "rate": 1 + r, "review": " ".join(rng.sample(WORDS, 8)), "book_id": i}
+            for i in range(1, number_of_books + 1)
+            for r in range(reviews_per_book)
+        ],
+    )
+    session.commit()
+    return session
+
+
+def main(*sizes: int):
+    for number_of_books in sizes or (1000, 10000, 100000):
+        session = build_session(number_of_books)
+        start = time.perf_counter()
+        rebuild_search(session)
+        session.commit()
+        index_seconds = time.perf_counter() - start
+        latencies = []
+        for _ in range(5):
+            for q in QUERIES:
+                start = time.perf_counter()
+                get_search(session, {"q": q, "limit": "20"})
+                latencies.append(time.perf_counter() - start)
+        print(
+            "{:>8} books  index {:>8.1f} ms  query p50 {:>7.2f} ms  max {:>7.2f} ms".format(
+                number_of_books, index_seconds * 1000, statistics.median(latencies) * 1000, max(latencies) * 1000
+            )
+        )
+        session.close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,74 @@
+"""
+Reports GET /book/top latency over 1M synthetic reviews on SQLite, served from the
+book_rating aggregates and ix_book_rating_average.
+
+    python -m benchmarks.bench_top_books [number_of_reviews] [number_of_books]
+"""
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, Review
+from sql_alchemy_lambda.lambda_handler import get_top_books
+from sql_alchemy_lambda.ratings import rebuild_ratings
+
+PARAMS = [{"n": "10"}, {"n": "100"}, {"n": "10", "min_reviews": "10"}, {"n": "10", "min_reviews": "25"}]
+
+
+def build_session(number_of_reviews: int, number_of_books: int):
+    rng = random.Random(42)
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.execute(
+        Book.__table__.insert(),
+        [
+            {"id": i, "title": "Title {}".format(i), "author": "Author {}".format(i % 500),
+             "publisher": "Publisher", "year": 1900 + i % 120}
+            for i in range(1, number_of_books + 1)
+        ],
+    )
+    # Skewed so some books have many reviews and most have a few
+    session.execute(
+        Review.__table__.insert(),
+        [
+            {"reviewer": "Reviewer", "rate": rng.randint(1, 5), "review": "Review",
+             "book_id": min(int(rng.paretovariate(1.2)), number_of_books)}
+            if r % 2 else
+            {"reviewer": "Reviewer", "rate": rng.randint(1, 5), "review": "Review",
+             "book_id": rng.randint(1, number_of_books)}
+            for r in range(number_of_reviews)
+        ],
+    )
+    session.commit()
+    return session
+
+
+def main(number_of_reviews: int = 1000000, number_of_books: int = 100000):
+    start = time.perf_counter()
+    session = build_session(number_of_reviews, number_of_books)
+    print("loaded {} reviews of {} books in {:.1f} s".format(
+        number_of_reviews, number_of_books, time.perf_counter() - start
+    ))
+    start = time.perf_counter()
+    books = rebuild_ratings(session)
+    session.commit()
+    print("rebuild_ratings: {} books in {:.0f} ms".format(books, (time.perf_counter() - start) * 1000))
+    for params in PARAMS:
+        latencies = []
+        for _ in range(20):
+            start = time.perf_counter()
+            get_top_books(session, params)
+            latencies.append(time.perf_counter() - start)
+        print("{:<32} p50 {:>7.2f} ms  max {:>7.2f} ms".format(
+            str(params), statistics.median(latencies) * 1000, max(latencies) * 1000
+        ))
+    session.close()
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,102 @@
+"""
+Compares the schema compiled request validators against the hand written ones they replaced,
+per call, for GET /book params and POST /review/batch rows.
+
+    python -m benchmarks.bench_validation [number_of_calls]
+"""
+import sys
+import timeit
+
+from sql_alchemy_lambda.lambda_handler import validate_get_book_params, validate_review_params
+
+BOOK_PARAMS = [
+    {"limit": "10"},
+    {"title": "Title 1", "author": "Author 2", "year": "2001", "limit": "20", "fields": "id,title"},
+    {"author_prefix": "Au", "year_from": "1990", "year_to": "2000", "ignore_case": "true", "include": "reviews"},
+]
+REVIEW_ROW = {"id": 1, "reviewer": "Ann", "rate": 5, "review": "Great", "book_id": 3}
+
+
+def legacy_validate_get_book_params(params: dict):
+    # The per field checks GET /book used before the schemas, trimmed to the params above
+    validated_params = {}
+    errors = {}
+    for name in ("title", "author", "publisher", "title_prefix", "author_prefix"):
+        if name in params and params[name].strip() is not None and params[name].strip() != "":
+            validated_params[name] = params[name]
+    for name in ("id", "year", "year_from", "year_to"):
+        if name in params and params[name].strip() is not None and params[name].strip() != "":
+            try:
+                validated_params[name] = int(params[name])
+            except ValueError:
+                errors[name] = "not a valid integer"
+    if "ignore_case" in params and params["ignore_case"].strip() is not None and params["ignore_case"].strip() != "":
+        if params["ignore_case"].strip().lower() in ("true", "1", "yes"):
+            validated_params["ignore_case"] = True
+        elif params["ignore_case"].strip().lower() not in ("false", "0", "no"):
+            errors["ignore_case"] = "not a valid boolean"
+    if "limit" in params and params["limit"].strip() is not None and params["limit"].strip() != "":
+        try:
+            validated_params["limit"] = int(params["limit"])
+            if validated_params["limit"] < 1:
+                errors["limit"] = "must be greater than 0"
+            validated_params["limit"] = min(validated_params["limit"], 500)
+        except ValueError:
+            errors["limit"] = "not a valid integer"
+    for name, choices in (("fields", ("id", "title", "author", "publisher", "year")), ("include", ("reviews", "rating"))):
+        if name in params and params[name].strip() is not None and params[name].strip() != "":
+            items = [item.strip() for item in params[name].split(",") if item.strip() != ""]
+            unknown = [item for item in items if item not in choices]
+            if len(unknown) > 0:
+                errors[name] = "unknown {}: {}".format(name, ", ".join(unknown))
+            else:
+                validated_params[name] = tuple(dict.fromkeys(items))
+    return validated_params, errors
+
+
+def legacy_validate_review_row(row: dict):
+    # The batch endpoint turned every value into a str, then ran the query param checks
+    params = {k: str(v) for k, v in row.items() if v is not None}
+    validated_params = {}
+    errors = {}
+    for name in ("id", "rate", "book_id"):
+        if name in params and params[name].strip() is not None and params[name].strip() != "":
+            try:
+                validated_params[name] = int(params[name])
+            except ValueError:
+                errors[name] = "not a valid integer"
+        else:
+            errors[name] = "is required and was not included"
+    for name in ("reviewer", "review"):
+        if name in params and params[name].strip() is not None and params[name].strip() != "":
+            validated_params[name] = params[name]
+        else:
+            errors[name] = "is required and was not included"
+    return validated_params, errors
+
+
+def best(legacy, compiled, argument, number: int, repeat: int = 50) -> tuple:
+    """
+    Best time per call of both validators, alternating between them so machine noise hits both
+    """
+    timers = [timeit.Timer(lambda: legacy(argument)), timeit.Timer(lambda: compiled(argument))]
+    times = [[], []]
+    for _ in range(repeat):
+        for timer, samples in zip(timers, times):
+            samples.append(timer.timeit(number))
+    return min(times[0]) / number, min(times[1]) / number
+
+
+def main(number: int = 2000):
+    cases = [("GET /book params {}".format(i), params, legacy_validate_get_book_params, validate_get_book_params)
+             for i, params in enumerate(BOOK_PARAMS)]
+    cases.append(("POST /review/batch row", REVIEW_ROW, legacy_validate_review_row, validate_review_params))
+    for name, argument, legacy, compiled in cases:
+        legacy_seconds, compiled_seconds = best(legacy, compiled, argument, number)
+        print("{:<24} hand written {:>6.2f} us  compiled {:>6.2f} us  {:>5.2f}x".format(
+            name, legacy_seconds * 1e6, compiled_seconds * 1e6, legacy_seconds / compiled_seconds
+        ))
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -9,15 +9,45 @@ class ApiCoresLambdaStack(Stack):
     def __init__(self, scope: Construct, id: str, **kwargs) -> None:
         super().__init__(scope, id, **kwargs)
 
+        # Keyed on "name", the lowercased "first last" the lambda writes
         table = aws_dynamodb.Table(
             self,
             "Example-DynamoDbTable",
             partition_key=aws_dynamodb.Attribute(
-                name="first_name", type=aws_dynamodb.AttributeType.STRING
+                name="name", type=aws_dynamodb.AttributeType.STRING
+            ),
+        )
+
+        # GET /rsvp?email=, sparse since guests without an email address have no "email_lower"
+        table.add_global_secondary_index(
+            index_name="email_index",
+            partition_key=aws_dynamodb.Attribute(
+                name="email_lower", type=aws_dynamodb.AttributeType.STRING
             ),
             sort_key=aws_dynamodb.Attribute(
-                name="last_name", type=aws_dynamodb.AttributeType.STRING
+                name="name", type=aws_dynamodb.AttributeType.STRING
+            ),
+        )
+
+        # GET /rsvp?status=attending|not_attending
+        table.add_global_secondary_index(
+            index_name="rsvp_status_index",
+            partition_key=aws_dynamodb.Attribute(
+                name="rsvp_status", type=aws_dynamodb.AttributeType.STRING
+            ),
+            sort_key=aws_dynamodb.Attribute(
+                name="name", type=aws_dynamodb.AttributeType.STRING
+            ),
+        )
+
+        # Stored responses of requests sent with an Idempotency-Key, deleted by TTL
+        idempotency_table = aws_dynamodb.Table(
+            self,
+            "Example-IdempotencyTable",
+            partition_key=aws_dynamodb.Attribute(
+                name="idempotency_key", type=aws_dynamodb.AttributeType.STRING
             ),
+            time_to_live_attribute="expires_at",
         )
 
         dirname = os.path.dirname(__file__)
@@ -33,9 +63,13 @@ class ApiCoresLambdaStack(Stack):
 
         # Adding IAM
         table.grant_read_write_data(function)
+        idempotency_table.grant_read_write_data(function)
 
         # TODO add environment variables
         function.add_environment("TABLE_NAME", table.table_name)
+        function.add_environment("IDEMPOTENCY_TABLE_NAME", idempotency_table.table_name)
+        function.add_environment("RSVP_WRITE_MODE", "upsert")
+        function.add_environment("RSVP_SUMMARY_SHARDS", "10")
 
         api = _apigw.LambdaRestApi(
             self,
@@ -47,7 +81,7 @@ class ApiCoresLambdaStack(Stack):
         rsvp_entity = api.root.add_resource(
             "rsvp",
             default_cors_preflight_options=_apigw.CorsOptions(
-                allow_methods=["Post", "Options"], allow_origins=_apigw.Cors.ALL_ORIGINS
+                allow_methods=["Get", "Post", "Options"], allow_origins=_apigw.Cors.ALL_ORIGINS
             ),
         )
 
@@ -76,3 +110,56 @@ class ApiCoresLambdaStack(Stack):
                 }
             ],
         )
+
+        rsvp_entity.add_method(
+            "GET",
+            rsvp_entity_lambda_integration,
+            method_responses=[
+                {
+                    "statusCode": "200",
+                    "responseParameters": {
+                        "method.response.header.Access-Control-Allow-Origin": True
+                    },
+                }
+            ],
+        )
+
+        rsvp_batch_entity = rsvp_entity.add_resource(
+            "batch",
+            default_cors_preflight_options=_apigw.CorsOptions(
+                allow_methods=["Post", "Options"], allow_origins=_apigw.Cors.ALL_ORIGINS
+            ),
+        )
+
+        rsvp_batch_entity.add_method(
+            "POST",
+            rsvp_entity_lambda_integration,
+            method_responses=[
+                {
+                    "statusCode": "200",
+                    "responseParameters": {
+                        "method.response.header.Access-Control-Allow-Origin": True
+                    },
+                }
+            ],
+        )
+
+        rsvp_summary_entity = rsvp_entity.add_resource(
+            "summary",
+            default_cors_preflight_options=_apigw.CorsOptions(
+                allow_methods=["Get", "Options"], allow_origins=_apigw.Cors.ALL_ORIGINS
+            ),
+        )
+
+        rsvp_summary_entity.add_method(
+            "GET",
+            rsvp_entity_lambda_integration,
+            method_responses=[
+                {
+                    "statusCode": "200",
+                    "responseParameters": {
+                        "method.response.header.Access-Control-Allow-Origin": True
+                    },
+                }
+            ],
+        )
@@ -1,6 +1,6 @@
 from cdk.app import ApiCoresLambdaStack
 import aws_cdk as cdk
-from aws_cdk.assertions import Template
+from aws_cdk.assertions import Match, Template
 
 
 def test_app_dynamodb_resource():
@@ -16,12 +16,12 @@ def test_app_dynamodb_resource():
         "Type": "AWS::DynamoDB::Table",
         "Properties": {
             "KeySchema": [
-                {"AttributeName": "first_name", "KeyType": "HASH"},
-                {"AttributeName": "last_name", "KeyType": "RANGE"},
+                {"AttributeName": "name", "KeyType": "HASH"},
             ],
             "AttributeDefinitions": [
-                {"AttributeName": "first_name", "AttributeType": "S"},
-                {"AttributeName": "last_name", "AttributeType": "S"},
+                {"AttributeName": "name", "AttributeType": "S"},
+                {"AttributeName": "email_lower", "AttributeType": "S"},
+                {"AttributeName": "rsvp_status", "AttributeType": "S"},
             ],
             "ProvisionedThroughput": {"ReadCapacityUnits": 5, "WriteCapacityUnits": 5},
         },
@@ -29,3 +29,103 @@ def test_app_dynamodb_resource():
         "DeletionPolicy": "Retain",
     }
     template.has_resource(dynamo_table, props=dynamodb_properties)
+
+
+def test_app_dynamodb_indexes():
+    app = cdk.App()
+    processor_stack = ApiCoresLambdaStack(
+        app,
+        "ApiCorsLambdaStack",
+    )
+
+    template = Template.from_stack(processor_stack)
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "GlobalSecondaryIndexes": [
+                {
+                    "IndexName": "email_index",
+                    "KeySchema": [
+                        {"AttributeName": "email_lower", "KeyType": "HASH"},
+                        {"AttributeName": "name", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                    "ProvisionedThroughput": Match.any_value(),
+                },
+                {
+                    "IndexName": "rsvp_status_index",
+                    "KeySchema": [
+                        {"AttributeName": "rsvp_status", "KeyType": "HASH"},
+                        {"AttributeName": "name", "KeyType": "RANGE"},
+                    ],
+                    "Projection": {"ProjectionType": "ALL"},
+                    "ProvisionedThroughput": Match.any_value(),
+                },
+            ],
+        },
+    )
+
+
+def test_app_rsvp_get_method():
+    app = cdk.App()
+    processor_stack = ApiCoresLambdaStack(
+        app,
+        "ApiCorsLambdaStack",
+    )
+
+    template = Template.from_stack(processor_stack)
+    template.resource_properties_count_is("AWS::ApiGateway::Method", {"HttpMethod": "GET"}, 2)
+
+
+def test_app_rsvp_batch_resource():
+    app = cdk.App()
+    processor_stack = ApiCoresLambdaStack(
+        app,
+        "ApiCorsLambdaStack",
+    )
+
+    template = Template.from_stack(processor_stack)
+    template.has_resource_properties("AWS::ApiGateway::Resource", {"PathPart": "rsvp"})
+    template.has_resource_properties("AWS::ApiGateway::Resource", {"PathPart": "batch"})
+    template.resource_properties_count_is("AWS::ApiGateway::Method", {"HttpMethod": "POST"}, 2)
+
+
+def test_app_rsvp_summary_resource():
+    app = cdk.App()
+    processor_stack = ApiCoresLambdaStack(
+        app,
+        "ApiCorsLambdaStack",
+    )
+
+    template = Template.from_stack(processor_stack)
+    template.has_resource_properties("AWS::ApiGateway::Resource", {"PathPart": "summary"})
+
+
+def test_app_idempotency_table():
+    app = cdk.App()
+    processor_stack = ApiCoresLambdaStack(
+        app,
+        "ApiCorsLambdaStack",
+    )
+
+    template = Template.from_stack(processor_stack)
+    template.has_resource_properties(
+        "AWS::DynamoDB::Table",
+        {
+            "KeySchema": [{"AttributeName": "idempotency_key", "KeyType": "HASH"}],
+            "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True},
+        },
+    )
+    template.has_resource_properties(
+        "AWS::Lambda::Function",
+        {
+            "Environment": {
+                "Variables": {
+                    "TABLE_NAME": Match.any_value(),
+                    "IDEMPOTENCY_TABLE_NAME": Match.any_value(),
+                    "RSVP_WRITE_MODE": "upsert",
+                    "RSVP_SUMMARY_SHARDS": "10",
+                }
+            }
+        },
+    )
@@ -0,0 +1,387 @@
+import argparse
+import csv
+import json
+import logging
+import queue
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Tuple
+
+from lambdaCode.lambda_handler import get_dynamo_db_client, get_dynamo_db_table_name
+from lambdaCode.models.summary import is_summary_key
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger("APP")
+logger.setLevel(logging.INFO)
+
+# Export column and the item attribute it is read from. The guest columns have the names
+# guest_import reads, so an export can be imported again.
+EXPORT_COLUMNS = (
+    ("name", "name"),
+    ("first_name", "g_first_name"),
+    ("last_name", "g_last_name"),
+    ("email_address", "g_email_address"),
+    ("phone_number", "g_phone_number"),
+    ("total_number_of_guests_attending", "total_number_of_guests_attending"),
+    ("not_attending", "not_attending"),
+    ("last_updated", "last_updated"),
+)
+DEFAULT_TOTAL_SEGMENTS = 4
+DEFAULT_ROW_GROUP_SIZE = 10000
+FILE_FORMATS = ("csv", "ndjson", "columnar", "parquet")
+
+# Marks the end of a segment in the page queue
+_SEGMENT_DONE = object()
+
+
+def attribute_value(value: dict):
+    """
+        Reads a value in attribute value format, for the types guests are written with
+    Args:
+        value (dict): e.g. {"S": "john smith"}
+    Returns:
+        str, int, float, bool or None: the plain value
+    """
+    if "S" in value:
+        return value["S"]
+    if "N" in value:
+        number = value["N"]
+        return int(number) if number.lstrip("-").isdigit() else float(number)
+    if "BOOL" in value:
+        return value["BOOL"]
+    return None
+
+
+def projection(attributes: Iterable[str]) -> dict:
+    """
+        Builds the ProjectionExpression that only fetches the given attributes. Every name is
+        aliased, "name" is a dynamodb reserved word.
+    Args:
+        attributes (Iterable[str]): item attributes
+    Returns:
+        dict: ProjectionExpression and ExpressionAttributeNames scan params
+    """
+    names = {"#a{}".format(index): attribute for index, attribute in enumerate(attributes)}
+    return {"ProjectionExpression": ", ".join(names), "ExpressionAttributeNames": names}
+
+
+def scan_segment(client, table_name: str, segment: int, total_segments: int, params: dict) -> Iterator[dict]:
+    """
+        Scans one segment of the table, a page at a time
+    Args:
+        client: low level dynamodb client
+        table_name (str): table name
+        segment (int): segment of this worker
+        total_segments (int): number of segments the table is split into
+        params (dict): other scan params, e.g. the projection
+    Returns:
+        Iterator[dict]: scan responses
+    """
+    start_key = None
+    while True:
+        request = dict(params, TableName=table_name, Segment=segment, TotalSegments=total_segments)
+        if start_key is not None:
+            request["ExclusiveStartKey"] = start_key
+        page = client.scan(**request)
+        yield page
+        start_key = page.get("LastEvaluatedKey")
+        if not start_key:
+            return
+
+
+def parallel_scan(
+    client,
+    table_name: str,
+    attributes: Iterable[str],
+    total_segments: int = DEFAULT_TOTAL_SEGMENTS,
+    page_size: int = None,
+    max_pending_pages: int = None,
+    stats: dict = None,
+) -> Iterator[dict]:
+    """
+        Scans the table with one worker thread per segment and yields its items as they arrive.
+        Pages wait in a queue of at most ``max_pending_pages``, so a slow consumer holds the
+        workers back instead of growing memory.
+    Args:
+        client: low level dynamodb client, which unlike boto3 resources is safe to share between threads
+        table_name (str): table name
+        attributes (Iterable[str]): the only attributes fetched
+        total_segments (int): number of segments and worker threads
+        page_size (int): Limit of each Scan call, the 1MB page limit applies either way
+        max_pending_pages (int): pages fetched ahead of the consumer, 2 per worker by default
+        stats (dict): updated with the scanned_count and consumed_capacity of the pages
+    Returns:
+        Iterator[dict]: items in attribute value format, in no particular order
+    """
+    params = dict(projection(attributes), ReturnConsumedCapacity="TOTAL")
+    if page_size is not None:
+        params["Limit"] = page_size
+    pages = queue.Queue(maxsize=max_pending_pages or 2 * total_segments)
+    stop = threading.Event()
+    stats = stats if stats is not None else {}
+    stats.update(scanned_count=0, consumed_capacity=0.0)
+
+    def put(entry) -> bool:
+        # Gives up once the consumer has stopped, so no worker blocks on a full queue forever
+        while not stop.is_set():
+            try:
+                pages.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker(segment: int):
+        try:
+            for page in scan_segment(client, table_name, segment, total_segments, params):
+                if not put(page):
+                    return
+        except Exception as e:
+            put(e)
+        finally:
+            put(_SEGMENT_DONE)
+
+    with ThreadPoolExecutor(max_workers=total_segments, thread_name_prefix="scan") as pool:
+        for segment in range(total_segments):
+            pool.submit(worker, segment)
+        try:
+            remaining = total_segments
+            while remaining > 0:
+                page = pages.get()
+                if page is _SEGMENT_DONE:
+                    remaining -= 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                stats["scanned_count"] += page.get("ScannedCount", 0)
+                stats["consumed_capacity"] += (page.get("ConsumedCapacity") or {}).get("CapacityUnits", 0.0)
+                yield from page["Items"]
+        finally:
+            stop.set()
+
+
+class CSVWriter:
+    """
+    One row per guest, with a header
+    """
+
+    def __init__(self, output, columns: List[str]):
+        self.writer = csv.writer(output)
+        self.writer.writerow(columns)
+
+    def write(self, row: list):
+        self.writer.writerow(["" if value is None else value for value in row])
+
+    def close(self):
+        pass
+
+
+class NDJSONWriter:
+    """
+    One JSON object per guest and line
+    """
+
+    def __init__(self, output, columns: List[str]):
+        self.output = output
+        self.columns = columns
+
+    def write(self, row: list):
+        self.output.write(json.dumps(dict(zip(self.columns, row))) + "\n")
+
+    def close(self):
+        pass
+
+
+class ColumnarWriter:
+    """
+    Row groups of ``row_group_size`` guests, one JSON line each, holding a list of values per
+    column like a Parquet row group. Only one row group is in memory at a time.
+    """
+
+    def __init__(self, output, columns: List[str], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        self.output = output
+        self.columns = columns
+        self.row_group_size = row_group_size
+        self.column_values = [[] for _ in columns]
+        self.rows = 0
+
+    def write(self, row: list):
+        for values, value in zip(self.column_values, row):
+            values.append(value)
+        self.rows += 1
+        if self.rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows == 0:
+            return
+        self.output.write(self.row_group() + "\n")
+        self.column_values = [[] for _ in self.columns]
+        self.rows = 0
+
+    def row_group(self) -> str:
+        return json.dumps({"rows": self.rows, "columns": dict(zip(self.columns, self.column_values))})
+
+    def close(self):
+        self.flush()
+
+
+class ParquetWriter(ColumnarWriter):
+    """
+    Parquet file with one row group per ``row_group_size`` guests, needs pyarrow
+    """
+
+    def __init__(self, output, columns: List[str], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        if pyarrow is None:
+            raise ValueError("format: parquet needs pyarrow to be installed")
+        super().__init__(output, columns, row_group_size)
+        self.parquet_writer = None
+
+    def flush(self):
+        if self.rows == 0:
+            return
+        table = pyarrow.table(dict(zip(self.columns, self.column_values)))
+        if self.parquet_writer is None:
+            self.parquet_writer = pyarrow.parquet.ParquetWriter(self.output, table.schema)
+        self.parquet_writer.write_table(table)
+        self.column_values = [[] for _ in self.columns]
+        self.rows = 0
+
+    def close(self):
+        self.flush()
+        if self.parquet_writer is not None:
+            self.parquet_writer.close()
+
+
+def get_writer(output, file_format: str, columns: List[str], row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+    """
+    Args:
+        output: text file for csv, ndjson and columnar, binary file for parquet
+        file_format (str): one of FILE_FORMATS
+        columns (List[str]): export columns
+        row_group_size (int): guests per row group of the columnar formats
+    Returns:
+        the writer
+    """
+    if file_format == "csv":
+        return CSVWriter(output, columns)
+    if file_format == "ndjson":
+        return NDJSONWriter(output, columns)
+    if file_format == "columnar":
+        return ColumnarWriter(output, columns, row_group_size)
+    if file_format == "parquet":
+        return ParquetWriter(output, columns, row_group_size)
+    raise ValueError("format: must be one of {}".format(", ".join(FILE_FORMATS)))
+
+
+def get_export_columns(columns: Iterable[str] = None) -> List[Tuple[str, str]]:
+    """
+    Args:
+        columns (Iterable[str]): export column names, all of EXPORT_COLUMNS by default
+    Returns:
+        List[Tuple[str, str]]: (column, attribute) pairs
+    """
+    if columns is None:
+        return list(EXPORT_COLUMNS)
+    attributes = dict(EXPORT_COLUMNS)
+    unknown = [column for column in columns if column not in attributes]
+    if len(unknown) > 0:
+        raise ValueError("columns: unknown columns: {}".format(", ".join(unknown)))
+    return [(column, attributes[column]) for column in columns]
+
+
+def export_guests(
+    output,
+    file_format: str,
+    client=None,
+    table_name: str = None,
+    columns: Iterable[str] = None,
+    total_segments: int = DEFAULT_TOTAL_SEGMENTS,
+    page_size: int = None,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+) -> dict:
+    """
+        Streams the whole RSVP table into a file with a parallel Scan
+    Args:
+        output: file to write to, see get_writer
+        file_format (str): one of FILE_FORMATS
+        client: low level dynamodb client, defaults to get_dynamo_db_client()
+        table_name (str): defaults to TABLE_NAME
+        columns (Iterable[str]): export columns, all of EXPORT_COLUMNS by default
+        total_segments (int): parallel Scan segments
+        page_size (int): Limit of each Scan call
+        row_group_size (int): guests per row group of the columnar formats
+    Returns:
+        dict: export report
+    """
+    export_columns = get_export_columns(columns)
+    column_names = [column for column, _ in export_columns]
+    attributes = [attribute for _, attribute in export_columns]
+    writer = get_writer(output, file_format, column_names, row_group_size)
+    client = client or get_dynamo_db_client()
+    table_name = table_name or get_dynamo_db_table_name()
+
+    # "name" tells the summary counter shards apart, they are not exported
+    scanned_attributes = attributes if "name" in attributes else attributes + ["name"]
+    report = {"rows": 0, "segments": total_segments}
+    scan_stats = {}
+    start = time.perf_counter()
+    for item in parallel_scan(client, table_name, scanned_attributes, total_segments, page_size, stats=scan_stats):
+        if is_summary_key(item["name"]["S"]):
+            continue
+        writer.write([attribute_value(item[attribute]) if attribute in item else None for attribute in attributes])
+        report["rows"] += 1
+    writer.close()
+
+    seconds = time.perf_counter() - start
+    report.update(scan_stats)
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["rows"] / seconds, 1) if seconds > 0 else None
+    # ru_maxrss is reported in kilobytes on linux
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def main(argv: list = None) -> dict:
+    """
+        Command line entry point, exports the TABLE_NAME table to a local file
+    Args:
+        argv (list): command line arguments
+    Returns:
+        dict: export report
+    """
+    parser = argparse.ArgumentParser(description="Export the RSVP table with a parallel Scan")
+    parser.add_argument("path", help="path of the export file")
+    parser.add_argument("--format", choices=FILE_FORMATS, default="csv")
+    parser.add_argument("--segments", type=int, default=DEFAULT_TOTAL_SEGMENTS, help="parallel Scan workers")
+    parser.add_argument("--columns", help="comma separated export columns, defaults to all of them")
+    parser.add_argument("--page-size", type=int, help="Limit of each Scan call")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args(argv)
+
+    columns = [column.strip() for column in args.columns.split(",")] if args.columns else None
+    mode = "wb" if args.format == "parquet" else "w"
+    with open(args.path, mode, **({} if mode == "wb" else {"newline": ""})) as output:
+        report = export_guests(
+            output,
+            args.format,
+            columns=columns,
+            total_segments=args.segments,
+            page_size=args.page_size,
+            row_group_size=args.row_group_size,
+        )
+    logger.info(f"[EXPORT]: {json.dumps(report)}")
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,226 @@
+import argparse
+import codecs
+import csv
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from typing import Callable, Iterable, Iterator, Tuple
+from urllib.parse import unquote_plus
+
+from lambdaCode.lambda_handler import (
+    BATCH_WRITE_SIZE,
+    validate_guest,
+    write_guest_items,
+)
+from lambdaCode.models.guest import Guest
+
+logger = logging.getLogger("APP")
+logger.setLevel(logging.INFO)
+
+# Only this many validation errors are kept in the report so memory stays bounded
+MAX_REPORTED_ERRORS = 100
+
+
+def get_file_format(key: str) -> str:
+    """
+        Works out the file format from the file name
+    Args:
+        key (str): file name or s3 key
+    Returns:
+        str: "csv" or "ndjson"
+    """
+    if key.lower().endswith(".csv"):
+        return "csv"
+    if key.lower().endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    raise ValueError("file: must be a .csv, .ndjson or .jsonl file")
+
+
+def read_rows(lines: Iterable[str], file_format: str) -> Iterator[Tuple[int, dict or Exception]]:
+    """
+        Lazily parses guest rows out of the lines of a file
+    Args:
+        lines (Iterable[str]): lines of the file
+        file_format (str): "csv" or "ndjson"
+    Returns:
+        Iterator[Tuple[int, dict or Exception]]: row number and row, or the error parsing it
+    """
+    if file_format == "csv":
+        for row_number, row in enumerate(csv.DictReader(lines), start=1):
+            yield row_number, row
+        return
+    row_number = 0
+    for line in lines:
+        if line.strip() == "":
+            continue
+        row_number += 1
+        try:
+            yield row_number, json.loads(line)
+        except ValueError:
+            yield row_number, ValueError("row: is not valid JSON")
+
+
+def validate_rows(rows: Iterable[Tuple[int, dict or Exception]]) -> Iterator[Tuple[int, Guest or Exception]]:
+    """
+        Validates each row with validate_guest
+    Args:
+        rows (Iterable[Tuple[int, dict or Exception]]): output of read_rows
+    Returns:
+        Iterator[Tuple[int, Guest or Exception]]: row number and guest, or the validation error
+    """
+    for row_number, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            if type(row) != dict:
+                raise ValueError("row: must be a JSON object")
+            yield row_number, validate_guest(row)
+        except ValueError as e:
+            yield row_number, e
+
+
+def import_guests(
+    lines: Iterable[str],
+    file_format: str,
+    writer: Callable[[list], set] = None,
+    batch_size: int = BATCH_WRITE_SIZE,
+) -> dict:
+    """
+        Streams a guest file into dynamodb without holding more than one batch in memory.
+
+        Duplicates are collapsed on "name" inside each batch (the last row wins). A duplicate in a
+        later batch simply overwrites the earlier put, the same as repeated insert_update_guest calls.
+        Either way it is counted in "duplicates", names are tracked across the whole file.
+    Args:
+        lines (Iterable[str]): lines of the file
+        file_format (str): "csv" or "ndjson"
+        writer (Callable[[list], set]): writes a batch of items (see Guest.to_item) and returns the names
+            it failed to write, defaults to write_guest_items
+        batch_size (int): items per flush
+    Returns:
+        dict: import report
+    """
+    report = {
+        "rows": 0,
+        "valid": 0,
+        "invalid": 0,
+        "duplicates": 0,
+        "written": 0,
+        "failed": 0,
+        "errors": [],
+    }
+    writer = writer or write_guest_items
+    start = time.perf_counter()
+    pending = {}
+    # Names only, far smaller than the guests, so repeats in different batches are counted too
+    seen_names = set()
+
+    # Guests rather than items are held until the flush, they take less memory
+    def flush():
+        unprocessed = writer([guest.to_item() for guest in pending.values()])
+        report["failed"] += len(unprocessed)
+        report["written"] += len(pending) - len(unprocessed)
+        pending.clear()
+
+    for row_number, guest in validate_rows(read_rows(lines, file_format)):
+        report["rows"] += 1
+        if isinstance(guest, Exception):
+            report["invalid"] += 1
+            if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                report["errors"].append({"row": row_number, "error": guest.__str__()})
+            continue
+        report["valid"] += 1
+        if guest.name in seen_names:
+            report["duplicates"] += 1
+        else:
+            seen_names.add(guest.name)
+        pending[guest.name] = guest
+        if len(pending) >= batch_size:
+            flush()
+    if len(pending) > 0:
+        flush()
+
+    seconds = time.perf_counter() - start
+    report["seconds"] = round(seconds, 3)
+    report["rows_per_second"] = round(report["rows"] / seconds, 1) if seconds > 0 else None
+    # ru_maxrss is reported in kilobytes on linux
+    report["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return report
+
+
+def open_s3_lines(bucket: str, key: str) -> Iterable[str]:
+    """
+        Opens the lines of an s3 object. When GUEST_IMPORT_LOCAL_DIR is set the object is read from
+        <GUEST_IMPORT_LOCAL_DIR>/<bucket>/<key> instead, as a local stand-in for s3.
+    Args:
+        bucket (str): s3 bucket
+        key (str): s3 key
+    Returns:
+        Iterable[str]: lines of the object
+    """
+    local_dir = os.environ.get("GUEST_IMPORT_LOCAL_DIR")
+    if local_dir is not None and local_dir != "":
+        return open(os.path.join(local_dir, bucket, key), "r", newline="")
+    import boto3
+
+    s3_object = boto3.client("s3").get_object(Bucket=bucket, Key=key)
+    return codecs.iterdecode(s3_object["Body"].iter_lines(keepends=True), "utf-8")
+
+
+def handler(event: dict, context):
+    """
+    Lambda entry point for s3 "ObjectCreated" events
+    Args:
+        event (dict): contains the s3 event records
+        context: context of the lambda
+
+    Returns:
+        dict: one import report per record
+
+    """
+    reports = []
+    for record in event["Records"]:
+        bucket = record["s3"]["bucket"]["name"]
+        # Keys arrive URL encoded in s3 events, e.g. "guest+list%282%29.csv"
+        key = unquote_plus(record["s3"]["object"]["key"])
+        lines = open_s3_lines(bucket, key)
+        try:
+            report = import_guests(lines, get_file_format(key))
+        finally:
+            if hasattr(lines, "close"):
+                lines.close()
+        report["key"] = key
+        logger.info(f"[IMPORT]: {json.dumps(report)}")
+        reports.append(report)
+    return {"reports": reports}
+
+
+def main(argv: list = None) -> dict:
+    """
+        Command line entry point, imports a local guest file
+    Args:
+        argv (list): command line arguments
+    Returns:
+        dict: import report
+    """
+    parser = argparse.ArgumentParser(description="Stream a CSV/NDJSON guest file into the RSVP table")
+    parser.add_argument("path", help="path of the guest file")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="defaults to the file extension")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, do not write to dynamodb")
+    parser.add_argument("--batch-size", type=int, default=BATCH_WRITE_SIZE)
+    args = parser.parse_args(argv)
+
+    writer = (lambda items: set()) if args.dry_run else write_guest_items
+    with open(args.path, "r", newline="") as lines:
+        report = import_guests(
+            lines, args.format or get_file_format(args.path), writer=writer, batch_size=args.batch_size
+        )
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
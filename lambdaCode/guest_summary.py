@@ -0,0 +1,70 @@
+import argparse
+import json
+import logging
+import sys
+import time
+
+from lambdaCode.guest_export import DEFAULT_TOTAL_SEGMENTS, parallel_scan
+from lambdaCode.lambda_handler import get_dynamo_db_client, get_dynamo_db_table_name, get_summary_shards
+from lambdaCode.models.summary import add_counts, is_summary_key, item_counts, summary_item, summary_from_items
+
+logger = logging.getLogger("APP")
+logger.setLevel(logging.INFO)
+
+# Attributes the counts are computed from
+COUNTED_ATTRIBUTES = ["name", "total_number_of_guests_attending", "not_attending"]
+
+
+def rebuild_summary(
+    client=None,
+    table_name: str = None,
+    shards: int = None,
+    total_segments: int = DEFAULT_TOTAL_SEGMENTS,
+) -> dict:
+    """
+        Recounts the RSVP summary with a parallel Scan of the table, e.g. after guest_import,
+        which writes without the counters. Writes made while it runs may be counted twice or
+        not at all, so it is meant for when the table isn't written to.
+    Args:
+        client: low level dynamodb client, defaults to get_dynamo_db_client()
+        table_name (str): defaults to TABLE_NAME
+        shards (int): counter shards, defaults to RSVP_SUMMARY_SHARDS
+        total_segments (int): parallel Scan segments
+    Returns:
+        dict: the rebuilt summary and the time it took
+    """
+    client = client or get_dynamo_db_client()
+    table_name = table_name or get_dynamo_db_table_name()
+    shards = shards or get_summary_shards()
+
+    start = time.perf_counter()
+    counts = {}
+    for item in parallel_scan(client, table_name, COUNTED_ATTRIBUTES, total_segments):
+        if not is_summary_key(item["name"]["S"]):
+            add_counts(counts, item_counts(item))
+    # The first shard holds the counts and the others are zeroed, all in one transaction
+    items = [summary_item(counts if shard == 0 else {}, shard) for shard in range(shards)]
+    client.transact_write_items(TransactItems=[{"Put": {"TableName": table_name, "Item": item}} for item in items])
+    return dict(summary_from_items(items), shards=shards, seconds=round(time.perf_counter() - start, 3))
+
+
+def main(argv: list = None) -> dict:
+    """
+        Command line entry point, rebuilds the summary of the TABLE_NAME table
+    Args:
+        argv (list): command line arguments
+    Returns:
+        dict: the rebuilt summary
+    """
+    parser = argparse.ArgumentParser(description="Recount the RSVP summary counters from the guests")
+    parser.add_argument("--segments", type=int, default=DEFAULT_TOTAL_SEGMENTS, help="parallel Scan workers")
+    args = parser.parse_args(argv)
+
+    summary = rebuild_summary(total_segments=args.segments)
+    logger.info(f"[SUMMARY]: {json.dumps(summary)}")
+    print(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+
+def request_hash(method: str, route: str, raw_body: str or None) -> str:
+    """
+        Fingerprints a request, so a key reused for a different request can be told apart from a replay
+    Args:
+        method (str): http method
+        route (str): route of the request
+        raw_body (str or None): request body
+    Returns:
+        str: hex digest
+    """
+    content = "{} {}\n{}".format(method.upper(), route, raw_body or "")
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def item_record(item: dict) -> dict:
+    """
+    Args:
+        item (dict): stored item in attribute value format
+    Returns:
+        dict: the record, with a status_code and body of None for a claim
+    """
+    if "status_code" not in item:
+        return {"request_hash": item["request_hash"]["S"], "status_code": None, "body": None}
+    return {
+        "request_hash": item["request_hash"]["S"],
+        "status_code": int(item["status_code"]["N"]),
+        "body": json.loads(item["body"]["S"]),
+    }
+
+
+class IdempotencyStore:
+    """
+    Stored responses by Idempotency-Key. They are kept in-process with LRU eviction and, when a
+    table name is given, in a dynamodb table whose "expires_at" attribute is its TTL attribute,
+    so replays that land on another container are answered too.
+
+    Records are dicts with the request_hash, status_code and body of the first response. A key is
+    claimed before its request runs, with a record whose status_code and body are None, so a
+    concurrent request with the same key finds it in progress rather than running again.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400,
+        max_entries: int = 1024,
+        table_name: str = None,
+        client_factory: Callable = None,
+        claim_ttl: float = 900,
+    ):
+        """
+        Args:
+            ttl (float): seconds a response is replayed for
+            max_entries (int): responses kept in-process
+            table_name (str): dynamodb table keyed on "idempotency_key", None for in-process only
+            client_factory (Callable): returns the low level dynamodb client
+            claim_ttl (float): seconds a claim holds its key without a response, so the key of a
+                request that died midway can be used again. At least the lambda timeout.
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.table_name = table_name
+        self.client_factory = client_factory
+        self.claim_ttl = claim_ttl
+        self.entries = OrderedDict()
+        self.counters = {"hits": 0, "table_hits": 0, "misses": 0, "conflicts": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        """
+        Args:
+            key (str): Idempotency-Key
+        Returns:
+            dict or None: the stored record, None if there is none or it expired
+        """
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self.entries.move_to_end(key)
+                self.counters["hits"] += 1
+                return entry[1]
+            del self.entries[key]
+        if self.table_name is not None:
+            item = self.client_factory().get_item(
+                TableName=self.table_name,
+                Key={"idempotency_key": {"S": key}},
+                ConsistentRead=True,
+            ).get("Item")
+            # TTL deletes can lag for hours, so expired items are skipped here
+            if item is not None and float(item["expires_at"]["N"]) > now:
+                record = item_record(item)
+                # Claims of other containers are read again until their response is stored
+                if record["status_code"] is not None:
+                    self._store(key, float(item["expires_at"]["N"]), record)
+                self.counters["table_hits"] += 1
+                return record
+        self.counters["misses"] += 1
+        return None
+
+    def claim(self, key: str, request_hash: str) -> Optional[dict]:
+        """
+            Claims the key for a request about to run. The table item is only written if there is
+            none or it expired, so of two concurrent requests with the same key only one runs.
+        Args:
+            key (str): Idempotency-Key
+            request_hash (str): fingerprint of the request
+        Returns:
+            dict or None: None if the key was claimed, else the record that holds it, whose
+            status_code is None while its request is still running
+        """
+        record = self.get(key)
+        if record is not None:
+            return record
+        now = time.time()
+        expires_at = now + self.claim_ttl
+        if self.table_name is not None:
+            # Only loaded by the dynamodb client the table needs
+            from botocore.exceptions import ClientError
+
+            try:
+                self.client_factory().put_item(
+                    TableName=self.table_name,
+                    Item={
+                        "idempotency_key": {"S": key},
+                        "request_hash": {"S": request_hash},
+                        "expires_at": {"N": str(int(expires_at))},
+                    },
+                    ConditionExpression="attribute_not_exists(idempotency_key) OR expires_at < :now",
+                    ExpressionAttributeValues={":now": {"N": str(int(now))}},
+                    ReturnValuesOnConditionCheckFailure="ALL_OLD",
+                )
+            except ClientError as e:
+                if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+                    raise
+                self.counters["conflicts"] += 1
+                if "Item" in e.response:
+                    return item_record(e.response["Item"])
+                return {"request_hash": request_hash, "status_code": None, "body": None}
+        self._store(key, expires_at, {"request_hash": request_hash, "status_code": None, "body": None})
+        return None
+
+    def release(self, key: str):
+        """
+            Drops the claim of a request that failed, so the key can be used again
+        Args:
+            key (str): Idempotency-Key
+        """
+        self.entries.pop(key, None)
+        if self.table_name is not None:
+            self.client_factory().delete_item(TableName=self.table_name, Key={"idempotency_key": {"S": key}})
+
+    def put(self, key: str, record: dict):
+        """
+            Stores the response of a claimed key
+        Args:
+            key (str): Idempotency-Key
+            record (dict): request_hash, status_code and body of the response
+        """
+        expires_at = time.time() + self.ttl
+        self._store(key, expires_at, record)
+        if self.table_name is not None:
+            self.client_factory().put_item(
+                TableName=self.table_name,
+                Item={
+                    "idempotency_key": {"S": key},
+                    "request_hash": {"S": record["request_hash"]},
+                    "status_code": {"N": str(record["status_code"])},
+                    "body": {"S": json.dumps(record["body"])},
+                    "expires_at": {"N": str(int(expires_at))},
+                },
+            )
+
+    def _store(self, key: str, expires_at: float, record: dict):
+        self.entries[key] = (expires_at, record)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: counters plus the current number of in-process entries
+        """
+        return dict(self.counters, size=len(self.entries))
@@ -1,14 +1,83 @@
+import base64
+import binascii
 import logging
 import os
-import boto3
+import random
+import re
+import time
 import json
 
+from lambdaCode.idempotency import IdempotencyStore, request_hash
 from lambdaCode.models.response import Response
-from lambdaCode.models.guest import Guest
+from lambdaCode.models.guest import ATTENDING, NOT_ATTENDING, Guest
+from lambdaCode.models.summary import (
+    add_counts,
+    guest_counts,
+    item_counts,
+    summary_from_items,
+    summary_key,
+    summary_update,
+)
+from validation import Field, compile_schema
 
 logger = logging.getLogger("APP")
 logger.setLevel(logging.INFO)
 
+# The boto3 resource and tables are created lazily and kept for the life of the container
+# so warm invocations don't rebuild the session, service model and connection pool.
+_dynamodb_resource = None
+_dynamodb_tables = {}
+_idempotency_store = None
+
+# Writes made and skipped by this container, see get_write_stats
+_write_stats = {"writes": 0, "skipped_writes": 0, "replays": 0}
+
+# "upsert" skips guests whose content hash is unchanged, "put" always writes them
+WRITE_MODES = ("upsert", "put")
+# Guests are written in TransactWriteItems calls together with the ADD to one summary counter
+# shard, each guest conditional on the counts the deltas were computed from.
+TRANSACT_GUESTS = 24
+TRANSACT_MAX_ATTEMPTS = 3
+TRANSACT_BASE_DELAY = 0.05
+# Read back before a write, to compute the summary deltas and tell unchanged guests apart
+GUEST_COUNT_ATTRIBUTES = ("name", "total_number_of_guests_attending", "not_attending", "content_hash")
+GUEST_NEW_CONDITION = "attribute_not_exists(#name)"
+GUEST_COUNTS_CONDITION = "#total_number_of_guests_attending = :old_total AND #not_attending = :old_not_attending"
+DEFAULT_SUMMARY_SHARDS = 10
+# Every shard is read with one BatchGetItem, which takes at most 100 keys
+MAX_SUMMARY_SHARDS = 100
+
+# Indexes of the RSVP table, see cdk/api_cores_lambda_stack.py. Both are sorted on "name".
+EMAIL_INDEX = "email_index"
+RSVP_STATUS_INDEX = "rsvp_status_index"
+DEFAULT_RSVP_PAGE_SIZE = 50
+MAX_RSVP_PAGE_SIZE = 100
+
+# US numbers as people type them, e.g. "(234) 567-8910" or "+1 234.567.8910", read in one match
+US_PHONE_NUMBER = re.compile(
+    r"\s*(?:\+?1[\s.-]*)?\(?([2-9][0-9]{2})\)?[\s.-]*([0-9]{3})[\s.-]*([0-9]{4})\s*", re.ASCII
+)
+# Separators of the other phone numbers, deleted in one str.translate() pass
+PHONE_SEPARATORS = str.maketrans("", "", " \t-.()/")
+# E.164 allows at most 15 digits, country code included
+PHONE_MIN_DIGITS = 8
+PHONE_MAX_DIGITS = 15
+DEFAULT_COUNTRY_CODE = "1"
+NON_DIGITS = re.compile(r"[^0-9]+")
+# Practical subset of RFC 5322: a dot-atom local part and a domain of at least two labels that
+# don't start or end with "-". Label lengths are left to EMAIL_ADDRESS_MAX_LENGTH, bounded
+# repeats make the regex backtrack.
+EMAIL_ADDRESS = re.compile(
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:(?!-)[A-Za-z0-9-]+(?<!-)\.)+(?!-)[A-Za-z0-9-]+(?<!-)"
+)
+EMAIL_ADDRESS_MAX_LENGTH = 254
+
+# BatchWriteItem accepts at most 25 put requests per call
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_ATTEMPTS = 5
+BATCH_WRITE_BASE_DELAY = 0.05
+
 
 def handler(event: dict, context):
     """
@@ -24,105 +93,192 @@ def handler(event: dict, context):
     logger.info(f"[REQUEST]: {json.dumps(event)}")
     method = event["httpMethod"]
     route = event["pathParameters"]["proxy"]
-    body = (
-        json.loads(event["body"])
-        if "body" in event and event["body"] is not None
-        else {}
-    )
+    raw_body = event["body"] if "body" in event else None
     headers = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
 
+    claimed_key = None
     try:
-        if method.upper() == "POST" and route == "rsvp":
+        idempotency_key = get_header(event, "Idempotency-Key") if method.upper() == "POST" else None
+        if idempotency_key is not None:
+            fingerprint = request_hash(method, route, raw_body)
+            record = get_idempotency_store().claim(idempotency_key, fingerprint)
+            if record is not None and record["status_code"] is None:
+                response = Response(
+                    status_code=409,
+                    headers=headers,
+                    body={"error": "Idempotency-Key: a request with this key is in progress"},
+                ).to_dict()
+                logger.info(f"[RESPONSE]: {response}")
+                return response
+            if record is not None:
+                if record["request_hash"] != fingerprint:
+                    raise ValueError("Idempotency-Key: was already used for a different request")
+                _write_stats["replays"] += 1
+                response = Response(
+                    status_code=record["status_code"],
+                    headers=dict(headers, **{"Idempotent-Replayed": "true"}),
+                    body=record["body"],
+                ).to_dict()
+                logger.info(f"[RESPONSE]: {response}")
+                return response
+            claimed_key = idempotency_key
+
+        if method.upper() == "GET" and route == "rsvp/summary":
+            response_body = get_rsvp_summary()
+        elif method.upper() == "GET" and route == "rsvp":
+            params = event["queryStringParameters"] if "queryStringParameters" in event else None
+            response_body = get_guests(params)
+        elif method.upper() == "POST" and route == "rsvp":
+            body = json.loads(raw_body) if raw_body is not None else {}
             guest = validate_guest(body)
-            guest_status_code = insert_update_guest(guest)
-            if guest_status_code != 200:
-                raise ValueError("Failure to add guest: {}".format(guest_status_code))
-            response = Response(
-                status_code=200,
-                headers=headers,
-                body={"guest": json.loads(json.dumps(guest))},
-            ).to_dict()
-            logger.info(f"[RESPONSE]: {response}")
-            return response
+            if get_write_mode() == "upsert":
+                written = upsert_guest(guest)
+            else:
+                guest_status_code = insert_update_guest(guest)
+                if guest_status_code != 200:
+                    raise ValueError("Failure to add guest: {}".format(guest_status_code))
+                written = True
+            response_body = {"guest": guest.to_dict(), "skipped": not written}
+        elif method.upper() == "POST" and route == "rsvp/batch":
+            rows = parse_batch_body(raw_body, get_header(event, "Content-Type"))
+            response_body = insert_update_guests(rows)
         else:
+            if claimed_key is not None:
+                get_idempotency_store().release(claimed_key)
             response = Response(
                 status_code=404, headers={}, body={"message": "{}"}
             ).to_dict()
             logger.info(f"[RESPONSE]: {response}")
             return response
+
+        if idempotency_key is not None:
+            get_idempotency_store().put(
+                idempotency_key, {"request_hash": fingerprint, "status_code": 200, "body": response_body}
+            )
+        response = Response(
+            status_code=200,
+            headers=headers,
+            body=response_body,
+        ).to_dict()
+        logger.info(f"[RESPONSE]: {response}")
+        logger.info(f"[WRITES]: {json.dumps(_write_stats)}")
+        return response
     except Exception as e:
         logger.exception(e)
+        if claimed_key is not None:
+            get_idempotency_store().release(claimed_key)
         response = Response(
             status_code=500, headers={}, body={"error": e.__str__()}
         ).to_dict()
         logger.info(f"[RESPONSE]: {response}")
+        return response
 
 
-def validate_str_section(body: dict, section: str) -> str or None:
+def get_header(event: dict, name: str) -> str or None:
     """
-        validates a str section of the request
+        Gets a request header, ignoring the case of its name
     Args:
-        body (dict): contains the lambda event info
-        section (str): section of the request to analyze
+        event (dict): contains the lambda event info
+        name (str): header name
     Returns:
-        str or None: validated section of the response
+        str or None: header value
     """
-    if section in body and body[section] is not None and body[section].strip() != "":
-        value: str = body[section].strip()
-    else:
-        value: None = None
-    return value
+    event_headers = event["headers"] if "headers" in event and event["headers"] is not None else {}
+    for key, value in event_headers.items():
+        if key.lower() == name.lower():
+            return value
+    return None
 
 
-def validate_phone_number(body: dict, section: str) -> str or None:
+def parse_batch_body(raw_body: str or None, content_type: str or None) -> list:
     """
-        Validates the phone number in the response
+        Parses a batch request body, either a JSON array or NDJSON (one guest per line)
     Args:
-        body (dict): contains the lambda event info
-        section (str): section of the request to analyze
+        raw_body (str or None): request body
+        content_type (str or None): request content type
     Returns:
-        str or None: Validated phone number
+        list: one entry per row, rows that are not valid JSON are kept as ValueErrors
     """
-    if (
-        section in body
-        and body[section] is not None
-        and type(body[section]) == str
-        and body[section].strip() != ""
-    ):
-        phone_number: str = "".join(filter(lambda x: x.isdigit(), body[section]))
-        if phone_number.startswith("1"):
-            phone_number: str = phone_number[1::]
-        if len(phone_number) > 10 or len(phone_number) < 10:
-            phone_number: None = None
-    else:
-        phone_number: None = None
-    return phone_number
+    if raw_body is None or raw_body.strip() == "":
+        raise ValueError("body: must be a JSON array of guests")
+    if content_type is not None and "ndjson" in content_type.lower():
+        rows = []
+        for line in raw_body.splitlines():
+            if line.strip() == "":
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(ValueError("row: is not valid JSON"))
+        return rows
+    rows = json.loads(raw_body)
+    if type(rows) != list:
+        raise ValueError("body: must be a JSON array of guests")
+    return rows
 
 
-def get_number_of_adults(body: dict, section: str) -> int:
+def parse_phone_number(value: str) -> str:
     """
-        Validates the total number of kids that will be attending
+        Normalizes a phone number to E.164, e.g. "(234) 567-8910" to "+12345678910".
+        Numbers without a leading "+" or "00" are read as US numbers, with or without their "1".
     Args:
-        body (dict): contains the lambda event info
-        section (str): section of the request to analyze
+        value (str): phone number as entered
     Returns:
-        int: total number of kids attending
+        str: the number in E.164 format
     """
+    match = US_PHONE_NUMBER.fullmatch(value)
+    if match is not None:
+        return "+" + DEFAULT_COUNTRY_CODE + match[1] + match[2] + match[3]
+    digits = value.translate(PHONE_SEPARATORS)
+    if digits.startswith("+"):
+        digits = digits[1:]
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif len(digits) == 10:
+        digits = DEFAULT_COUNTRY_CODE + digits
+    elif not digits.startswith(DEFAULT_COUNTRY_CODE):
+        raise ValueError("not a valid phone number")
+    # isascii() keeps out the other unicode digits isdigit() accepts, and no country code starts with 0
     if (
-        section in body
-        and body[section] is not None
-        and type(body[section]) == str
-        and body[section].strip() != ""
+        not digits.isdigit()
+        or not digits.isascii()
+        or digits.startswith("0")
+        or not PHONE_MIN_DIGITS <= len(digits) <= PHONE_MAX_DIGITS
     ):
-        try:
-            value = int("".join(filter(lambda x: x.isdigit(), body[section])))
-        except:
-            raise ValueError("total_number_of_guests_attending: must be an int")
-    else:
-        value = 0
+        raise ValueError("not a valid phone number")
+    # US numbers are a 10 digit number with an area code that starts with 2-9
+    if digits.startswith(DEFAULT_COUNTRY_CODE) and (len(digits) != 11 or digits[1] in "01"):
+        raise ValueError("not a valid phone number")
+    return "+" + digits
+
+
+def parse_email_address(value: str) -> str:
+    """
+        Checks the syntax of an email address
+    Args:
+        value (str): email address, already stripped
+    Returns:
+        str: the email address
+    """
+    if len(value) > EMAIL_ADDRESS_MAX_LENGTH or EMAIL_ADDRESS.fullmatch(value) is None:
+        raise ValueError("not a valid email address")
     return value
 
 
+def parse_number_of_guests(value: str) -> int:
+    """
+        Reads the digits of a guest count, e.g. "2 adults"
+    Args:
+        value (str): guest count as entered
+    Returns:
+        int: guest count
+    """
+    try:
+        return int(value if value.isdigit() else NON_DIGITS.sub("", value))
+    except ValueError:
+        raise ValueError("must be an int")
+
+
 def validate_guest(body: dict) -> Guest:
     """
         Validates the request attributes and creates a guest
@@ -131,69 +287,529 @@ def validate_guest(body: dict) -> Guest:
     Returns:
         Guest: validated Guest
     """
-    first_name: str or None = validate_str_section(body, "first_name")
-    if first_name is None or first_name == "":
-        raise ValueError("first_name: is required")
-    last_name: str or None = validate_str_section(body, "last_name")
-    if last_name is None or last_name == "":
-        raise ValueError("last_name: is required")
-    email_address: str or None = validate_str_section(body, "email_address")
-    phone_number = validate_phone_number(body, "phone_number")
-    total_number_of_guests_attending: int = get_number_of_adults(
-        body, "total_number_of_guests_attending"
-    )
-    try:
-        parsed_not_attending = validate_str_section(body, "not_attending")
-        if parsed_not_attending is None:
-            raise
-        not_attending = bool(parsed_not_attending)
-    except:
-        raise ValueError("not_attending: is required and must be a bool")
-
-    guest: Guest = Guest(
-        first_name=first_name,
-        last_name=last_name,
-        phone_number=phone_number,
-        email_address=email_address,
-        total_number_of_guests_attending=total_number_of_guests_attending,
-        not_attending=not_attending,
-    )
+    values, errors = GUEST_SCHEMA(body)
+    if len(errors) > 0:
+        raise ValueError("{}: {}".format(errors[0]["field"], errors[0]["message"]))
+    guest: Guest = Guest(**values)
     return guest
 
 
+def validate_guests(rows: list) -> list:
+    """
+        Validates a batch of guest bodies in one pass
+    Args:
+        rows (list): guest bodies, rows that could not be parsed may be given as their exception
+    Returns:
+        list: a Guest or the ValueError of each row, in order
+    """
+    validate = GUEST_SCHEMA
+    guests = []
+    append = guests.append
+    for row in rows:
+        if type(row) is not dict:
+            append(row if isinstance(row, ValueError) else ValueError("row: must be a JSON object"))
+            continue
+        values, errors = validate(row)
+        if len(errors) > 0:
+            append(ValueError("{}: {}".format(errors[0]["field"], errors[0]["message"])))
+        else:
+            append(Guest(**values))
+    return guests
+
+
+# Compiled once per container, see validation.compile_schema
+GUEST_SCHEMA = compile_schema(
+    [
+        Field("first_name", required=True, strip=True, messages={"required": "is required"}),
+        Field("last_name", required=True, strip=True, messages={"required": "is required"}),
+        Field("email_address", strip=True, parse=parse_email_address, default=None),
+        Field("phone_number", parse=parse_phone_number, default=None),
+        Field("total_number_of_guests_attending", parse=parse_number_of_guests, default=0),
+        # A JSON boolean or one of validation.TRUE_VALUES / FALSE_VALUES, so "false" is False
+        Field(
+            "not_attending",
+            bool,
+            required=True,
+            coerce=False,
+            messages={
+                "required": "is required and must be a bool",
+                "type": "is required and must be a bool",
+                "bool": "is required and must be a bool",
+            },
+        ),
+    ]
+)
+
+
+def validate_get_rsvp_params(params: dict or None) -> dict:
+    """
+        Validates the GET /rsvp query params. Exactly one lookup is required: a guest by
+        "first_name" and "last_name", the guests of an "email", or the guests of a "status",
+        "attending" or "not_attending". "limit" and "cursor" select the page.
+    Args:
+        params (dict or None): query params
+    Returns:
+        dict: validated params
+    """
+    values, errors = GET_RSVP_SCHEMA(params)
+    if len(errors) > 0:
+        raise ValueError("{}: {}".format(errors[0]["field"], errors[0]["message"]))
+    lookups = [lookup for lookup in ("first_name", "email", "status") if lookup in values]
+    if "first_name" in values and "last_name" not in values:
+        raise ValueError("last_name: is required with first_name")
+    if "last_name" in values and "first_name" not in values:
+        raise ValueError("first_name: is required with last_name")
+    if len(lookups) != 1:
+        raise ValueError("params: one of first_name and last_name, email or status is required")
+    return values
+
+
+def encode_rsvp_cursor(last_evaluated_key: dict) -> str:
+    """
+        Builds the opaque cursor handed to clients for the next page
+    Args:
+        last_evaluated_key (dict): LastEvaluatedKey of a Query, string attributes only
+    Returns:
+        str: cursor
+    """
+    key = {name: value["S"] for name, value in last_evaluated_key.items()}
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode("utf-8")).decode("utf-8")
+
+
+def decode_rsvp_cursor(cursor: str) -> dict:
+    """
+        Reads the ExclusiveStartKey back out of a cursor built by encode_rsvp_cursor
+    Args:
+        cursor (str): cursor
+    Returns:
+        dict: key in attribute value format
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))
+    except (binascii.Error, ValueError):
+        raise ValueError("not a valid cursor")
+    if type(key) != dict or "name" not in key or any(type(value) != str for value in key.values()):
+        raise ValueError("not a valid cursor")
+    return {name: {"S": value} for name, value in key.items()}
+
+
+def get_guests(params: dict or None) -> dict:
+    """
+        Looks guests up with a GetItem on the table key or a Query on one of its indexes,
+        never with a Scan
+    Args:
+        params (dict or None): GET /rsvp query params
+    Returns:
+        dict: the guests of the page and the cursor of the next one, None on the last page
+    """
+    values = validate_get_rsvp_params(params)
+    client = get_dynamo_db_client()
+    table_name = get_dynamo_db_table_name()
+    if "first_name" in values:
+        name = values["first_name"].lower() + " " + values["last_name"].lower()
+        item = client.get_item(TableName=table_name, Key={"name": {"S": name}}, ConsistentRead=True).get("Item")
+        return {"guests": [] if item is None else [Guest.from_item(item).to_dict()], "cursor": None}
+
+    if "email" in values:
+        query = {
+            "IndexName": EMAIL_INDEX,
+            "KeyConditionExpression": "email_lower = :key",
+            "ExpressionAttributeValues": {":key": {"S": values["email"].lower()}},
+        }
+    else:
+        query = {
+            "IndexName": RSVP_STATUS_INDEX,
+            "KeyConditionExpression": "rsvp_status = :key",
+            "ExpressionAttributeValues": {":key": {"S": values["status"]}},
+        }
+    if "cursor" in values:
+        query["ExclusiveStartKey"] = values["cursor"]
+    dynamodb_response = client.query(TableName=table_name, Limit=values["limit"], **query)
+    last_evaluated_key = dynamodb_response.get("LastEvaluatedKey")
+    return {
+        "guests": [Guest.from_item(item).to_dict() for item in dynamodb_response["Items"]],
+        "cursor": encode_rsvp_cursor(last_evaluated_key) if last_evaluated_key else None,
+    }
+
+
+GET_RSVP_SCHEMA = compile_schema(
+    [
+        Field("first_name", strip=True),
+        Field("last_name", strip=True),
+        Field("email", strip=True, parse=parse_email_address),
+        Field("status", strip=True, choices=(ATTENDING, NOT_ATTENDING)),
+        Field("limit", int, minimum=1, clamp=MAX_RSVP_PAGE_SIZE, default=DEFAULT_RSVP_PAGE_SIZE),
+        Field("cursor", strip=True, parse=decode_rsvp_cursor),
+    ]
+)
+
+
 def insert_update_guest(guest: Guest) -> int:
     """
-        Insert or updates the guest in the dynamodb table
+        Insert or updates the guest in the dynamodb table, with the summary counters
+    Args:
+        guest (Guest): Guest
+    Returns:
+        int: 200, or 409 if concurrent writes to the same guest kept it from being written
+    """
+    _, failed = write_counted_guests([guest], skip_unchanged=False)
+    return 409 if len(failed) > 0 else 200
+
+
+def upsert_guest(guest: Guest) -> bool:
+    """
+        Writes the guest with the summary counters, unless what they submitted is unchanged,
+        which the content hash of the stored guest tells. A skipped resubmission only costs
+        the read and leaves the item, its last_updated and the table's stream alone.
     Args:
         guest (Guest): Guest
     Returns:
-        int: dynamodb response status code
-    """
-    table = get_dynamo_db_table()
-    dynamodb_response = table.put_item(
-        Item={
-            "name": guest.first_name_lower + " " + guest.last_name_lower,
-            "g_first_name": guest.first_name,
-            "g_last_name": guest.last_name,
-            "g_email_address": guest.email_address,
-            "g_phone_number": guest.phone_number,
-            "total_number_of_guests_attending": guest.total_number_of_guests_attending,
-            "last_updated": guest.last_updated.strftime("%m-%d-%Y, %H:%M:%S"),
-            "not_attending": guest.not_attending,
+        bool: False if the write was skipped because nothing changed
+    """
+    skipped, failed = write_counted_guests([guest], skip_unchanged=True)
+    if len(failed) > 0:
+        raise ValueError("Failure to add guest: conflicting concurrent writes")
+    return guest.name not in skipped
+
+
+def write_counted_guests(
+    guests: list,
+    skip_unchanged: bool = True,
+    max_attempts: int = TRANSACT_MAX_ATTEMPTS,
+    base_delay: float = TRANSACT_BASE_DELAY,
+) -> tuple:
+    """
+        Writes guests and keeps the summary counters in step, TRANSACT_GUESTS at a time. The
+        stored guests are read first and every chunk is one TransactWriteItems call: a Put per
+        guest, conditional on the stored counts it replaces, and an ADD of the chunk's deltas to
+        a random counter shard, so concurrent writers rarely touch the same shard. A chunk whose
+        guests changed since the read is read and tried again.
+    Args:
+        guests (list): Guests, unique on name
+        skip_unchanged (bool): don't write guests whose content hash is the stored one
+        max_attempts (int): attempts per chunk before giving up on it
+        base_delay (float): seconds to wait before the first retry, doubled on every retry
+    Returns:
+        tuple: names of the guests skipped as unchanged, and of the guests that could not be written
+    """
+    from botocore.exceptions import ClientError
+
+    table_name = get_dynamo_db_table_name()
+    dynamodb = get_dynamo_db_client()
+    shards = get_summary_shards()
+    skipped_names, failed_names = set(), set()
+    for start in range(0, len(guests), TRANSACT_GUESTS):
+        chunk = guests[start:start + TRANSACT_GUESTS]
+        for attempt in range(max_attempts):
+            if attempt > 0:
+                time.sleep(base_delay * (2 ** (attempt - 1)))
+            stored_items = {
+                item["name"]["S"]: item
+                for item in batch_get_items(
+                    [{"name": {"S": guest.name}} for guest in chunk],
+                    ConsistentRead=True,
+                    ProjectionExpression=", ".join("#" + attribute for attribute in GUEST_COUNT_ATTRIBUTES),
+                    ExpressionAttributeNames={"#" + attribute: attribute for attribute in GUEST_COUNT_ATTRIBUTES},
+                )
+            }
+            actions, counts, unchanged = [], {}, set()
+            for guest in chunk:
+                stored = stored_items.get(guest.name)
+                item = guest.to_item()
+                if skip_unchanged and stored is not None and stored.get("content_hash") == item["content_hash"]:
+                    unchanged.add(guest.name)
+                    continue
+                put = {"TableName": table_name, "Item": item}
+                if stored is None:
+                    put["ConditionExpression"] = GUEST_NEW_CONDITION
+                    put["ExpressionAttributeNames"] = {"#name": "name"}
+                else:
+                    put["ConditionExpression"] = GUEST_COUNTS_CONDITION
+                    put["ExpressionAttributeNames"] = {
+                        "#total_number_of_guests_attending": "total_number_of_guests_attending",
+                        "#not_attending": "not_attending",
+                    }
+                    put["ExpressionAttributeValues"] = {
+                        ":old_total": stored["total_number_of_guests_attending"],
+                        ":old_not_attending": stored["not_attending"],
+                    }
+                actions.append({"Put": put})
+                add_counts(
+                    counts,
+                    guest_counts(guest.total_number_of_guests_attending, guest.not_attending),
+                    item_counts(stored),
+                )
+            update = summary_update(counts, random.randrange(shards))
+            if update is not None:
+                actions.append({"Update": dict(update, TableName=table_name)})
+            if len(actions) > 0:
+                try:
+                    dynamodb.transact_write_items(TransactItems=actions)
+                except ClientError as e:
+                    if e.response["Error"]["Code"] not in (
+                        "TransactionCanceledException",
+                        "TransactionConflictException",
+                    ):
+                        raise
+                    continue
+            skipped_names |= unchanged
+            _write_stats["writes"] += len(chunk) - len(unchanged)
+            _write_stats["skipped_writes"] += len(unchanged)
+            break
+        else:
+            failed_names.update(guest.name for guest in chunk)
+    return skipped_names, failed_names
+
+
+def batch_get_items(
+    keys: list,
+    max_attempts: int = BATCH_WRITE_MAX_ATTEMPTS,
+    base_delay: float = BATCH_WRITE_BASE_DELAY,
+    **params
+) -> list:
+    """
+        Gets at most 100 items with BatchGetItem, retrying UnprocessedKeys with exponential backoff
+    Args:
+        keys (list): item keys in attribute value format
+        max_attempts (int): attempts before giving up
+        base_delay (float): seconds to wait before the first retry, doubled on every retry
+        **params: other params of the table, e.g. ConsistentRead or ProjectionExpression
+    Returns:
+        list: the items found, in no particular order
+    """
+    table_name = get_dynamo_db_table_name()
+    dynamodb = get_dynamo_db_client()
+    request_items = {table_name: dict(params, Keys=keys)}
+    items = []
+    for attempt in range(max_attempts):
+        if attempt > 0:
+            time.sleep(base_delay * (2 ** (attempt - 1)))
+        dynamodb_response = dynamodb.batch_get_item(RequestItems=request_items)
+        items.extend(dynamodb_response.get("Responses", {}).get(table_name, []))
+        request_items = dynamodb_response.get("UnprocessedKeys") or {}
+        if len(request_items) == 0:
+            return items
+    raise ValueError("Failure to read items: not processed by dynamodb")
+
+
+def get_rsvp_summary() -> dict:
+    """
+        Reads the RSVP summary from its counter shards with one BatchGetItem, whatever the
+        number of guests
+    Returns:
+        dict: number of rsvps, attending and not attending guests and the total number of
+        guests attending
+    """
+    shards = get_summary_shards()
+    items = batch_get_items([{"name": {"S": summary_key(shard)}} for shard in range(shards)])
+    return dict(summary_from_items(items), shards=shards)
+
+
+def insert_update_guests(rows: list) -> dict:
+    """
+        Validates every row and writes the valid guests with the summary counters
+    Args:
+        rows (list): guest bodies
+    Returns:
+        dict: per row results plus written/failed totals
+    """
+    results = [None] * len(rows)
+    # Later rows win when the same guest appears twice, like consecutive put_item calls would,
+    # and BatchWriteItem rejects duplicate keys in one request anyway.
+    guests = {}
+    indexes = {}
+    for index, guest in enumerate(validate_guests(rows)):
+        if isinstance(guest, ValueError):
+            results[index] = {"index": index, "status": "error", "error": guest.__str__()}
+            continue
+        guests[guest.name] = guest
+        indexes.setdefault(guest.name, []).append(index)
+
+    _, failed_names = write_counted_guests(list(guests.values()), skip_unchanged=get_write_mode() == "upsert")
+    for name, name_indexes in indexes.items():
+        for index in name_indexes:
+            if name in failed_names:
+                results[index] = {"index": index, "status": "error", "error": "not processed by dynamodb"}
+            else:
+                results[index] = {"index": index, "status": "ok", "name": name}
+
+    failed = len([r for r in results if r["status"] == "error"])
+    return {"results": results, "written": len(results) - failed, "failed": failed}
+
+
+def write_guest_items(
+    items: list,
+    max_attempts: int = BATCH_WRITE_MAX_ATTEMPTS,
+    base_delay: float = BATCH_WRITE_BASE_DELAY,
+) -> set:
+    """
+        Writes items in BatchWriteItem chunks, retrying UnprocessedItems with exponential backoff
+    Args:
+        items (list): dynamodb items in attribute value format (see Guest.to_item), unique on "name"
+        max_attempts (int): attempts per chunk before giving up on its unprocessed items
+        base_delay (float): seconds to wait before the first retry, doubled on every retry
+    Returns:
+        set: names of the items that could not be written
+    """
+    if len(items) == 0:
+        return set()
+    table_name = get_dynamo_db_table_name()
+    dynamodb = get_dynamo_db_client()
+    unprocessed_names = set()
+    for start in range(0, len(items), BATCH_WRITE_SIZE):
+        request_items = {
+            table_name: [{"PutRequest": {"Item": item}} for item in items[start:start + BATCH_WRITE_SIZE]]
         }
+        for attempt in range(max_attempts):
+            if attempt > 0:
+                time.sleep(base_delay * (2 ** (attempt - 1)))
+            dynamodb_response = dynamodb.batch_write_item(RequestItems=request_items)
+            request_items = dynamodb_response.get("UnprocessedItems") or {}
+            if len(request_items) == 0:
+                break
+        for requests in request_items.values():
+            unprocessed_names.update(r["PutRequest"]["Item"]["name"]["S"] for r in requests)
+    _write_stats["writes"] += len(items) - len(unprocessed_names)
+    return unprocessed_names
+
+
+def get_write_mode() -> str:
+    """
+        Gets how single RSVPs are written from RSVP_WRITE_MODE, "upsert" by default
+    Returns:
+        str: one of WRITE_MODES
+    """
+    mode = os.environ.get("RSVP_WRITE_MODE", "upsert").strip().lower()
+    if mode not in WRITE_MODES:
+        raise ValueError("RSVP_WRITE_MODE: must be 'upsert' or 'put'")
+    return mode
+
+
+def get_summary_shards() -> int:
+    """
+        Gets the number of summary counter shards from RSVP_SUMMARY_SHARDS. It can only be raised
+        safely, the counts of the shards past a lowered number would no longer be read.
+    Returns:
+        int: number of shards
+    """
+    try:
+        shards = int(os.environ.get("RSVP_SUMMARY_SHARDS", str(DEFAULT_SUMMARY_SHARDS)))
+    except ValueError:
+        shards = 0
+    if shards < 1 or shards > MAX_SUMMARY_SHARDS:
+        raise ValueError("RSVP_SUMMARY_SHARDS: must be between 1 and {}".format(MAX_SUMMARY_SHARDS))
+    return shards
+
+
+def get_write_stats() -> dict:
+    """
+        Gets the counters of this container: items written, writes skipped because the guest was
+        unchanged, and responses replayed for an Idempotency-Key
+    Returns:
+        dict: counters
+    """
+    return dict(_write_stats)
+
+
+def get_idempotency_store() -> IdempotencyStore:
+    """
+        Gets the Idempotency-Key store, created once per container. Responses are also kept in the
+        IDEMPOTENCY_TABLE_NAME table when it is set, for IDEMPOTENCY_TTL seconds. A key is held for
+        its request for up to IDEMPOTENCY_CLAIM_TTL seconds.
+    Returns:
+        IdempotencyStore: the store
+    """
+    global _idempotency_store
+    if _idempotency_store is None:
+        _idempotency_store = IdempotencyStore(
+            ttl=float(os.environ.get("IDEMPOTENCY_TTL", "86400")),
+            max_entries=int(os.environ.get("IDEMPOTENCY_CACHE_SIZE", "1024")),
+            table_name=os.environ.get("IDEMPOTENCY_TABLE_NAME") or None,
+            client_factory=get_dynamo_db_client,
+            claim_ttl=float(os.environ.get("IDEMPOTENCY_CLAIM_TTL", "900")),
+        )
+    return _idempotency_store
+
+
+def get_dynamo_db_config() -> "Config":
+    """
+        Builds the botocore config used for dynamodb from the environment
+    Returns:
+        Config: botocore config
+    """
+    from botocore.config import Config
+
+    return Config(
+        max_pool_connections=int(os.environ.get("DYNAMODB_MAX_POOL_CONNECTIONS", "10")),
+        tcp_keepalive=os.environ.get("DYNAMODB_TCP_KEEPALIVE", "true").strip().lower() == "true",
+        connect_timeout=float(os.environ.get("DYNAMODB_CONNECT_TIMEOUT", "2")),
+        read_timeout=float(os.environ.get("DYNAMODB_READ_TIMEOUT", "5")),
+        retries={
+            "mode": os.environ.get("DYNAMODB_RETRY_MODE", "standard"),
+            "max_attempts": int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", "3")),
+        },
     )
-    return dynamodb_response["ResponseMetadata"]["HTTPStatusCode"]
 
 
-def get_dynamo_db_table():
+def get_dynamo_db_resource():
     """
-        Gets the dynamodb table
-    Returns: dynamodb table
+        Gets the dynamodb resource, creating it on the first call in this container
+    Returns: dynamodb resource
+
+    """
+    global _dynamodb_resource
+    if _dynamodb_resource is None:
+        # Imported here rather than with this module, so requests that never reach dynamodb,
+        # e.g. 404s and invalid bodies, don't load boto3 on a cold start
+        import boto3
+
+        _dynamodb_resource = boto3.resource("dynamodb", config=get_dynamo_db_config())
+    return _dynamodb_resource
+
 
+def get_dynamo_db_client():
+    """
+        Gets the low level dynamodb client that backs the cached resource
+    Returns: dynamodb client
+
+    """
+    return get_dynamo_db_resource().meta.client
+
+
+def get_dynamo_db_table_name() -> str:
+    """
+        Gets the name of the dynamodb table from the environment
+    Returns:
+        str: table name
     """
-    dynamodb = boto3.resource("dynamodb")
     table_name = os.environ.get("TABLE_NAME")
     if table_name is None or table_name == "":
         raise ValueError("Unable to get 'TABLE_NAME' variable from environment")
-    table = dynamodb.Table(table_name)
+    return table_name
+
+
+def get_dynamo_db_table():
+    """
+        Gets the dynamodb table
+    Returns: dynamodb table
+
+    """
+    table_name = get_dynamo_db_table_name()
+    table = _dynamodb_tables.get(table_name)
+    if table is None:
+        table = get_dynamo_db_resource().Table(table_name)
+        _dynamodb_tables[table_name] = table
     return table
+
+
+def reset_dynamo_db_cache():
+    """
+        Drops the cached dynamodb resource, tables and idempotency store, and the write counters.
+        Meant for tests.
+    """
+    global _dynamodb_resource, _idempotency_store
+    _dynamodb_resource = None
+    _dynamodb_tables.clear()
+    _idempotency_store = None
+    for counter in _write_stats:
+        _write_stats[counter] = 0
@@ -1,22 +1,149 @@
-from datetime import datetime
+import hashlib
+from collections import namedtuple
+from datetime import datetime, timezone
 
+# Format of last_updated before it was ISO-8601, still read by Guest.from_item
+LEGACY_TIMESTAMP_FORMAT = "%m-%d-%Y, %H:%M:%S"
 
-class Guest(object):
-    def __init__(
-        self,
+# Values of the "rsvp_status" attribute, the partition key of the rsvp_status_index
+ATTENDING = "attending"
+NOT_ATTENDING = "not_attending"
+
+
+class Guest(
+    namedtuple(
+        "Guest",
+        [
+            "name",
+            "first_name",
+            "last_name",
+            "phone_number",
+            "email_address",
+            "total_number_of_guests_attending",
+            "not_attending",
+            "last_updated",
+        ],
+    )
+):
+    """
+    Immutable guest. A tuple with ``__slots__ = ()`` has no per instance ``__dict__``, so bulk
+    imports can hold many of them, and ``name``, the dynamodb key, is computed once here.
+    """
+
+    __slots__ = ()
+
+    def __new__(
+        cls,
         first_name,
         last_name,
         phone_number,
         email_address,
         total_number_of_guests_attending,
         not_attending,
+        last_updated: datetime = None,
     ):
-        self.first_name: str or None = first_name
-        self.first_name_lower: str or None = first_name.lower()
-        self.last_name: str or None = last_name
-        self.last_name_lower: str or None = last_name.lower()
-        self.phone_number: str or None = phone_number
-        self.email_address: str or None = email_address
-        self.total_number_of_guests_attending: int = total_number_of_guests_attending
-        self.last_updated: datetime = datetime.now()
-        self.not_attending: bool = not_attending
+        # tuple.__new__ directly, the namedtuple __new__ would only forward to it
+        return tuple.__new__(
+            cls,
+            (
+                first_name.lower() + " " + last_name.lower(),
+                first_name,
+                last_name,
+                phone_number,
+                email_address,
+                total_number_of_guests_attending,
+                not_attending,
+                last_updated if last_updated is not None else datetime.now(timezone.utc),
+            ),
+        )
+
+    @classmethod
+    def _make(cls, iterable) -> "Guest":
+        # _replace() builds its result with _make(), so name is computed again from the names
+        # rather than copied
+        return cls(*tuple(iterable)[1:])
+
+    def __getnewargs__(self):
+        # copy and pickle call __new__ with these, not with the fields
+        return self[1:]
+
+    @property
+    def first_name_lower(self) -> str:
+        return self.first_name.lower()
+
+    @property
+    def last_name_lower(self) -> str:
+        return self.last_name.lower()
+
+    def content_hash(self) -> str:
+        """
+        Returns:
+            str: hash of what the guest submitted, last_updated left out, so an unchanged
+            resubmission has the same hash
+        """
+        return hashlib.blake2b(repr(self[1:7]).encode("utf-8"), digest_size=16).hexdigest()
+
+    def to_item(self) -> dict:
+        """
+            Builds the dynamodb item in attribute value format, ready for the low level client
+            without going through boto3's TypeSerializer. "rsvp_status" and "email_lower" are the
+            keys of the table's indexes, "email_lower" is left out without an email address since
+            an index key can't be NULL.
+        Returns:
+            dict: dynamodb item
+        """
+        item = {
+            "name": {"S": self.name},
+            "g_first_name": {"S": self.first_name},
+            "g_last_name": {"S": self.last_name},
+            "g_email_address": {"NULL": True} if self.email_address is None else {"S": self.email_address},
+            "g_phone_number": {"NULL": True} if self.phone_number is None else {"S": self.phone_number},
+            "total_number_of_guests_attending": {"N": str(self.total_number_of_guests_attending)},
+            "last_updated": {"S": self.last_updated.isoformat(timespec="seconds")},
+            "not_attending": {"BOOL": self.not_attending},
+            "content_hash": {"S": self.content_hash()},
+            "rsvp_status": {"S": NOT_ATTENDING if self.not_attending else ATTENDING},
+        }
+        if self.email_address is not None:
+            item["email_lower"] = {"S": self.email_address.lower()}
+        return item
+
+    @classmethod
+    def from_item(cls, item: dict) -> "Guest":
+        """
+            Reads a guest back from a dynamodb item in attribute value format
+        Args:
+            item (dict): dynamodb item
+        Returns:
+            Guest: guest
+        """
+        last_updated = item["last_updated"]["S"]
+        try:
+            last_updated = datetime.fromisoformat(last_updated)
+        except ValueError:
+            last_updated = datetime.strptime(last_updated, LEGACY_TIMESTAMP_FORMAT)
+        return cls(
+            item["g_first_name"]["S"],
+            item["g_last_name"]["S"],
+            item["g_phone_number"].get("S"),
+            item["g_email_address"].get("S"),
+            int(item["total_number_of_guests_attending"]["N"]),
+            item["not_attending"]["BOOL"],
+            last_updated,
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: the item as plain JSON values, e.g. for API responses
+        """
+        return {
+            "name": self.name,
+            "g_first_name": self.first_name,
+            "g_last_name": self.last_name,
+            "g_email_address": self.email_address,
+            "g_phone_number": self.phone_number,
+            "total_number_of_guests_attending": self.total_number_of_guests_attending,
+            "last_updated": self.last_updated.isoformat(timespec="seconds"),
+            "not_attending": self.not_attending,
+        }
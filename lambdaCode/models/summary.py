@@ -0,0 +1,111 @@
+from typing import Iterable, Optional
+
+# Keys of the RSVP summary counter shards, kept in the guest table. Guest names always hold a
+# space between the first and last name, these never do, so the two can't collide.
+SUMMARY_KEY_PREFIX = "_rsvp_summary#"
+
+# Counter attribute of each summary field
+SUMMARY_COUNTERS = (
+    ("rsvps", "rsvp_count"),
+    ("attending", "attending_count"),
+    ("not_attending", "not_attending_count"),
+    ("total_number_of_guests_attending", "guest_count"),
+)
+
+
+def summary_key(shard: int) -> str:
+    return SUMMARY_KEY_PREFIX + str(shard)
+
+
+def is_summary_key(name: str) -> bool:
+    return name.startswith(SUMMARY_KEY_PREFIX) and name[len(SUMMARY_KEY_PREFIX):].isdigit()
+
+
+def guest_counts(total_number_of_guests_attending: int, not_attending: bool) -> dict:
+    """
+    Args:
+        total_number_of_guests_attending (int): of one guest
+        not_attending (bool): of one guest
+    Returns:
+        dict: what the guest adds to each counter
+    """
+    return {
+        "rsvp_count": 1,
+        "attending_count": 0 if not_attending else 1,
+        "not_attending_count": 1 if not_attending else 0,
+        "guest_count": total_number_of_guests_attending,
+    }
+
+
+def item_counts(item: Optional[dict]) -> dict:
+    """
+    Args:
+        item (dict or None): stored guest item in attribute value format, None if there is none
+    Returns:
+        dict: what the stored guest adds to each counter, all 0 without a stored guest
+    """
+    if item is None:
+        return {counter: 0 for _, counter in SUMMARY_COUNTERS}
+    return guest_counts(int(item["total_number_of_guests_attending"]["N"]), item["not_attending"]["BOOL"])
+
+
+def add_counts(counts: dict, added: dict, removed: dict = None):
+    """
+        Adds the counts of one guest to ``counts`` in place, less the counts it replaces
+    Args:
+        counts (dict): running deltas
+        added (dict): counts of the new guest
+        removed (dict): counts of the stored guest it replaces
+    """
+    for counter, value in added.items():
+        counts[counter] = counts.get(counter, 0) + value - (removed[counter] if removed is not None else 0)
+
+
+def summary_update(counts: dict, shard: int) -> Optional[dict]:
+    """
+        Builds the UpdateItem params that ADD the deltas to one counter shard, which creates the
+        shard on its first update
+    Args:
+        counts (dict): deltas by counter attribute
+        shard (int): shard to update
+    Returns:
+        dict or None: Key, UpdateExpression and expression attributes, None when every delta is 0
+    """
+    counters = [counter for _, counter in SUMMARY_COUNTERS if counts.get(counter, 0) != 0]
+    if len(counters) == 0:
+        return None
+    return {
+        "Key": {"name": {"S": summary_key(shard)}},
+        "UpdateExpression": "ADD " + ", ".join("#{0} :{0}".format(counter) for counter in counters),
+        "ExpressionAttributeNames": {"#" + counter: counter for counter in counters},
+        "ExpressionAttributeValues": {":" + counter: {"N": str(counts[counter])} for counter in counters},
+    }
+
+
+def summary_item(counts: dict, shard: int) -> dict:
+    """
+    Args:
+        counts (dict): values by counter attribute, missing counters are 0
+        shard (int): shard of the item
+    Returns:
+        dict: the counter shard item in attribute value format
+    """
+    item = {"name": {"S": summary_key(shard)}}
+    for _, counter in SUMMARY_COUNTERS:
+        item[counter] = {"N": str(counts.get(counter, 0))}
+    return item
+
+
+def summary_from_items(items: Iterable[dict]) -> dict:
+    """
+    Args:
+        items (Iterable[dict]): counter shards in attribute value format
+    Returns:
+        dict: the summary, the sum of the shards
+    """
+    summary = {field: 0 for field, _ in SUMMARY_COUNTERS}
+    for item in items:
+        for field, counter in SUMMARY_COUNTERS:
+            if counter in item:
+                summary[field] += int(item[counter]["N"])
+    return summary
@@ -1,6 +1,9 @@
+import copy
 import datetime
 from unittest.mock import patch
 
+import pytest
+
 from lambdaCode.models.guest import Guest
 
 
@@ -34,3 +37,62 @@ def test_guest(mock_datetime):
     assert guest.first_name_lower == exp_first_name.lower()
     assert guest.last_name_lower == exp_last_name.lower()
     assert guest.last_updated == exp_datetime
+
+
+def test_guest_is_immutable_and_slotted():
+    guest = Guest("John", "Smith", None, None, 0, False)
+    with pytest.raises(AttributeError):
+        guest.first_name = "Jane"
+    assert not hasattr(guest, "__dict__")
+    assert guest.name == "john smith"
+    assert copy.copy(guest) == guest
+
+
+def test_guest_replace_recomputes_name():
+    guest = Guest("John", "Smith", None, None, 0, False)
+    replaced = guest._replace(first_name="Jane")
+
+    assert replaced.name == "jane smith"
+    assert replaced.to_item()["name"] == {"S": "jane smith"}
+    assert replaced.last_updated == guest.last_updated
+    assert Guest._make(replaced) == replaced
+
+
+def test_guest_to_item_from_item():
+    last_updated = datetime.datetime(2022, 3, 30, 12, 30, 5, tzinfo=datetime.timezone.utc)
+    guest = Guest("John", "Smith", "+12345678910", None, 2, True, last_updated)
+    item = guest.to_item()
+
+    assert item == {
+        "name": {"S": "john smith"},
+        "g_first_name": {"S": "John"},
+        "g_last_name": {"S": "Smith"},
+        "g_email_address": {"NULL": True},
+        "g_phone_number": {"S": "+12345678910"},
+        "total_number_of_guests_attending": {"N": "2"},
+        "last_updated": {"S": "2022-03-30T12:30:05+00:00"},
+        "not_attending": {"BOOL": True},
+        "content_hash": {"S": guest.content_hash()},
+        "rsvp_status": {"S": "not_attending"},
+    }
+    assert Guest.from_item(item) == guest
+    assert guest.to_dict()["last_updated"] == "2022-03-30T12:30:05+00:00"
+
+
+def test_guest_from_item_legacy_timestamp():
+    item = Guest("John", "Smith", None, None, 0, False).to_item()
+    item["last_updated"] = {"S": "03-30-2022, 12:30:05"}
+    assert Guest.from_item(item).last_updated == datetime.datetime(2022, 3, 30, 12, 30, 5)
+
+
+def test_guest_content_hash():
+    guest = Guest("John", "Smith", None, None, 2, False)
+    resubmitted = Guest("John", "Smith", None, None, 2, False, datetime.datetime(2000, 1, 1))
+    assert guest.content_hash() == resubmitted.content_hash()
+    assert guest.content_hash() != Guest("John", "Smith", None, None, 3, False).content_hash()
+
+
+def test_guest_to_item_index_keys():
+    item = Guest("John", "Smith", None, "John.Smith@Email.com", 2, False).to_item()
+    assert item["email_lower"] == {"S": "john.smith@email.com"}
+    assert item["rsvp_status"] == {"S": "attending"}
@@ -0,0 +1,55 @@
+from lambdaCode.models.guest import Guest
+from lambdaCode.models.summary import (
+    add_counts,
+    guest_counts,
+    is_summary_key,
+    item_counts,
+    summary_from_items,
+    summary_item,
+    summary_key,
+    summary_update,
+)
+
+
+def test_summary_key_never_a_guest_name():
+    assert summary_key(3) == "_rsvp_summary#3"
+    assert is_summary_key(summary_key(0))
+    assert not is_summary_key(Guest("_rsvp_summary#0", "x", None, None, 1, False).name)
+
+
+def test_add_counts_replacing_a_guest():
+    counts = {}
+    add_counts(counts, guest_counts(3, False))
+    add_counts(counts, guest_counts(0, True), item_counts(Guest("a", "b", None, None, 2, False).to_item()))
+    assert counts == {"rsvp_count": 1, "attending_count": 0, "not_attending_count": 1, "guest_count": 1}
+
+
+def test_item_counts_without_item():
+    assert item_counts(None) == {"rsvp_count": 0, "attending_count": 0, "not_attending_count": 0, "guest_count": 0}
+
+
+def test_summary_update_leaves_out_zero_deltas():
+    assert summary_update({"rsvp_count": 0, "guest_count": 0}, 1) is None
+    assert summary_update({"rsvp_count": 0, "guest_count": -2}, 1) == {
+        "Key": {"name": {"S": "_rsvp_summary#1"}},
+        "UpdateExpression": "ADD #guest_count :guest_count",
+        "ExpressionAttributeNames": {"#guest_count": "guest_count"},
+        "ExpressionAttributeValues": {":guest_count": {"N": "-2"}},
+    }
+
+
+def test_summary_from_items():
+    items = [summary_item({"rsvp_count": 2, "attending_count": 2, "guest_count": 5}, 0), summary_item({}, 1)]
+    assert items[1] == {
+        "name": {"S": "_rsvp_summary#1"},
+        "rsvp_count": {"N": "0"},
+        "attending_count": {"N": "0"},
+        "not_attending_count": {"N": "0"},
+        "guest_count": {"N": "0"},
+    }
+    assert summary_from_items(items + [{"name": {"S": "_rsvp_summary#2"}, "rsvp_count": {"N": "1"}}]) == {
+        "rsvps": 3,
+        "attending": 2,
+        "not_attending": 0,
+        "total_number_of_guests_attending": 5,
+    }
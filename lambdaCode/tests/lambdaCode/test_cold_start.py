@@ -0,0 +1,36 @@
+import importlib
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+# Packages that only the first dynamodb call should load
+DYNAMODB_PACKAGES = ("boto3", "botocore", "s3transfer")
+
+
+def loaded(*packages) -> list:
+    return [module for module in sys.modules if module.split(".")[0] in packages]
+
+
+def test_import_without_dynamodb():
+    # sys.modules is restored on exit, so the rest of the suite keeps its modules
+    with patch.dict(sys.modules):
+        for module in loaded("lambdaCode", "validation", *DYNAMODB_PACKAGES):
+            del sys.modules[module]
+
+        lambda_handler = importlib.import_module("lambdaCode.lambda_handler")
+        assert loaded(*DYNAMODB_PACKAGES) == []
+
+        response = lambda_handler.handler({"httpMethod": "GET", "pathParameters": {"proxy": "missing"}, "body": None}, None)
+        assert response["statusCode"] == 404
+        assert loaded(*DYNAMODB_PACKAGES) == []
+
+
+@pytest.mark.skipif(os.environ.get("COLD_START_BUDGET") != "1", reason="wall clock budget, set COLD_START_BUDGET=1")
+def test_cold_start_budget():
+    from benchmarks.bench_cold_start import BUDGETS_MS, LAMBDA_CODE_EVENT, cold_start, within_budget
+
+    report = cold_start("lambdaCode.lambda_handler", LAMBDA_CODE_EVENT, runs=3)
+    assert report["status_code"] == 404
+    assert within_budget(report), (BUDGETS_MS[report["module"]], report["import_ms"])
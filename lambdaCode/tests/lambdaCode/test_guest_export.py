@@ -0,0 +1,206 @@
+import csv
+import io
+import json
+import threading
+import zlib
+from datetime import datetime, timezone
+
+import pytest
+
+from lambdaCode.guest_export import (
+    EXPORT_COLUMNS,
+    attribute_value,
+    export_guests,
+    get_export_columns,
+    main,
+    parallel_scan,
+    projection,
+)
+from lambdaCode.guest_import import import_guests, read_rows
+from lambdaCode.models.guest import Guest
+from lambdaCode.models.summary import summary_item
+
+
+class FakeDynamoDB:
+    """
+    In-memory stand-in for the low level client's scan, with Segment/TotalSegments, Limit,
+    ExclusiveStartKey and ProjectionExpression. Items land in a segment by a hash of their key.
+    """
+
+    def __init__(self, items: list, fail_segment: int = None):
+        self.items = sorted(items, key=lambda item: item["name"]["S"])
+        self.fail_segment = fail_segment
+        self.calls = []
+        self.transactions = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def scan(self, TableName, Segment, TotalSegments, ProjectionExpression, ExpressionAttributeNames, **kwargs):
+        with self.lock:
+            self.calls.append(dict(kwargs, TableName=TableName, Segment=Segment, TotalSegments=TotalSegments))
+            self.threads.add(threading.current_thread().name)
+        if Segment == self.fail_segment:
+            raise RuntimeError("ProvisionedThroughputExceededException")
+        segment = [
+            item for item in self.items if zlib.crc32(item["name"]["S"].encode("utf-8")) % TotalSegments == Segment
+        ]
+        start = kwargs.get("ExclusiveStartKey")
+        if start is not None:
+            segment = [item for item in segment if item["name"]["S"] > start["name"]["S"]]
+        limit = kwargs.get("Limit", len(segment))
+        page = segment[:limit]
+        attributes = [ExpressionAttributeNames[alias.strip()] for alias in ProjectionExpression.split(",")]
+        response = {
+            "Items": [{key: item[key] for key in attributes if key in item} for item in page],
+            "Count": len(page),
+            "ScannedCount": len(page),
+            "ConsumedCapacity": {"TableName": TableName, "CapacityUnits": 0.5},
+        }
+        if len(segment) > limit:
+            response["LastEvaluatedKey"] = {"name": page[-1]["name"]}
+        return response
+
+
+    def transact_write_items(self, TransactItems):
+        self.transactions.append(TransactItems)
+        return {}
+
+
+def make_items(count: int) -> list:
+    last_updated = datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    return [
+        Guest(
+            "First{}".format(index),
+            "Last",
+            "+1234567891{}".format(index % 10) if index % 2 == 0 else None,
+            "guest{}@email.com".format(index) if index % 3 != 0 else None,
+            index % 4,
+            index % 4 == 0,
+            last_updated,
+        ).to_item()
+        for index in range(count)
+    ]
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [({"S": "a"}, "a"), ({"N": "2"}, 2), ({"N": "-2"}, -2), ({"N": "2.5"}, 2.5), ({"BOOL": False}, False), ({"NULL": True}, None)],
+)
+def test_attribute_value(value, expected):
+    assert attribute_value(value) == expected
+
+
+def test_projection_aliases_reserved_words():
+    assert projection(["name", "g_first_name"]) == {
+        "ProjectionExpression": "#a0, #a1",
+        "ExpressionAttributeNames": {"#a0": "name", "#a1": "g_first_name"},
+    }
+
+
+def test_get_export_columns():
+    assert get_export_columns() == list(EXPORT_COLUMNS)
+    assert get_export_columns(["first_name", "name"]) == [("first_name", "g_first_name"), ("name", "name")]
+    with pytest.raises(ValueError) as e_info:
+        get_export_columns(["first_name", "rsvp_status"])
+    assert e_info.value.__str__() == "columns: unknown columns: rsvp_status"
+
+
+def test_parallel_scan_reads_every_segment_and_page():
+    items = make_items(50)
+    client = FakeDynamoDB(items)
+    stats = {}
+
+    scanned = list(parallel_scan(client, "guests", ["name", "g_first_name"], total_segments=4, page_size=3, stats=stats))
+
+    assert sorted(item["name"]["S"] for item in scanned) == sorted(item["name"]["S"] for item in items)
+    assert all(set(item) == {"name", "g_first_name"} for item in scanned)
+    assert {call["Segment"] for call in client.calls} == {0, 1, 2, 3}
+    assert all(call["TotalSegments"] == 4 and call["Limit"] == 3 for call in client.calls)
+    assert all(call["ReturnConsumedCapacity"] == "TOTAL" for call in client.calls)
+    assert len(client.calls) > 4
+    assert len(client.threads) > 1
+    assert stats == {"scanned_count": 50, "consumed_capacity": 0.5 * len(client.calls)}
+
+
+def test_parallel_scan_raises_worker_errors():
+    client = FakeDynamoDB(make_items(20), fail_segment=1)
+    with pytest.raises(RuntimeError) as e_info:
+        list(parallel_scan(client, "guests", ["name"], total_segments=3))
+    assert e_info.value.__str__() == "ProvisionedThroughputExceededException"
+
+
+def test_parallel_scan_stops_workers_when_closed():
+    client = FakeDynamoDB(make_items(200))
+    scan = parallel_scan(client, "guests", ["name"], total_segments=4, page_size=1, max_pending_pages=2)
+    next(scan)
+    scan.close()
+    # Workers stop at the bounded queue instead of scanning everything
+    assert len(client.calls) < 200
+
+
+def test_export_guests_csv_can_be_imported_again():
+    items = make_items(30)
+    output = io.StringIO()
+
+    report = export_guests(output, "csv", client=FakeDynamoDB(items + [summary_item({}, 0)]), table_name="guests", page_size=4)
+
+    assert report["rows"] == 30
+    assert report["segments"] == 4
+    assert report["scanned_count"] == 31
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert rows[0].keys() == {column for column, _ in EXPORT_COLUMNS}
+    by_name = {row["name"]: row for row in rows}
+    assert by_name["first0 last"]["not_attending"] == "True"
+    assert by_name["first0 last"]["email_address"] == ""
+    assert by_name["first0 last"]["phone_number"] == "+12345678910"
+
+    written = []
+    output.seek(0)
+    import_report = import_guests(output, "csv", lambda batch: written.extend(batch) or set())
+    assert import_report["written"] == 30
+    assert import_report["invalid"] == 0
+    assert {item["name"]["S"] for item in written} == {item["name"]["S"] for item in items}
+
+
+def test_export_guests_ndjson():
+    output = io.StringIO()
+
+    export_guests(output, "ndjson", client=FakeDynamoDB(make_items(5)), table_name="guests", columns=["name", "total_number_of_guests_attending"])
+
+    rows = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda row: row["name"])
+    assert rows[1] == {"name": "first1 last", "total_number_of_guests_attending": 1}
+    assert [row for _, row in read_rows(io.StringIO(output.getvalue()), "ndjson")][0].keys() == rows[0].keys()
+
+
+def test_export_guests_columnar_row_groups():
+    output = io.StringIO()
+
+    report = export_guests(
+        output, "columnar", client=FakeDynamoDB(make_items(25)), table_name="guests", columns=["name", "not_attending"], row_group_size=10
+    )
+
+    row_groups = [json.loads(line) for line in output.getvalue().splitlines()]
+    assert [row_group["rows"] for row_group in row_groups] == [10, 10, 5]
+    assert report["rows"] == 25
+    assert all(set(row_group["columns"]) == {"name", "not_attending"} for row_group in row_groups)
+    assert sum(row_group["columns"]["not_attending"].count(True) for row_group in row_groups) == 7
+
+
+def test_export_guests_invalid_format():
+    with pytest.raises(ValueError) as e_info:
+        export_guests(io.StringIO(), "xlsx", client=FakeDynamoDB([]), table_name="guests")
+    assert e_info.value.__str__() == "format: must be one of csv, ndjson, columnar, parquet"
+
+
+def test_main(tmp_path, monkeypatch):
+    client = FakeDynamoDB(make_items(8))
+    monkeypatch.setattr("lambdaCode.guest_export.get_dynamo_db_client", lambda: client)
+    monkeypatch.setenv("TABLE_NAME", "guests")
+    path = tmp_path / "guests.csv"
+
+    report = main([str(path), "--segments", "2", "--columns", "name, first_name"])
+
+    assert report["rows"] == 8
+    assert path.read_text().splitlines()[0] == "name,first_name"
+    assert {call["TableName"] for call in client.calls} == {"guests"}
+    assert {call["TotalSegments"] for call in client.calls} == {2}
@@ -0,0 +1,154 @@
+import json
+import os
+import subprocess
+import sys
+from unittest.mock import patch
+
+import pytest
+
+from lambdaCode.guest_import import (
+    get_file_format,
+    handler,
+    import_guests,
+    main,
+    read_rows,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+CSV_LINES = [
+    "first_name,last_name,email_address,phone_number,total_number_of_guests_attending,not_attending\n",
+    "John,Smith,john@email.com,12345678910,2,False\n",
+    "Jane,Smith,jane@email.com,,1,False\n",
+    ",Smith,nobody@email.com,,1,False\n",
+    "john,SMITH,john@email.com,12345678910,3,False\n",
+    "Bob,Jones,bob@email.com,,a,True\n",
+    "Ann,Lee,ann@email.com,,0,True\n",
+]
+
+
+class FakeWriter:
+    def __init__(self, unprocessed: set = None):
+        self.batches = []
+        self.unprocessed = unprocessed or set()
+
+    def __call__(self, items: list) -> set:
+        self.batches.append(items)
+        return {item["name"]["S"] for item in items} & self.unprocessed
+
+
+@pytest.mark.parametrize(
+    ("key", "expected"),
+    [("guests.csv", "csv"), ("GUESTS.CSV", "csv"), ("guests.ndjson", "ndjson"), ("guests.jsonl", "ndjson")],
+)
+def test_get_file_format(key, expected):
+    assert get_file_format(key) == expected
+
+
+def test_get_file_format_invalid():
+    with pytest.raises(ValueError) as e_info:
+        get_file_format("guests.xlsx")
+    assert e_info.value.__str__() == "file: must be a .csv, .ndjson or .jsonl file"
+
+
+def test_read_rows_is_lazy():
+    def lines():
+        yield json.dumps({"first_name": "John"}) + "\n"
+        raise AssertionError("read past the first row")
+
+    row_number, row = next(read_rows(lines(), "ndjson"))
+    assert row_number == 1
+    assert row == {"first_name": "John"}
+
+
+def test_import_guests_csv():
+    writer = FakeWriter()
+    report = import_guests(iter(CSV_LINES), "csv", writer=writer, batch_size=2)
+
+    assert [[item["name"]["S"] for item in batch] for batch in writer.batches] == [
+        ["john smith", "jane smith"],
+        ["john smith", "ann lee"],
+    ]
+    assert writer.batches[1][0]["total_number_of_guests_attending"] == {"N": "3"}
+    assert report["rows"] == 6
+    # "john smith" repeats in the second batch
+    assert report["duplicates"] == 1
+    assert report["valid"] == 4
+    assert report["invalid"] == 2
+    assert report["written"] == 4
+    assert report["failed"] == 0
+    assert report["errors"] == [
+        {"row": 3, "error": "first_name: is required"},
+        {"row": 5, "error": "total_number_of_guests_attending: must be an int"},
+    ]
+    assert report["peak_rss_mb"] > 0
+
+
+def test_import_guests_ndjson_duplicates_in_batch():
+    rows = [
+        {"first_name": "John", "last_name": "Smith", "total_number_of_guests_attending": "1", "not_attending": "no"},
+        {"first_name": "JOHN", "last_name": "smith", "total_number_of_guests_attending": "2", "not_attending": "no"},
+    ]
+    lines = [json.dumps(row) + "\n" for row in rows] + ["{oops\n"]
+    writer = FakeWriter(unprocessed={"john smith"})
+    report = import_guests(lines, "ndjson", writer=writer)
+
+    assert len(writer.batches) == 1
+    assert writer.batches[0][0]["g_first_name"] == {"S": "JOHN"}
+    assert report["duplicates"] == 1
+    assert report["written"] == 0
+    assert report["failed"] == 1
+    assert report["errors"] == [{"row": 3, "error": "row: is not valid JSON"}]
+
+
+@patch("lambdaCode.guest_import.write_guest_items")
+def test_handler_local_file(mock_write_guest_items, tmp_path):
+    mock_write_guest_items.return_value = set()
+    (tmp_path / "bucket").mkdir()
+    (tmp_path / "bucket" / "guests.csv").write_text("".join(CSV_LINES))
+    event = {"Records": [{"s3": {"bucket": {"name": "bucket"}, "object": {"key": "guests.csv"}}}]}
+
+    with patch.dict(os.environ, {"GUEST_IMPORT_LOCAL_DIR": str(tmp_path)}, clear=True):
+        result = handler(event, None)
+
+    assert len(result["reports"]) == 1
+    assert result["reports"][0]["key"] == "guests.csv"
+    assert result["reports"][0]["written"] == 3
+    mock_write_guest_items.assert_called_once()
+
+
+@patch("lambdaCode.guest_import.write_guest_items")
+def test_handler_decodes_key(mock_write_guest_items, tmp_path):
+    mock_write_guest_items.return_value = set()
+    (tmp_path / "bucket").mkdir()
+    (tmp_path / "bucket" / "guest list+(2).csv").write_text("".join(CSV_LINES))
+    event = {"Records": [{"s3": {"bucket": {"name": "bucket"}, "object": {"key": "guest+list%2B%282%29.csv"}}}]}
+
+    with patch.dict(os.environ, {"GUEST_IMPORT_LOCAL_DIR": str(tmp_path)}, clear=True):
+        result = handler(event, None)
+
+    assert result["reports"][0]["key"] == "guest list+(2).csv"
+    assert result["reports"][0]["written"] == 3
+
+
+def test_main_dry_run_without_boto3(tmp_path):
+    path = tmp_path / "guests.csv"
+    path.write_text("".join(CSV_LINES))
+    script = (
+        "import sys\n"
+        "from lambdaCode.guest_import import main\n"
+        "main([sys.argv[1], '--dry-run'])\n"
+        "assert 'boto3' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", script, str(path)], cwd=ROOT, check=True, capture_output=True)
+
+
+@patch("lambdaCode.guest_import.write_guest_items")
+def test_main_dry_run(mock_write_guest_items, tmp_path, capsys):
+    path = tmp_path / "guests.csv"
+    path.write_text("".join(CSV_LINES))
+    report = main([str(path), "--dry-run"])
+
+    mock_write_guest_items.assert_not_called()
+    assert report["written"] == 3
+    assert json.loads(capsys.readouterr().out)["rows"] == 6
@@ -0,0 +1,38 @@
+import os
+from unittest.mock import patch
+
+from lambdaCode.guest_summary import main, rebuild_summary
+from lambdaCode.models.summary import summary_item
+from lambdaCode.tests.lambdaCode.test_guest_export import FakeDynamoDB, make_items
+
+
+def test_rebuild_summary():
+    client = FakeDynamoDB(make_items(10) + [summary_item({"rsvp_count": 99}, 0)])
+
+    summary = rebuild_summary(client, "guests", shards=3, total_segments=2)
+
+    assert {key: value for key, value in summary.items() if key != "seconds"} == {
+        "rsvps": 10,
+        "attending": 7,
+        "not_attending": 3,
+        "total_number_of_guests_attending": 13,
+        "shards": 3,
+    }
+    (transaction,) = client.transactions
+    assert [action["Put"]["Item"]["name"]["S"] for action in transaction] == [
+        "_rsvp_summary#0",
+        "_rsvp_summary#1",
+        "_rsvp_summary#2",
+    ]
+    assert transaction[0]["Put"]["Item"]["guest_count"] == {"N": "13"}
+    assert transaction[1]["Put"]["Item"]["guest_count"] == {"N": "0"}
+
+
+def test_main(monkeypatch):
+    client = FakeDynamoDB(make_items(4))
+    monkeypatch.setattr("lambdaCode.guest_summary.get_dynamo_db_client", lambda: client)
+    with patch.dict(os.environ, {"TABLE_NAME": "guests", "RSVP_SUMMARY_SHARDS": "2"}, clear=True):
+        summary = main(["--segments", "3"])
+    assert summary["rsvps"] == 4
+    assert summary["shards"] == 2
+    assert {call["TotalSegments"] for call in client.calls} == {3}
@@ -0,0 +1,137 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+from botocore.exceptions import ClientError
+
+from lambdaCode.idempotency import IdempotencyStore, request_hash
+
+RECORD = {"request_hash": "abc", "status_code": 200, "body": {"skipped": False}}
+
+
+def test_request_hash():
+    assert request_hash("post", "rsvp", "{}") == request_hash("POST", "rsvp", "{}")
+    assert request_hash("POST", "rsvp", "{}") != request_hash("POST", "rsvp", '{"a": 1}')
+    assert request_hash("POST", "rsvp", None) == request_hash("POST", "rsvp", "")
+
+
+def test_store_in_process():
+    store = IdempotencyStore(max_entries=1)
+    assert store.get("key-1") is None
+    store.put("key-1", RECORD)
+    assert store.get("key-1") == RECORD
+    store.put("key-2", RECORD)
+    assert store.get("key-1") is None
+    assert store.stats() == {"hits": 1, "table_hits": 0, "misses": 2, "conflicts": 0, "size": 1}
+
+
+@patch("lambdaCode.idempotency.time")
+def test_store_expires(mock_time):
+    mock_time.time.return_value = 1000
+    store = IdempotencyStore(ttl=10)
+    store.put("key", RECORD)
+    mock_time.time.return_value = 1011
+    assert store.get("key") is None
+
+
+@patch("lambdaCode.idempotency.time")
+def test_store_table(mock_time):
+    mock_time.time.return_value = 1000
+    client = MagicMock()
+    store = IdempotencyStore(ttl=60, table_name="IDEMPOTENCY", client_factory=lambda: client)
+    store.put("key", RECORD)
+    item = client.put_item.call_args[1]["Item"]
+    assert item["expires_at"] == {"N": "1060"}
+    assert json.loads(item["body"]["S"]) == RECORD["body"]
+
+    # Another container only has the table
+    client.get_item.return_value = {"Item": item}
+    other = IdempotencyStore(ttl=60, table_name="IDEMPOTENCY", client_factory=lambda: client)
+    assert other.get("key") == RECORD
+    assert other.get("key") == RECORD
+    client.get_item.assert_called_once_with(
+        TableName="IDEMPOTENCY", Key={"idempotency_key": {"S": "key"}}, ConsistentRead=True
+    )
+    assert other.stats()["table_hits"] == 1
+
+    # Items past their TTL that dynamodb hasn't deleted yet
+    mock_time.time.return_value = 2000
+    assert IdempotencyStore(table_name="IDEMPOTENCY", client_factory=lambda: client).get("key") is None
+
+
+def test_claim_in_process():
+    store = IdempotencyStore()
+    assert store.claim("key", "abc") is None
+    assert store.claim("key", "abc") == {"request_hash": "abc", "status_code": None, "body": None}
+    store.put("key", RECORD)
+    assert store.claim("key", "abc") == RECORD
+
+    assert store.claim("other", "abc") is None
+    store.release("other")
+    assert store.claim("other", "abc") is None
+
+
+def conditional_check_failed(item: dict = None) -> ClientError:
+    response = {"Error": {"Code": "ConditionalCheckFailedException", "Message": ""}}
+    if item is not None:
+        response["Item"] = item
+    return ClientError(response, "PutItem")
+
+
+@patch("lambdaCode.idempotency.time")
+def test_claim_table(mock_time):
+    mock_time.time.return_value = 1000
+    client = MagicMock()
+    client.get_item.return_value = {}
+    store = IdempotencyStore(table_name="IDEMPOTENCY", client_factory=lambda: client, claim_ttl=30)
+
+    assert store.claim("key", "abc") is None
+    params = client.put_item.call_args[1]
+    assert params["Item"] == {
+        "idempotency_key": {"S": "key"},
+        "request_hash": {"S": "abc"},
+        "expires_at": {"N": "1030"},
+    }
+    assert params["ConditionExpression"] == "attribute_not_exists(idempotency_key) OR expires_at < :now"
+    assert params["ExpressionAttributeValues"] == {":now": {"N": "1000"}}
+
+    store.release("key")
+    client.delete_item.assert_called_once_with(TableName="IDEMPOTENCY", Key={"idempotency_key": {"S": "key"}})
+
+
+@pytest.mark.parametrize(
+    ("item", "expected"),
+    [
+        # Claimed by another container after this one's get
+        ({"request_hash": {"S": "def"}, "expires_at": {"N": "1030"}}, {"request_hash": "def", "status_code": None, "body": None}),
+        (
+            {
+                "request_hash": {"S": "abc"},
+                "status_code": {"N": "200"},
+                "body": {"S": json.dumps(RECORD["body"])},
+                "expires_at": {"N": "1060"},
+            },
+            RECORD,
+        ),
+    ],
+)
+def test_claim_table_conflict(item, expected):
+    client = MagicMock()
+    client.get_item.return_value = {}
+    client.put_item.side_effect = conditional_check_failed(item)
+    store = IdempotencyStore(table_name="IDEMPOTENCY", client_factory=lambda: client)
+
+    assert store.claim("key", "abc") == expected
+    assert store.stats()["conflicts"] == 1
+    # The claim failed, so nothing is cached in-process
+    assert store.stats()["size"] == 0
+
+
+def test_claim_table_in_progress_not_cached():
+    client = MagicMock()
+    client.get_item.return_value = {"Item": {"request_hash": {"S": "abc"}, "expires_at": {"N": "99999999999"}}}
+    store = IdempotencyStore(table_name="IDEMPOTENCY", client_factory=lambda: client)
+
+    assert store.claim("key", "abc") == {"request_hash": "abc", "status_code": None, "body": None}
+    client.put_item.assert_not_called()
+    assert store.stats()["size"] == 0
@@ -1,20 +1,44 @@
+import json
 import os
 from datetime import datetime
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, ANY
 import pytest
+from botocore.exceptions import ClientError
 
 from lambdaCode.lambda_handler import (
+    get_dynamo_db_config,
+    get_dynamo_db_client,
     get_dynamo_db_table,
-    validate_str_section,
+    reset_dynamo_db_cache,
+    handler,
+    insert_update_guest,
+    insert_update_guests,
+    upsert_guest,
+    get_write_stats,
+    get_guests,
+    encode_rsvp_cursor,
+    decode_rsvp_cursor,
+    parse_batch_body,
+    write_guest_items,
+    write_counted_guests,
+    get_summary_shards,
     validate_guest,
-    validate_phone_number,
-    get_number_of_adults,
+    validate_guests,
+    parse_email_address,
+    parse_phone_number,
 )
 from lambdaCode.models.guest import Guest
 
 
-@patch("lambdaCode.lambda_handler.boto3")
-def test_dynamo_db_table_exception(mock_boto):
+@pytest.fixture(autouse=True)
+def dynamo_db_cache():
+    reset_dynamo_db_cache()
+    yield
+    reset_dynamo_db_cache()
+
+
+@patch("boto3.resource")
+def test_dynamo_db_table_exception(mock_resource):
     with pytest.raises(Exception) as e_info:
         table = get_dynamo_db_table()
     assert (
@@ -22,41 +46,70 @@ def test_dynamo_db_table_exception(mock_boto):
     )
 
 
-@patch("lambdaCode.lambda_handler.boto3")
-def test_dynamo_db_table(mock_boto):
+@patch("boto3.resource")
+def test_dynamo_db_table(mock_resource):
     with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
         res_table = get_dynamo_db_table()
-        mock_boto.resource.assert_called_once_with("dynamodb")
-        mock_boto.resource("dynamodb").Table.assert_called_once_with("TABLE_NAME")
-        exp = mock_boto.resource("dynamodb").Table("TABLE_NAME")
+        mock_resource.assert_called_once_with("dynamodb", config=ANY)
+        mock_resource("dynamodb").Table.assert_called_once_with("TABLE_NAME")
+        exp = mock_resource("dynamodb").Table("TABLE_NAME")
         assert exp == res_table
 
 
-@patch("lambdaCode.lambda_handler.boto3")
-def test_dynamo_db_table_bad(mock_boto):
+@patch("boto3.resource")
+def test_dynamo_db_table_bad(mock_resource):
     with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
         res_table = get_dynamo_db_table()
-        exp = mock_boto.resource().Table()
+        exp = mock_resource().Table()
         assert exp == res_table
 
 
+@patch("boto3.resource")
+def test_dynamo_db_table_cached(mock_resource):
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        first = get_dynamo_db_table()
+        second = get_dynamo_db_table()
+        client = get_dynamo_db_client()
+    assert first is second
+    mock_resource.assert_called_once()
+    mock_resource.return_value.Table.assert_called_once_with("TABLE_NAME")
+    assert client == mock_resource.return_value.meta.client
+
+
+def test_dynamo_db_config():
+    with patch.dict(
+        os.environ,
+        {
+            "DYNAMODB_MAX_POOL_CONNECTIONS": "4",
+            "DYNAMODB_TCP_KEEPALIVE": "false",
+            "DYNAMODB_CONNECT_TIMEOUT": "1",
+            "DYNAMODB_READ_TIMEOUT": "3",
+            "DYNAMODB_RETRY_MODE": "adaptive",
+        },
+        clear=True,
+    ):
+        config = get_dynamo_db_config()
+    assert config.max_pool_connections == 4
+    assert config.tcp_keepalive is False
+    assert config.connect_timeout == 1
+    assert config.read_timeout == 3
+    assert config.retries == {"mode": "adaptive", "max_attempts": 3}
+
+
 @pytest.mark.parametrize(
-    ("body", "section", "expected"),
+    ("section", "value", "expected"),
     [
-        ({"first_name": " John"}, "first_name", "John"),
-        ({"last_name": "Smith "}, "last_name", "Smith"),
-        (
-            {"email_address": " John.Smith@email.com "},
-            "email_address",
-            "John.Smith@email.com",
-        ),
-        ({"last_name": "Smith"}, "last_names", None),
-        ({"email_address": " John.Smith@email.com "}, "last_name", None),
+        ("first_name", " John", "John"),
+        ("last_name", "Smith ", "Smith"),
+        ("email_address", " John.Smith@email.com ", "John.Smith@email.com"),
+        ("email_address", "   ", None),
+        ("email_address", None, None),
     ],
 )
-def test_validate_str_section(expected, section, body):
-    result = validate_str_section(body, section)
-    assert result == expected
+def test_validate_guest_str_section(section, value, expected):
+    body = {"first_name": "John", "last_name": "Smith", "not_attending": "false"}
+    body[section] = value
+    assert getattr(validate_guest(body), section) == expected
 
 
 @pytest.mark.parametrize(
@@ -131,7 +184,7 @@ def test_validate_str_section(expected, section, body):
                 "first_name": " John",
                 "last_name": "Smith ",
                 "email_address": " John.Smith@email.com ",
-                "phone_number": "1234",
+                "phone_number": "2345678910",
                 "total_number_of_guests_attending": "0",
                 "not_attending": 0,
             },
@@ -142,11 +195,23 @@ def test_validate_str_section(expected, section, body):
                 "first_name": " John",
                 "last_name": "Smith ",
                 "email_address": " John.Smith@email.com ",
-                "phone_number": "1234",
+                "phone_number": "2345678910",
                 "total_number_of_guests_attending": "0",
             },
             "not_attending: is required and must be a bool",
         ),
+        (
+            {"first_name": "John", "last_name": "Smith", "not_attending": "maybe"},
+            "not_attending: is required and must be a bool",
+        ),
+        (
+            {"first_name": "John", "last_name": "Smith", "phone_number": "1234", "not_attending": "false"},
+            "phone_number: not a valid phone number",
+        ),
+        (
+            {"first_name": "John", "last_name": "Smith", "email_address": "john@", "not_attending": "false"},
+            "email_address: not a valid email address",
+        ),
     ],
 )
 def test_validate_guest_invalid(expected, body):
@@ -161,7 +226,7 @@ def test_validate_guest_valid(mock_datetime):
     mock_datetime.now.return_value = exp_datetime
     exp_first_name = "first"
     exp_last_name = "last"
-    exp_phone_number = "2345678910"
+    exp_phone_number = "+12345678910"
     exp_email_address = "email@address.com"
     exp_total_number_of_guests_attending = 123
     exp_not_attending = True
@@ -170,7 +235,7 @@ def test_validate_guest_valid(mock_datetime):
         "first_name": exp_first_name,
         "last_name": exp_last_name,
         "email_address": exp_email_address,
-        "phone_number": "1" + exp_phone_number,
+        "phone_number": exp_phone_number[1:],
         "total_number_of_guests_attending": exp_total_number_of_guests_attending.__str__(),
         "not_attending": "True",
     }
@@ -197,57 +262,550 @@ def test_validate_guest_valid(mock_datetime):
     assert result.last_updated == exp_datetime
 
 
-def test_validate_guest_valid_better():
-    # TODO
-    assert True is True
+@pytest.mark.parametrize(
+    ("not_attending", "expected"),
+    [("false", False), (" No ", False), ("0", False), (False, False), ("TRUE", True), ("yes", True), (True, True)],
+)
+def test_validate_guest_not_attending(not_attending, expected):
+    guest = validate_guest({"first_name": "John", "last_name": "Smith", "not_attending": not_attending})
+    assert guest.not_attending is expected
+
+
+def test_validate_guests():
+    rows = [guest_body("John"), {"first_name": "Bob"}, "not a guest", ValueError("row: is not valid JSON")]
+    guests = validate_guests(rows)
+    assert guests[0].first_name == "John"
+    assert guests[0].phone_number == "+12345678910"
+    assert guests[0].not_attending is False
+    assert [e.__str__() for e in guests[1:]] == [
+        "last_name: is required",
+        "row: must be a JSON object",
+        "row: is not valid JSON",
+    ]
 
 
 @pytest.mark.parametrize(
-    ("body", "section", "expected"),
+    ("phone_number", "expected"),
     [
-        ({"phone_number": " 12345678910     "}, "phone_number", "2345678910"),
-        ({"phone_number": " 2345678910     "}, "phone_number", "2345678910"),
-        ({"phone_number": "      "}, "phone_number", None),
-        ({}, "phone_number", None),
+        (" 12345678910     ", "+12345678910"),
+        (" 2345678910     ", "+12345678910"),
+        ("      ", None),
+        (None, None),
     ],
 )
-def test_validate_phone_number(expected, section, body):
-    result = validate_phone_number(body, section)
-    assert result == expected
+def test_validate_guest_phone_number(phone_number, expected):
+    body = {"first_name": "John", "last_name": "Smith", "not_attending": "false", "phone_number": phone_number}
+    assert validate_guest(body).phone_number == expected
+
+
+@pytest.mark.parametrize(("total", "expected"), [(" 2 ", 2), ("  ", 0), (None, 0)])
+def test_validate_guest_number_of_guests(total, expected):
+    body = {"first_name": "John", "last_name": "Smith", "not_attending": "false", "total_number_of_guests_attending": total}
+    assert validate_guest(body).total_number_of_guests_attending == expected
 
 
 @pytest.mark.parametrize(
-    ("body", "section", "expected"),
+    ("value", "expected"),
     [
-        (
-            {"total_number_of_guests_attending": " 2 "},
-            "total_number_of_guests_attending",
-            2,
-        ),
-        (
-            {"total_number_of_guests_attending": "  "},
-            "total_number_of_guests_attending",
-            0,
-        ),
-        ({}, "total_number_of_guests_attending", 0),
+        ("(234) 567-8910", "+12345678910"),
+        ("1.234.567.8910", "+12345678910"),
+        ("+44 20 7946 0958", "+442079460958"),
+        ("0044 20 7946 0958", "+442079460958"),
     ],
 )
-def test_get_number_of_adults(expected, section, body):
-    result = get_number_of_adults(body, section)
-    assert result == expected
+def test_parse_phone_number(value, expected):
+    assert parse_phone_number(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1234", "22345678910", "234-567-891O", "1234567890", "+11234567890", "+0123456789", "+1234567890123456", "２３４５６７８９１０"])
+def test_parse_phone_number_invalid(value):
+    with pytest.raises(ValueError) as e_info:
+        parse_phone_number(value)
+    assert e_info.value.__str__() == "not a valid phone number"
+
 
+@pytest.mark.parametrize(
+    ("value", "valid"),
+    [
+        ("john.smith@email.com", True),
+        ("j+rsvp@mail.example.co.uk", True),
+        ("john@", False),
+        ("@email.com", False),
+        ("john smith@email.com", False),
+        ("john@email", False),
+        ("john..smith@email.com", False),
+        ("john@-email.com", False),
+    ],
+)
+def test_parse_email_address(value, valid):
+    if valid:
+        assert parse_email_address(value) == value
+    else:
+        with pytest.raises(ValueError):
+            parse_email_address(value)
 
-def test_get_number_of_adults_failed():
-    body = {"total_number_of_guests_attending": "a"}
-    section = "total_number_of_guests_attending"
+
+def test_validate_guest_number_of_guests_failed():
+    body = {"first_name": "John", "last_name": "Smith", "not_attending": "false", "total_number_of_guests_attending": "a"}
     expected = "total_number_of_guests_attending: must be an int"
 
     with pytest.raises(ValueError) as e_info:
-        result = get_number_of_adults(body, section)
+        validate_guest(body)
+    assert e_info.value.__str__() == expected
+
+
+def stored_guests(mock_client, *guests):
+    items = [
+        {key: guest.to_item()[key] for key in ("name", "total_number_of_guests_attending", "not_attending", "content_hash")}
+        for guest in guests
+    ]
+    mock_client.batch_get_item.return_value = {"Responses": {"TABLE_NAME": items}}
+
+
+@patch("boto3.resource")
+def test_insert_update_guest_new(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    stored_guests(mock_client)
+    guest = Guest("John", "Smith", None, "john@email.com", 2, False)
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        assert insert_update_guest(guest) == 200
+
+    request = mock_client.batch_get_item.call_args[1]["RequestItems"]["TABLE_NAME"]
+    assert request["Keys"] == [{"name": {"S": "john smith"}}]
+    assert request["ConsistentRead"] is True
+    put, update = [action for action in mock_client.transact_write_items.call_args[1]["TransactItems"]]
+    assert put["Put"]["Item"] == guest.to_item()
+    assert put["Put"]["ConditionExpression"] == "attribute_not_exists(#name)"
+    assert update["Update"]["Key"]["name"]["S"].startswith("_rsvp_summary#")
+    assert update["Update"]["UpdateExpression"] == "ADD #rsvp_count :rsvp_count, #attending_count :attending_count, #guest_count :guest_count"
+    assert update["Update"]["ExpressionAttributeValues"] == {
+        ":rsvp_count": {"N": "1"},
+        ":attending_count": {"N": "1"},
+        ":guest_count": {"N": "2"},
+    }
+    assert get_write_stats()["writes"] == 1
+
+
+@patch("boto3.resource")
+def test_upsert_guest_changes_counts(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    stored_guests(mock_client, Guest("John", "Smith", None, None, 2, False))
+    guest = Guest("John", "Smith", None, None, 0, True)
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        assert upsert_guest(guest) is True
+
+    put, update = mock_client.transact_write_items.call_args[1]["TransactItems"]
+    assert put["Put"]["ConditionExpression"] == (
+        "#total_number_of_guests_attending = :old_total AND #not_attending = :old_not_attending"
+    )
+    assert put["Put"]["ExpressionAttributeValues"] == {":old_total": {"N": "2"}, ":old_not_attending": {"BOOL": False}}
+    assert update["Update"]["ExpressionAttributeValues"] == {
+        ":attending_count": {"N": "-1"},
+        ":not_attending_count": {"N": "1"},
+        ":guest_count": {"N": "-2"},
+    }
+
+
+@patch("boto3.resource")
+def test_upsert_guest_same_counts(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    stored_guests(mock_client, Guest("John", "Smith", None, None, 2, False))
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        assert upsert_guest(Guest("John", "Smith", None, "john@email.com", 2, False)) is True
+    # Only the guest is written, none of the counters changed
+    (put,) = mock_client.transact_write_items.call_args[1]["TransactItems"]
+    assert put["Put"]["Item"]["email_lower"] == {"S": "john@email.com"}
+
+
+@patch("boto3.resource")
+def test_upsert_guest_unchanged(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    guest = Guest("John", "Smith", None, "john@email.com", 2, False)
+    stored_guests(mock_client, guest)
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        assert upsert_guest(guest) is False
+        assert insert_update_guest(guest) == 200
+    assert mock_client.transact_write_items.call_count == 1
+    assert get_write_stats() == {"writes": 1, "skipped_writes": 1, "replays": 0}
+
+
+@patch("lambdaCode.lambda_handler.time.sleep")
+@patch("boto3.resource")
+def test_upsert_guest_retries_conflicts(mock_resource, mock_sleep):
+    mock_client = mock_resource.return_value.meta.client
+    stored_guests(mock_client)
+    mock_client.transact_write_items.side_effect = [
+        ClientError({"Error": {"Code": "TransactionCanceledException"}}, "TransactWriteItems"),
+        {},
+    ]
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        assert upsert_guest(Guest("John", "Smith", None, None, 2, False)) is True
+    assert mock_client.batch_get_item.call_count == 2
+    assert mock_client.transact_write_items.call_count == 2
+
+    mock_client.transact_write_items.side_effect = ClientError(
+        {"Error": {"Code": "TransactionCanceledException"}}, "TransactWriteItems"
+    )
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        with pytest.raises(ValueError) as e_info:
+            upsert_guest(Guest("John", "Smith", None, None, 2, False))
+        assert insert_update_guest(Guest("John", "Smith", None, None, 2, False)) == 409
+    assert e_info.value.__str__() == "Failure to add guest: conflicting concurrent writes"
+
+
+@patch("boto3.resource")
+def test_upsert_guest_error(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    stored_guests(mock_client)
+    mock_client.transact_write_items.side_effect = ClientError({"Error": {"Code": "ValidationException"}}, "TransactWriteItems")
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        with pytest.raises(ClientError):
+            upsert_guest(Guest("John", "Smith", None, None, 2, False))
+
+
+@patch("boto3.resource")
+def test_write_counted_guests_chunks(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    stored_guests(mock_client, Guest("Guest0", "Smith", None, None, 1, False))
+    guests = [Guest("Guest{}".format(index), "Smith", None, None, 1, index % 2 == 0) for index in range(30)]
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME", "RSVP_SUMMARY_SHARDS": "1"}, clear=True):
+        assert write_counted_guests(guests, skip_unchanged=False) == (set(), set())
+
+    first, second = [call[1]["TransactItems"] for call in mock_client.transact_write_items.call_args_list]
+    assert [len(first), len(second)] == [25, 7]
+    assert first[-1]["Update"]["Key"] == {"name": {"S": "_rsvp_summary#0"}}
+    # guest0 was stored as attending and only moves to not attending
+    assert first[-1]["Update"]["ExpressionAttributeValues"] == {
+        ":rsvp_count": {"N": "23"},
+        ":attending_count": {"N": "11"},
+        ":not_attending_count": {"N": "12"},
+        ":guest_count": {"N": "23"},
+    }
+
+
+@pytest.mark.parametrize("shards", ["0", "101", "a"])
+def test_get_summary_shards_invalid(shards):
+    with patch.dict(os.environ, {"RSVP_SUMMARY_SHARDS": shards}, clear=True):
+        with pytest.raises(ValueError) as e_info:
+            get_summary_shards()
+    assert e_info.value.__str__() == "RSVP_SUMMARY_SHARDS: must be between 1 and 100"
+
+
+@patch("boto3.resource")
+def test_handler_rsvp_summary(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    mock_client.batch_get_item.side_effect = [
+        {
+            "Responses": {
+                "TABLE_NAME": [
+                    {"name": {"S": "_rsvp_summary#0"}, "rsvp_count": {"N": "3"}, "attending_count": {"N": "2"}, "guest_count": {"N": "5"}},
+                ]
+            },
+            "UnprocessedKeys": {"TABLE_NAME": {"Keys": [{"name": {"S": "_rsvp_summary#2"}}]}},
+        },
+        {
+            "Responses": {
+                "TABLE_NAME": [
+                    {"name": {"S": "_rsvp_summary#2"}, "rsvp_count": {"N": "1"}, "not_attending_count": {"N": "1"}, "guest_count": {"N": "-1"}},
+                ]
+            }
+        },
+    ]
+    event = {"httpMethod": "GET", "pathParameters": {"proxy": "rsvp/summary"}}
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME", "RSVP_SUMMARY_SHARDS": "3"}, clear=True):
+        with patch("lambdaCode.lambda_handler.time.sleep"):
+            response = handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {
+        "rsvps": 4,
+        "attending": 2,
+        "not_attending": 1,
+        "total_number_of_guests_attending": 4,
+        "shards": 3,
+    }
+    keys = mock_client.batch_get_item.call_args_list[0][1]["RequestItems"]["TABLE_NAME"]["Keys"]
+    assert keys == [{"name": {"S": "_rsvp_summary#{}".format(shard)}} for shard in range(3)]
+
+
+@patch("lambdaCode.lambda_handler.upsert_guest")
+def test_handler_rsvp_idempotency_key(mock_upsert_guest):
+    mock_upsert_guest.return_value = True
+    event = {
+        "httpMethod": "POST",
+        "pathParameters": {"proxy": "rsvp"},
+        "headers": {"idempotency-key": "key-1"},
+        "body": json.dumps(guest_body("John")),
+    }
+    with patch.dict(os.environ, {}, clear=True):
+        first = handler(event, None)
+        replay = handler(event, None)
+        conflict = handler(dict(event, body=json.dumps(guest_body("Jane"))), None)
+
+    assert first["statusCode"] == 200
+    assert json.loads(first["body"])["skipped"] is False
+    assert replay["body"] == first["body"]
+    assert replay["headers"]["Idempotent-Replayed"] == "true"
+    assert mock_upsert_guest.call_count == 1
+    assert conflict["statusCode"] == 500
+    assert json.loads(conflict["body"]) == {"error": "Idempotency-Key: was already used for a different request"}
+    assert get_write_stats()["replays"] == 1
+
+
+@patch("lambdaCode.lambda_handler.upsert_guest")
+def test_handler_rsvp_idempotency_key_overlapping(mock_upsert_guest):
+    event = {
+        "httpMethod": "POST",
+        "pathParameters": {"proxy": "rsvp"},
+        "headers": {"idempotency-key": "key-1"},
+        "body": json.dumps(guest_body("John")),
+    }
+    overlapping = []
+
+    def upsert_guest(guest):
+        # A second request with the same key arrives while the first is writing
+        overlapping.append(handler(dict(event, body=json.dumps(guest_body("Jane"))), None))
+        return True
+
+    mock_upsert_guest.side_effect = upsert_guest
+    with patch.dict(os.environ, {}, clear=True):
+        first = handler(event, None)
+        replay = handler(event, None)
+
+    assert overlapping[0]["statusCode"] == 409
+    assert json.loads(overlapping[0]["body"]) == {"error": "Idempotency-Key: a request with this key is in progress"}
+    assert mock_upsert_guest.call_count == 1
+    assert first["statusCode"] == 200
+    assert replay["body"] == first["body"]
+
+
+@patch("lambdaCode.lambda_handler.upsert_guest")
+def test_handler_rsvp_idempotency_key_released_on_error(mock_upsert_guest):
+    mock_upsert_guest.side_effect = [ValueError("write failed"), True]
+    event = {
+        "httpMethod": "POST",
+        "pathParameters": {"proxy": "rsvp"},
+        "headers": {"idempotency-key": "key-1"},
+        "body": json.dumps(guest_body("John")),
+    }
+    with patch.dict(os.environ, {}, clear=True):
+        failed = handler(event, None)
+        retried = handler(event, None)
+
+    assert failed["statusCode"] == 500
+    assert retried["statusCode"] == 200
+    assert mock_upsert_guest.call_count == 2
+
+
+@patch("lambdaCode.lambda_handler.insert_update_guest")
+def test_handler_rsvp_put_mode(mock_insert_update_guest):
+    mock_insert_update_guest.return_value = 200
+    event = {"httpMethod": "POST", "pathParameters": {"proxy": "rsvp"}, "body": json.dumps(guest_body("John"))}
+    with patch.dict(os.environ, {"RSVP_WRITE_MODE": "put"}, clear=True):
+        response = handler(event, None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["guest"]["name"] == "john smith"
+    mock_insert_update_guest.assert_called_once()
+
+
+def test_rsvp_cursor():
+    key = {"name": {"S": "john smith"}, "rsvp_status": {"S": "attending"}}
+    assert decode_rsvp_cursor(encode_rsvp_cursor(key)) == key
+
+
+@pytest.mark.parametrize("cursor", ["not base64!", "e30=", "WzFd", "eyJuYW1lIjogMX0="])
+def test_rsvp_cursor_invalid(cursor):
+    with pytest.raises(ValueError) as e_info:
+        decode_rsvp_cursor(cursor)
+    assert e_info.value.__str__() == "not a valid cursor"
+
+
+@patch("boto3.resource")
+def test_get_guests_by_name(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    mock_client.get_item.return_value = {"Item": Guest("John", "Smith", None, None, 2, False).to_item()}
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        result = get_guests({"first_name": " JOHN ", "last_name": "smith"})
+    assert [guest["name"] for guest in result["guests"]] == ["john smith"]
+    assert result["cursor"] is None
+    mock_client.get_item.assert_called_once_with(
+        TableName="TABLE_NAME", Key={"name": {"S": "john smith"}}, ConsistentRead=True
+    )
+    mock_client.query.assert_not_called()
+    mock_client.scan.assert_not_called()
+
+
+@patch("boto3.resource")
+def test_get_guests_by_email(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    mock_client.query.return_value = {"Items": [Guest("John", "Smith", None, "j@email.com", 2, False).to_item()]}
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        result = get_guests({"email": "J@Email.com"})
+    assert result["cursor"] is None
+    mock_client.query.assert_called_once_with(
+        TableName="TABLE_NAME",
+        Limit=50,
+        IndexName="email_index",
+        KeyConditionExpression="email_lower = :key",
+        ExpressionAttributeValues={":key": {"S": "j@email.com"}},
+    )
+
+
+@patch("boto3.resource")
+def test_get_guests_by_status_pages(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    last_key = {"name": {"S": "john smith"}, "rsvp_status": {"S": "not_attending"}}
+    mock_client.query.return_value = {
+        "Items": [Guest("John", "Smith", None, None, 0, True).to_item()],
+        "LastEvaluatedKey": last_key,
+    }
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        first = get_guests({"status": "not_attending", "limit": "1"})
+        get_guests({"status": "not_attending", "limit": "500", "cursor": first["cursor"]})
+    assert first["guests"][0]["not_attending"] is True
+    first_call, second_call = [call[1] for call in mock_client.query.call_args_list]
+    assert first_call["IndexName"] == "rsvp_status_index"
+    assert first_call["Limit"] == 1
+    assert "ExclusiveStartKey" not in first_call
+    assert second_call["Limit"] == 100
+    assert second_call["ExclusiveStartKey"] == last_key
+
+
+@pytest.mark.parametrize(
+    ("params", "expected"),
+    [
+        (None, "params: one of first_name and last_name, email or status is required"),
+        ({"first_name": "John"}, "last_name: is required with first_name"),
+        ({"last_name": "Smith"}, "first_name: is required with last_name"),
+        ({"email": "j@email.com", "status": "attending"}, "params: one of first_name and last_name, email or status is required"),
+        ({"status": "maybe"}, "status: must be one of attending, not_attending"),
+        ({"email": "john@"}, "email: not a valid email address"),
+        ({"status": "attending", "limit": "0"}, "limit: must be greater than 0"),
+        ({"status": "attending", "cursor": "e30="}, "cursor: not a valid cursor"),
+    ],
+)
+def test_get_guests_invalid(params, expected):
+    with pytest.raises(ValueError) as e_info:
+        get_guests(params)
     assert e_info.value.__str__() == expected
 
 
+@patch("lambdaCode.lambda_handler.get_guests")
+def test_handler_get_rsvp(mock_get_guests):
+    mock_get_guests.return_value = {"guests": [], "cursor": None}
+    event = {"httpMethod": "GET", "pathParameters": {"proxy": "rsvp"}, "queryStringParameters": {"status": "attending"}}
+    response = handler(event, None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"guests": [], "cursor": None}
+    mock_get_guests.assert_called_once_with({"status": "attending"})
+
+
+def guest_body(first_name: str, last_name: str = "Smith") -> dict:
+    return {
+        "first_name": first_name,
+        "last_name": last_name,
+        "email_address": "{}@email.com".format(first_name),
+        "phone_number": "12345678910",
+        "total_number_of_guests_attending": "2",
+        "not_attending": "False",
+    }
+
+
+def test_parse_batch_body_json():
+    rows = parse_batch_body(json.dumps([guest_body("John"), guest_body("Jane")]), "application/json")
+    assert rows == [guest_body("John"), guest_body("Jane")]
+
+
+def test_parse_batch_body_ndjson():
+    raw_body = json.dumps(guest_body("John")) + "\n\n{not json\n" + json.dumps(guest_body("Jane")) + "\n"
+    rows = parse_batch_body(raw_body, "application/x-ndjson")
+    assert rows[0] == guest_body("John")
+    assert isinstance(rows[1], ValueError)
+    assert rows[2] == guest_body("Jane")
+
 
-def test_insert_update_guest():
-    # TODO
-    assert False == False
+@pytest.mark.parametrize("raw_body", [None, "  ", json.dumps(guest_body("John"))])
+def test_parse_batch_body_invalid(raw_body):
+    with pytest.raises(ValueError) as e_info:
+        parse_batch_body(raw_body, None)
+    assert e_info.value.__str__() == "body: must be a JSON array of guests"
+
+
+@patch("boto3.resource")
+def test_write_guest_items_chunks_and_retries(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    items = [{"name": {"S": "guest {}".format(i)}} for i in range(30)]
+    unprocessed = {"TABLE_NAME": [{"PutRequest": {"Item": items[0]}}]}
+    mock_client.batch_write_item.side_effect = [
+        {"UnprocessedItems": unprocessed},
+        {"UnprocessedItems": {}},
+        {},
+    ]
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        result = write_guest_items(items, base_delay=0)
+
+    assert result == set()
+    calls = mock_client.batch_write_item.call_args_list
+    assert len(calls) == 3
+    assert len(calls[0][1]["RequestItems"]["TABLE_NAME"]) == 25
+    assert calls[1][1]["RequestItems"] == unprocessed
+    assert len(calls[2][1]["RequestItems"]["TABLE_NAME"]) == 5
+
+
+@patch("boto3.resource")
+def test_write_guest_items_gives_up(mock_resource):
+    mock_client = mock_resource.return_value.meta.client
+    unprocessed = {"TABLE_NAME": [{"PutRequest": {"Item": {"name": {"S": "john smith"}}}}]}
+    mock_client.batch_write_item.return_value = {"UnprocessedItems": unprocessed}
+    with patch.dict(os.environ, {"TABLE_NAME": "TABLE_NAME"}, clear=True):
+        result = write_guest_items([{"name": {"S": "john smith"}}], max_attempts=3, base_delay=0)
+    assert result == {"john smith"}
+    assert mock_client.batch_write_item.call_count == 3
+
+
+@patch("lambdaCode.lambda_handler.write_counted_guests")
+def test_insert_update_guests(mock_write_counted_guests):
+    mock_write_counted_guests.return_value = (set(), {"jane smith"})
+    rows = [guest_body("John"), {"first_name": "Bob"}, "not a guest", guest_body("Jane"), guest_body("JOHN")]
+    result = insert_update_guests(rows)
+
+    written = mock_write_counted_guests.call_args[0][0]
+    assert [guest.name for guest in written] == ["john smith", "jane smith"]
+    assert written[0].first_name == "JOHN"
+    assert mock_write_counted_guests.call_args[1] == {"skip_unchanged": True}
+    assert result["results"] == [
+        {"index": 0, "status": "ok", "name": "john smith"},
+        {"index": 1, "status": "error", "error": "last_name: is required"},
+        {"index": 2, "status": "error", "error": "row: must be a JSON object"},
+        {"index": 3, "status": "error", "error": "not processed by dynamodb"},
+        {"index": 4, "status": "ok", "name": "john smith"},
+    ]
+    assert result["written"] == 2
+    assert result["failed"] == 3
+
+
+@patch("lambdaCode.lambda_handler.write_counted_guests")
+def test_handler_rsvp_batch(mock_write_counted_guests):
+    mock_write_counted_guests.return_value = (set(), set())
+    event = {
+        "httpMethod": "POST",
+        "pathParameters": {"proxy": "rsvp/batch"},
+        "headers": {"content-type": "application/x-ndjson"},
+        "body": json.dumps(guest_body("John")) + "\n" + json.dumps(guest_body("Jane")),
+    }
+    response = handler(event, None)
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert body["written"] == 2
+    assert body["failed"] == 0
+
+
+def test_handler_rsvp_batch_invalid_body():
+    event = {
+        "httpMethod": "POST",
+        "pathParameters": {"proxy": "rsvp/batch"},
+        "body": json.dumps(guest_body("John")),
+    }
+    response = handler(event, None)
+    assert response["statusCode"] == 500
+    assert json.loads(response["body"]) == {"error": "body: must be a JSON array of guests"}
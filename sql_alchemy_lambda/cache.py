@@ -0,0 +1,297 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import time
+from collections import OrderedDict
+from typing import Callable, Iterable, Optional, Tuple
+
+# Returned by ResultCache.get() when there is no usable entry, since None/[] are valid values
+MISS = object()
+
+# (expires_at, value, book_ids)
+Entry = Tuple[float, object, frozenset]
+
+
+def make_cache_key(route: str, validated_params: dict) -> str:
+    """
+    Builds a stable cache key from a route and its validated params
+    Args:
+        route: str
+        validated_params: dict
+    Returns:
+        str: cache key
+    """
+    return route + "?" + json.dumps(validated_params, sort_keys=True, separators=(",", ":"))
+
+
+class CacheBackend(ABC):
+    """
+    Second level cache shared between containers. Entries are looked up by key and
+    invalidated by the ids of the books they contain.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Entry]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, entry: Entry):
+        pass
+
+    @abstractmethod
+    def delete_books(self, book_ids: Iterable[int]):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Local file stand-in for a shared second level cache such as redis or memcached. The ids of
+    the books in each entry are kept in an indexed side table, so invalidation is one lookup.
+    """
+
+    # Book ids per DELETE, below the 999 bound parameters older SQLite builds allow
+    DELETE_CHUNK_SIZE = 500
+
+    def __init__(self, path: str):
+        # Imported here, a cold start that only uses the in-process cache doesn't load sqlite3
+        import sqlite3
+
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache_entry "
+            "(key TEXT PRIMARY KEY, expires_at REAL NOT NULL, value TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS result_cache_book "
+            "(key TEXT NOT NULL REFERENCES result_cache_entry (key) ON DELETE CASCADE, book_id INTEGER NOT NULL, "
+            "PRIMARY KEY (key, book_id)) WITHOUT ROWID"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS ix_result_cache_book_book_id ON result_cache_book (book_id)"
+        )
+
+    def get(self, key: str) -> Optional[Entry]:
+        row = self.connection.execute(
+            "SELECT expires_at, value FROM result_cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        book_ids = frozenset(
+            book_id for book_id, in self.connection.execute("SELECT book_id FROM result_cache_book WHERE key = ?", (key,))
+        )
+        return row[0], json.loads(row[1]), book_ids
+
+    def set(self, key: str, entry: Entry):
+        expires_at, value, book_ids = entry
+        self.connection.execute("BEGIN")
+        try:
+            # The old entry's book ids go with it
+            self.connection.execute("DELETE FROM result_cache_entry WHERE key = ?", (key,))
+            self.connection.execute(
+                "INSERT INTO result_cache_entry (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, expires_at, json.dumps(value)),
+            )
+            self.connection.executemany(
+                "INSERT INTO result_cache_book (key, book_id) VALUES (?, ?)",
+                [(key, int(book_id)) for book_id in book_ids],
+            )
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def delete_books(self, book_ids: Iterable[int]):
+        book_ids = sorted({int(book_id) for book_id in book_ids})
+        for start in range(0, len(book_ids), self.DELETE_CHUNK_SIZE):
+            chunk = book_ids[start:start + self.DELETE_CHUNK_SIZE]
+            self.connection.execute(
+                "DELETE FROM result_cache_entry WHERE key IN "
+                "(SELECT key FROM result_cache_book WHERE book_id IN ({}))".format(",".join("?" * len(chunk))),
+                chunk,
+            )
+
+    def clear(self):
+        self.connection.execute("DELETE FROM result_cache_entry")
+
+
+class ResultCache:
+    """
+    In-process read-through cache with LRU eviction and per-entry TTLs.
+    Empty results are cached too, for ``negative_ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60, negative_ttl: float = 10, backend: CacheBackend = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.backend = backend
+        self.entries = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "backend_hits": 0}
+
+    def get(self, key: str):
+        """
+        Args:
+            key: str
+        Returns:
+            the cached value, or MISS
+        """
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] <= now:
+            del self.entries[key]
+            self.counters["expirations"] += 1
+            entry = None
+        if entry is None and self.backend is not None:
+            entry = self.backend.get(key)
+            if entry is not None and entry[0] > now:
+                self.counters["backend_hits"] += 1
+                self._store(key, entry)
+            else:
+                entry = None
+        if entry is None:
+            self.counters["misses"] += 1
+            return MISS
+        self.entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return entry[1]
+
+    def set(self, key: str, value, book_ids: Iterable[int] = (), empty: bool = False):
+        """
+        Args:
+            key: str
+            value: JSON serializable value to cache
+            book_ids: ids of the books in the value, used for invalidation
+            empty: cache with the negative ttl
+        """
+        entry = (time.time() + (self.negative_ttl if empty else self.ttl), value, frozenset(book_ids))
+        self._store(key, entry)
+        if self.backend is not None:
+            self.backend.set(key, entry)
+
+    def _store(self, key: str, entry: Entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def invalidate_books(self, book_ids: Iterable[int]):
+        """
+        Drops every entry that contains one of the books
+        Args:
+            book_ids: ids of the books that changed
+        """
+        book_ids = frozenset(book_ids)
+        for key in [key for key, entry in self.entries.items() if not entry[2].isdisjoint(book_ids)]:
+            del self.entries[key]
+            self.counters["invalidations"] += 1
+        if self.backend is not None:
+            self.backend.delete_books(book_ids)
+
+    def clear(self):
+        """
+        Drops every entry, for writes that can change any result (e.g. a new book)
+        """
+        self.counters["invalidations"] += len(self.entries)
+        self.entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: counters plus the current number of entries
+        """
+        return dict(self.counters, size=len(self.entries))
+
+
+class StatementCache:
+    """
+    LRU cache of built SQL statements by the shape of the request, e.g. which filters it uses.
+    Statements hold bound parameters only, so one statement serves every request of a shape
+    and SQLAlchemy's compiled cache finds it without rebuilding and re-hashing the construct.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self.statements = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: tuple, build: Callable[[], object]):
+        """
+        Args:
+            key: tuple
+                shape of the statement, hashable
+            build: callable
+                builds the statement on a miss
+        Returns:
+            the cached or newly built statement
+        """
+        statement = self.statements.get(key)
+        if statement is not None:
+            self.statements.move_to_end(key)
+            self.counters["hits"] += 1
+            return statement
+        self.counters["misses"] += 1
+        statement = build()
+        if self.max_entries > 0:
+            self.statements[key] = statement
+            while len(self.statements) > self.max_entries:
+                self.statements.popitem(last=False)
+                self.counters["evictions"] += 1
+        return statement
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: counters plus the current number of statements
+        """
+        return dict(self.counters, size=len(self.statements))
+
+
+_book_cache = None
+_book_statement_cache = None
+
+
+def get_book_cache() -> ResultCache:
+    """
+    Gets the GET /book result cache, created once per container from BOOK_CACHE_SIZE,
+    BOOK_CACHE_TTL, BOOK_CACHE_NEGATIVE_TTL and optionally BOOK_CACHE_SQLITE_PATH
+    Returns:
+        ResultCache: the cache
+    """
+    global _book_cache
+    if _book_cache is None:
+        sqlite_path = os.environ.get("BOOK_CACHE_SQLITE_PATH")
+        _book_cache = ResultCache(
+            max_entries=int(os.environ.get("BOOK_CACHE_SIZE", "256")),
+            ttl=float(os.environ.get("BOOK_CACHE_TTL", "60")),
+            negative_ttl=float(os.environ.get("BOOK_CACHE_NEGATIVE_TTL", "10")),
+            backend=SQLiteCacheBackend(sqlite_path) if sqlite_path else None,
+        )
+    return _book_cache
+
+
+def reset_book_cache():
+    """
+    Drops the GET /book result cache. Meant for tests.
+    """
+    global _book_cache
+    _book_cache = None
+
+
+def get_book_statement_cache() -> StatementCache:
+    """
+    Gets the GET /book statement cache, created once per container with BOOK_STATEMENT_CACHE_SIZE entries
+    Returns:
+        StatementCache: the cache
+    """
+    global _book_statement_cache
+    if _book_statement_cache is None:
+        _book_statement_cache = StatementCache(max_entries=int(os.environ.get("BOOK_STATEMENT_CACHE_SIZE", "128")))
+    return _book_statement_cache
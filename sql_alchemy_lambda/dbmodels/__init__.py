@@ -3,3 +3,4 @@
 from sql_alchemy_lambda.dbmodels.base import BaseModel
 from sql_alchemy_lambda.dbmodels.book import Book
 from sql_alchemy_lambda.dbmodels.review import Review
+from sql_alchemy_lambda.dbmodels.book_rating import BookRating
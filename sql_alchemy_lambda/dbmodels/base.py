@@ -1,9 +1,59 @@
+import base64
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
-from datetime import datetime
+from sqlalchemy.orm import Mapper
+from datetime import date, datetime, time
+from decimal import Decimal
+from enum import Enum
 
 DEFAULT_EXCLUDED_ATTRS = ["__mapper__", "_sa_instance_state"]
 Base = declarative_base()
 
+# Serialization plans by model class, see BaseModel.serialization_plan() and encoder_plan()
+_serialization_plans = {}
+_encoder_plans = {}
+
+
+@event.listens_for(Mapper, "after_configured")
+def _clear_serialization_plans():
+    """
+    Mappers were (re)configured, so any compiled plan may be stale
+    """
+    _serialization_plans.clear()
+    _encoder_plans.clear()
+
+
+def _to_iso(value):
+    return value.isoformat()
+
+
+def _to_base64(value):
+    return base64.b64encode(value).decode("ascii")
+
+
+def _to_value(value):
+    return value.value
+
+
+# How values the json module can't handle natively are converted, by type
+JSON_CONVERTERS = (
+    ((datetime, date, time), _to_iso),
+    (Decimal, str),
+    (Enum, _to_value),
+    ((bytes, bytearray, memoryview), _to_base64),
+    ((set, frozenset), list),
+)
+
+
+def _convert_value(value):
+    """
+    Converter for attributes that are not plain columns, so their type is only known per value
+    """
+    for types, converter in JSON_CONVERTERS:
+        if isinstance(value, types):
+            return converter(value)
+    return value
+
 
 class BaseModel(Base):
     """
@@ -13,6 +63,7 @@ class BaseModel(Base):
     __abstract__ = True
     _excluded_attributes = None
     _serialize_columns_only = False
+    _decimal_as_float = False
 
     def __init__(self, **kwargs):
         """
@@ -27,12 +78,18 @@ class BaseModel(Base):
         primary_key_values = ",".join([str(getattr(self, pk)) for pk in primary_keys])
         return "{}(id:{})".format(self.__class__.__name__, primary_key_values)
 
-    def update_from_params(self, params):
+    def update_from_params(self, params, schema=None):
         """
         Update values based on provided key-value pairs that match model attributes.
 
-        TODO: This should be replaced by validating request params against a serialization schema.
+        With a ``schema`` from validation.compile_schema(), the params are validated and converted
+        by it first, and the first error is raised as a ValueError "field: message". Without one
+        the params are expected to be validated already.
         """
+        if schema is not None:
+            params, errors = schema(params)
+            if len(errors) > 0:
+                raise ValueError("{}: {}".format(errors[0]["field"], errors[0]["message"]))
         for k, v in params.items():
             if hasattr(self, k):
                 setattr(self, k, v)
@@ -53,6 +110,66 @@ class BaseModel(Base):
         synonyms = self.__mapper__.synonyms.keys()
         return set(DEFAULT_EXCLUDED_ATTRS + synonyms + (self._excluded_attributes or []))
 
+    @classmethod
+    def serialization_plan(cls):
+        """
+        Get the ordered (attribute, converter) pairs used by as_dict(), compiled once per class.
+
+        If ``_serialize_columns_only`` is True, only real columns are included. Otherwise all
+        model properties, including real columns and derived attributes. Datetime columns are
+        converted to ISO strings and Decimal columns to str, or float with ``_decimal_as_float``.
+        """
+        plan = _serialization_plans.get(cls)
+        if plan is not None:
+            return plan
+        mapper = cls.__mapper__
+        excluded = set(DEFAULT_EXCLUDED_ATTRS + list(mapper.synonyms.keys()) + (cls._excluded_attributes or []))
+        column_types = {}
+        for column in mapper.columns:
+            try:
+                column_types[column.name] = column.type.python_type
+            except NotImplementedError:
+                column_types[column.name] = None
+        if cls._serialize_columns_only:
+            attributes = [col.name for col in mapper.columns]
+        else:
+            attributes = mapper.all_orm_descriptors.keys()
+        decimal_converter = float if cls._decimal_as_float else str
+        plan = []
+        for attribute in dict.fromkeys(attributes):
+            if attribute in excluded:
+                continue
+            if attribute not in column_types:
+                converter = _convert_value
+            elif column_types[attribute] in (datetime, date, time):
+                converter = _to_iso
+            elif column_types[attribute] is Decimal:
+                converter = decimal_converter
+            else:
+                converter = None
+            plan.append((attribute, converter))
+        plan = tuple(plan)
+        _serialization_plans[cls] = plan
+        return plan
+
+    @classmethod
+    def encoder_plan(cls):
+        """
+        Get the column attribute names of the serialization plan and the names of the
+        relationships that may be included, as used by the JSON encoder. Compiled once per class.
+        """
+        plan = _encoder_plans.get(cls)
+        if plan is None:
+            mapper = cls.__mapper__
+            column_keys = set(mapper.column_attrs.keys())
+            excluded = set(cls._excluded_attributes or [])
+            plan = (
+                tuple(attribute for attribute, _ in cls.serialization_plan() if attribute in column_keys),
+                tuple(key for key in mapper.relationships.keys() if key not in excluded),
+            )
+            _encoder_plans[cls] = plan
+        return plan
+
     def as_dict(self):
         """
         Return a dictionary of attributes and values, minus any explicitly excluded ones.
@@ -60,11 +177,10 @@ class BaseModel(Base):
         An intermediate replacement for previously hardcoded as_dict() to_dict functions, but should
         be replaced with generated serialization schemas.
 
-        If ``_serialize_columns_only`` is True, return only real columns. Otherwise return all
-        model properties, including real columns and derived attributes.
+        The attributes and their converters come from the class's serialization_plan().
         """
-        if self._serialize_columns_only:
-            attributes = [col.name for col in self.__mapper__.columns]
-        else:
-            attributes = self.__mapper__.all_orm_descriptors.keys()
-        return {k: getattr(self, k, None) for k in set(attributes) - self.excluded_attributes}
+        result = {}
+        for attribute, converter in self.serialization_plan():
+            value = getattr(self, attribute, None)
+            result[attribute] = value if converter is None or value is None else converter(value)
+        return result
@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, SmallInteger
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, SmallInteger, func
 from sqlalchemy.orm import relationship
 
 from sql_alchemy_lambda.dbmodels.review import Review
@@ -11,13 +13,28 @@ class Book(BaseModel):
     """
     __tablename__ = 'book'
     _serialize_columns_only = True
+    _excluded_attributes = ["rec_updated_ts"]
 
     id = Column(Integer, primary_key=True)
     title = Column(String(200), nullable=False)
     author = Column(String(100), nullable=False)
     publisher = Column(String(100), nullable=False)
     year = Column(Integer, nullable=False)
+    # Bumped on every write, GET /book fingerprints pages with it to build ETags
+    rec_updated_ts = Column(DateTime, nullable=False, default=datetime.now, onupdate=datetime.now)
+
+    # Back the GET /book filters: exact and prefix matches on title and author, optionally
+    # case-insensitive through lower(), and year ranges alone or combined with an author
+    __table_args__ = (
+        Index("ix_book_title", title),
+        Index("ix_book_title_lower", func.lower(title)),
+        Index("ix_book_author_year", author, year),
+        Index("ix_book_author_lower", func.lower(author)),
+        Index("ix_book_year", year),
+    )
 
 
 # 1 Book <-> 0 or more Reviews
 Book.reviews = relationship("Review", order_by=Review.id, back_populates="book")
+# 1 Book <-> 0 or 1 BookRating
+Book.rating = relationship("BookRating", uselist=False, back_populates="book")
@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, cast
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import relationship
+
+from sql_alchemy_lambda.dbmodels.base import BaseModel
+
+
+class BookRating(BaseModel):
+    """
+    Rating aggregates of a book's reviews, kept up to date as reviews are inserted so
+    reading a book's rating doesn't scan its reviews. See sql_alchemy_lambda.ratings.
+    """
+    __tablename__ = 'book_rating'
+    _serialize_columns_only = True
+
+    book_id = Column(Integer, ForeignKey('book.id'), primary_key=True)
+    review_count = Column(Integer, nullable=False, default=0)
+    rate_sum = Column(Integer, nullable=False, default=0)
+    # Histogram, number of reviews with each rate
+    rate_1 = Column(Integer, nullable=False, default=0)
+    rate_2 = Column(Integer, nullable=False, default=0)
+    rate_3 = Column(Integer, nullable=False, default=0)
+    rate_4 = Column(Integer, nullable=False, default=0)
+    rate_5 = Column(Integer, nullable=False, default=0)
+    book = relationship("Book", back_populates="rating")
+
+    @hybrid_property
+    def average(self) -> float or None:
+        return self.rate_sum / self.review_count if self.review_count else None
+
+    @average.inplace.expression
+    @classmethod
+    def _average_expression(cls):
+        # Rows only exist once a book has a review, so review_count is never 0
+        return cast(cls.rate_sum, Float) / cls.review_count
+
+
+# Backs GET /book/top, read backwards it yields the best rated books first so a LIMIT stops early
+Index("ix_book_rating_average", BookRating.average, BookRating.review_count, BookRating.book_id)
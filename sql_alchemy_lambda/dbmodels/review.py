@@ -15,7 +15,7 @@ class Review(BaseModel):
     reviewer = Column(String(100), nullable=False)
     rate = Column(SmallInteger, nullable=False)  # 1-5 stars
     review = Column(String(500), nullable=True)
-    book_id = Column(Integer, ForeignKey('book.id'))
+    book_id = Column(Integer, ForeignKey('book.id'), index=True)
     book = relationship("Book", back_populates="reviews")
 
 
@@ -8,18 +8,71 @@ from typing import List, Tuple
 # noinspection PyUnresolvedReferences
 from sql_alchemy_lambda import dbmodels
 
+import base64
+import binascii
+import hashlib
 import logging
 import json
-from sqlalchemy.orm import Session
+import string
+import time
+from sqlalchemy import Integer, bindparam, func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, configure_mappers
+from sql_alchemy_lambda.cache import (
+    MISS,
+    ResultCache,
+    StatementCache,
+    get_book_cache,
+    get_book_statement_cache,
+    make_cache_key,
+)
 from sql_alchemy_lambda.models.response import Response
-from sql_alchemy_lambda.dbmodels import Book, Review
+from sql_alchemy_lambda.ratings import AGGREGATE_COLUMNS, add_ratings, rating_to_dict
+from sql_alchemy_lambda.search import get_search_backend, search_supported, tokenize_query
+from sql_alchemy_lambda.dbmodels import Book, BookRating, Review
 from sql_alchemy_lambda.utilities import get_db_session
+from validation import Field, compile_schema
 
 logger = logging.getLogger("APP")
 logger.setLevel(logging.INFO)
 
+# Mappers are configured once, while the container initializes, instead of by the first query
+# of the first invocation. Later calls are no-ops.
+configure_mappers()
+
 headers = {"Content-Type": "application/json", "Access-Control-Allow-Origin": "*"}
 
+# GET /book is keyset paginated on Book.id, "limit" is capped at MAX_PAGE_SIZE
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Rows are pulled from the cursor in chunks of this size instead of all at once
+YIELD_PER = 100
+
+# Book columns in table order, computed once so read-only listings can select them directly
+# instead of hydrating Book instances and walking the mapper in as_dict()
+BOOK_FIELDS: Tuple[str, ...] = tuple(
+    column.key for column in Book.__table__.columns if column.key not in Book._excluded_attributes
+)
+BOOK_COLUMNS = {field: getattr(Book, field) for field in BOOK_FIELDS}
+REVIEW_FIELDS: Tuple[str, ...] = ("id", "reviewer", "rate", "review")
+
+# Relationships GET /book can nest with "include", and the per book cap on nested reviews
+BOOK_INCLUDES = ("reviews", "rating")
+DEFAULT_REVIEWS_PER_BOOK = 10
+MAX_REVIEWS_PER_BOOK = 50
+
+# GET /search returns top-k pages, the offset is capped since deep pages of ranked results get slow
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_OFFSET = 1000
+
+# GET /book/top returns the "n" best rated books with at least "min_reviews" reviews
+DEFAULT_TOP_BOOKS = 10
+MAX_TOP_BOOKS = 100
+
+# POST /review/batch inserts in executemany chunks of "chunk_size" rows
+DEFAULT_REVIEW_CHUNK_SIZE = 500
+MAX_REVIEW_CHUNK_SIZE = 5000
+
 
 def handler(event: dict, context):
     """
@@ -36,6 +89,7 @@ def handler(event: dict, context):
     method = event["httpMethod"]
     route = event["pathParameters"]["proxy"]
     params = event["queryStringParameters"]
+    request_headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
 
     body = (
         json.loads(event["body"])
@@ -45,13 +99,33 @@ def handler(event: dict, context):
     db_session = get_db_session()
     try:
         if method.upper() == "GET" and route == "book":
-            response: dict = get_book(db_session, params)
+            response: dict = get_book(
+                db_session, params, cache=get_book_cache(), if_none_match=request_headers.get("if-none-match")
+            )
+            logger.info(f"[RESPONSE]: {response}")
+            db_session.close()
+            return response
+
+        if method.upper() == "GET" and route == "book/top":
+            response: dict = get_top_books(db_session, params)
+            logger.info(f"[RESPONSE]: {response}")
+            db_session.close()
+            return response
+
+        if method.upper() == "GET" and route == "search":
+            response: dict = get_search(db_session, params)
             logger.info(f"[RESPONSE]: {response}")
             db_session.close()
             return response
 
         if method.upper() == "POST" and route == "review":
-            response: dict = insert_review(db_session, params)
+            response: dict = insert_review(db_session, params, cache=get_book_cache())
+            logger.info(f"[RESPONSE]: {response}")
+            db_session.close()
+            return response
+
+        if method.upper() == "POST" and route == "review/batch":
+            response: dict = insert_reviews(db_session, params, body, cache=get_book_cache())
             logger.info(f"[RESPONSE]: {response}")
             db_session.close()
             return response
@@ -72,9 +146,31 @@ def handler(event: dict, context):
         return response
 
 
-def get_book(db_session: Session, params: dict) -> dict:
+def get_book(
+    db_session: Session,
+    params: dict,
+    cache: ResultCache = None,
+    if_none_match: str = None,
+    statements: StatementCache = None,
+) -> dict:
+    """
+        Gets a page of books. Responses carry an ETag built from get_book_fingerprint(), and a
+        matching If-None-Match gets a 304 without fetching or serializing the rows.
+    Args:
+        db_session: Session
+        params: dict
+        cache: ResultCache
+            read-through cache for the response body and its ETag, keyed on the validated params
+        if_none_match: str
+            If-None-Match request header
+        statements: StatementCache
+            built statements by filter shape, defaults to get_book_statement_cache()
+
+    Returns:dict
+
+    """
     validated_params, errors = validate_get_book_params(params)
-    if len(errors.keys()) > 0:
+    if len(errors) > 0:
         response: dict = Response(
             status_code=500,
             headers=headers,
@@ -82,9 +178,224 @@ def get_book(db_session: Session, params: dict) -> dict:
         ).to_dict()
         return response
 
-    query: Session.query = build_book_query(db_session, params)
-    book_results: List[Book] = query.all()
-    results = [d.as_dict() for d in book_results]
+    cache_key = make_cache_key("book", validated_params)
+    request_etags = parse_if_none_match(if_none_match)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not MISS:
+            return etag_response(cached["etag"], cached["body"], request_etags)
+
+    statements = statements if statements is not None else get_book_statement_cache()
+    values = book_statement_values(validated_params)
+    etag = build_etag(cache_key, get_book_fingerprint(db_session, validated_params, statements, values))
+    if etag in request_etags:
+        return etag_response(etag, None, request_etags)
+
+    # Book.id is always selected first since the cursor needs it, even if "fields" leaves it out
+    fields = validated_params.get("fields", BOOK_FIELDS)
+    selected = ("id",) + tuple(field for field in fields if field != "id")
+    start = 0 if "id" in fields else 1
+    keys = selected[start:]
+    filters = tuple(values)
+    ignore_case = validated_params.get("ignore_case", False)
+    statement = statements.get(
+        ("page", filters, ignore_case, selected),
+        lambda: paginate_book_query(
+            build_book_query(filters, ignore_case, columns=[BOOK_COLUMNS[field] for field in selected]), filters
+        ),
+    )
+    limit = validated_params.get("limit", DEFAULT_PAGE_SIZE)
+    rows = []
+    for row in db_session.execute(statement, values, execution_options={"yield_per": YIELD_PER}):
+        rows.append(row)
+    next_cursor = None
+    # One extra row is fetched to know whether there is another page
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][0])
+    results = [dict(zip(keys, row[start:])) for row in rows]
+    include = validated_params.get("include", ())
+    if "reviews" in include:
+        attach_reviews(
+            db_session,
+            {row[0]: book for row, book in zip(rows, results)},
+            validated_params.get("reviews_limit", DEFAULT_REVIEWS_PER_BOOK),
+        )
+    elif "rating" in include:
+        attach_ratings(db_session, {row[0]: book for row, book in zip(rows, results)})
+    body = {"data": results, "next_cursor": next_cursor}
+    if cache is not None:
+        cache.set(cache_key, {"body": body, "etag": etag}, book_ids=[row[0] for row in rows], empty=len(rows) == 0)
+    return etag_response(etag, body, request_etags)
+
+
+def get_book_fingerprint(
+    db_session: Session, validated_params: dict, statements: StatementCache, values: dict
+) -> tuple:
+    """
+    Summarizes the rows behind a GET /book page in one aggregate query, without fetching them:
+    the count, sum of ids and latest rec_updated_ts of the page's books, plus the count and
+    max id of their reviews when reviews or ratings are included.
+    Args:
+        db_session: Session
+        validated_params: dict
+        statements: StatementCache
+        values: dict
+            from book_statement_values
+
+    Returns:
+        tuple: fingerprint, it changes whenever the page would
+    """
+    filters = tuple(values)
+    ignore_case = validated_params.get("ignore_case", False)
+    with_reviews = len(validated_params.get("include", ())) > 0
+
+    def build():
+        query = build_book_query(filters, ignore_case, columns=[Book.id, Book.rec_updated_ts])
+        page = paginate_book_query(query, filters).subquery()
+        columns = [func.count(page.c.id), func.sum(page.c.id), func.max(page.c.rec_updated_ts)]
+        if with_reviews:
+            page_reviews = Review.book_id.in_(select(page.c.id))
+            columns.append(select(func.count(Review.id)).where(page_reviews).scalar_subquery())
+            columns.append(select(func.max(Review.id)).where(page_reviews).scalar_subquery())
+        return select(*columns)
+
+    statement = statements.get(("fingerprint", filters, ignore_case, with_reviews), build)
+    return tuple(db_session.execute(statement, values).one())
+
+
+def build_etag(cache_key: str, fingerprint: tuple) -> str:
+    """
+    Args:
+        cache_key: str
+            normalized request params
+        fingerprint: tuple
+            from get_book_fingerprint
+    Returns:
+        str: quoted strong ETag
+    """
+    digest = hashlib.sha256((cache_key + "|" + json.dumps(fingerprint, default=str)).encode("utf-8"))
+    return '"{}"'.format(digest.hexdigest()[:32])
+
+
+def parse_if_none_match(if_none_match: str or None) -> set:
+    """
+    Args:
+        if_none_match: str or None
+            If-None-Match header, a comma separated list of ETags
+    Returns:
+        set: the quoted ETags, weak ones included since If-None-Match uses weak comparison
+    """
+    if if_none_match is None:
+        return set()
+    return {etag.strip()[2:] if etag.strip().startswith("W/") else etag.strip() for etag in if_none_match.split(",")}
+
+
+def etag_response(etag: str, body: dict or None, request_etags: set) -> dict:
+    """
+    Builds a 200 response with its ETag, or an empty 304 if the client already has it
+    Args:
+        etag: str
+        body: dict or None
+        request_etags: set
+            from parse_if_none_match
+    Returns:
+        dict: lambda response
+    """
+    if etag in request_etags or "*" in request_etags:
+        return Response(status_code=304, headers=dict(headers, ETag=etag), body=None).to_dict()
+    return Response(status_code=200, headers=dict(headers, ETag=etag), body=body).to_dict()
+
+
+def attach_reviews(db_session: Session, books_by_id: dict, reviews_limit: int):
+    """
+    Nests up to ``reviews_limit`` reviews and the rating stats into each book of a page.
+    Always two queries, however many books are on the page: the capped reviews of every book,
+    selected with a row_number() window, and the ratings from attach_ratings().
+    Args:
+        db_session: Session
+        books_by_id: dict
+            serialized books of the page by their id, updated in place
+        reviews_limit: int
+            max reviews per book
+    """
+    for book in books_by_id.values():
+        book["reviews"] = []
+    attach_ratings(db_session, books_by_id)
+    if len(books_by_id) == 0:
+        return
+
+    row_number = (
+        func.row_number().over(partition_by=Review.book_id, order_by=Review.id).label("row_number")
+    )
+    ranked = (
+        select(Review.book_id, *[getattr(Review, field) for field in REVIEW_FIELDS], row_number)
+        .where(Review.book_id.in_(books_by_id.keys()))
+        .subquery()
+    )
+    reviews_query = (
+        select(ranked.c.book_id, *[ranked.c[field] for field in REVIEW_FIELDS])
+        .where(ranked.c.row_number <= reviews_limit)
+        .order_by(ranked.c.book_id, ranked.c.id)
+    )
+    for row in db_session.execute(reviews_query):
+        books_by_id[row[0]]["reviews"].append(dict(zip(REVIEW_FIELDS, row[1:])))
+
+
+def attach_ratings(db_session: Session, books_by_id: dict):
+    """
+    Nests the rating count, average and histogram into each book of a page, read from the
+    BookRating aggregates by primary key in one query instead of aggregating the reviews
+    Args:
+        db_session: Session
+        books_by_id: dict
+            serialized books of the page by their id, updated in place
+    """
+    ratings = {}
+    if len(books_by_id) > 0:
+        ratings_query = select(
+            BookRating.book_id, *[getattr(BookRating, column) for column in AGGREGATE_COLUMNS]
+        ).where(BookRating.book_id.in_(books_by_id.keys()))
+        ratings = {row[0]: row[1:] for row in db_session.execute(ratings_query)}
+    for book_id, book in books_by_id.items():
+        book["rating"] = rating_to_dict(ratings.get(book_id))
+
+
+def get_top_books(db_session: Session, params: dict) -> dict:
+    """
+        Gets the best rated books, by average rate then number of reviews.
+        Served from the BookRating aggregates: ix_book_rating_average is read in order and the
+        scan stops after "n" books, so neither the reviews nor all the books are sorted.
+    Args:
+        db_session: Session
+        params: dict
+            "n" books to return, "min_reviews" a book needs to be ranked
+
+    Returns:dict
+
+    """
+    validated_params, errors = validate_top_books_params(params)
+    if len(errors) > 0:
+        response: dict = Response(
+            status_code=500,
+            headers=headers,
+            body={"errors": errors},
+        ).to_dict()
+        return response
+
+    query = (
+        select(*BOOK_COLUMNS.values(), *[getattr(BookRating, column) for column in AGGREGATE_COLUMNS])
+        .select_from(BookRating)
+        .join(Book, Book.id == BookRating.book_id)
+        .where(BookRating.review_count >= validated_params["min_reviews"])
+        .order_by(BookRating.average.desc(), BookRating.review_count.desc(), BookRating.book_id.desc())
+        .limit(validated_params["n"])
+    )
+    results = []
+    for row in db_session.execute(query):
+        book = dict(zip(BOOK_FIELDS, row))
+        book["rating"] = rating_to_dict(row[len(BOOK_FIELDS):])
+        results.append(book)
     response: dict = Response(
         status_code=200,
         headers=headers,
@@ -93,72 +404,257 @@ def get_book(db_session: Session, params: dict) -> dict:
     return response
 
 
-def validate_get_book_params(params: dict):
+def validate_top_books_params(params: dict) -> Tuple[dict, list]:
+    """
+        validates the top books params
+    Args:
+        params: dict
+
+    Returns: dict
+
+    """
+    return TOP_BOOKS_SCHEMA(params)
+
+
+def get_search(db_session: Session, params: dict) -> dict:
+    """
+        Full text search over book titles, authors and review text, best matches first
+    Args:
+        db_session: Session
+        params: dict
+            "q" the search words, "limit" and "offset" select the page
+
+    Returns:dict
+
+    """
+    if not search_supported(db_session):
+        return Response(status_code=501, headers=headers, body={"error": "search not supported"}).to_dict()
+    search_backend = get_search_backend(db_session)
+    if search_backend is None:
+        return Response(
+            status_code=503,
+            headers=headers,
+            body={"error": "search index not built, run python -m sql_alchemy_lambda.search --rebuild"},
+        ).to_dict()
+    validated_params, errors = validate_search_params(params)
+    if len(errors) > 0:
+        response: dict = Response(
+            status_code=500,
+            headers=headers,
+            body={"errors": errors},
+        ).to_dict()
+        return response
+
+    limit = validated_params["limit"]
+    offset = validated_params["offset"]
+    # One extra row is fetched to know whether there is another page
+    rows = search_backend.search(db_session, validated_params["tokens"], limit + 1, offset)
+    results = [
+        {"id": book_id, "title": title, "author": author, "score": round(score, 4)}
+        for book_id, title, author, score in rows[:limit]
+    ]
+    response: dict = Response(
+        status_code=200,
+        headers=headers,
+        body={"data": results, "next_offset": offset + limit if len(rows) > limit else None},
+    ).to_dict()
+    return response
+
+
+def validate_search_params(params: dict) -> Tuple[dict, list]:
+    """
+        validates the search params
+    Args:
+        params: dict
+
+    Returns: dict
+
+    """
+    return SEARCH_SCHEMA(params)
+
+
+def parse_search_query(q: str) -> List[str]:
+    tokens = tokenize_query(q)
+    if len(tokens) == 0:
+        raise ValueError("is required and was not included")
+    return tokens
+
+
+def encode_cursor(last_id: int) -> str:
+    """
+    Builds the opaque cursor handed to clients for the next page
+    Args:
+        last_id: int
+            id of the last book on the current page
+    Returns:
+        str: cursor
+    """
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Reads the book id back out of a cursor built by encode_cursor
+    Args:
+        cursor: str
+    Returns:
+        int: id of the last book of the previous page
+    """
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor.encode("utf-8")))["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError("not a valid cursor")
+    if type(last_id) != int:
+        raise ValueError("not a valid cursor")
+    return last_id
+
+
+def validate_get_book_params(params: dict) -> Tuple[dict, list]:
     """
     All columns are optional query params, but it validates them if they are included.
+    "limit" and "cursor" select the page, "limit" is capped at MAX_PAGE_SIZE.
+    "fields" is a comma separated list of the Book columns to return.
+    "include=reviews" nests up to "reviews_limit" reviews and the rating stats in every book,
+    "include=rating" only the rating stats.
+    "title_prefix", "author_prefix", "year_from" and "year_to" are prefix and inclusive range
+    filters, and "ignore_case=true" makes the title and author filters case-insensitive for
+    ASCII letters.
     Args:
         params: dict
             query param arguments for the get book endpoint
     Returns:
-        dict: validated params
+        Tuple[dict, list]: validated params, errors
     """
-    validated_params = {}
-    errors = {}
-    if "id" in params and params["id"].strip() is not None and params["id"].strip() != "":
-        try:
-            validated_params["id"]: int = int(params["id"])
-        except:
-            errors["id"] = "not a valid integer"
-    if "title" in params and params["title"].strip() is not None and params["title"].strip() != "":
-        validated_params["title"]: str = params["title"]
-    if "author" in params and params["author"].strip() is not None and params["author"].strip() != "":
-        validated_params["author"]: str = params["author"]
-    if "publisher" in params and params["publisher"].strip() is not None and params["publisher"].strip() != "":
-        validated_params["publisher"]: str = params["publisher"]
-    if "year" in params and params["year"].strip() is not None and params["year"].strip() != "":
-        try:
-            validated_params["year"]: int = int(params["year"])
-        except:
-            errors["year"] = "not a valid integer"
-    return validated_params, errors
+    return GET_BOOK_SCHEMA(params)
 
 
-def build_book_query(db_session: Session, validated_params: dict):
-    """
+# GET /book filters in the order their conditions are built, with the ones matched on title or author
+BOOK_FILTERS = (
+    "id", "title", "author", "publisher", "year", "title_prefix", "author_prefix", "year_from", "year_to"
+)
+CASE_FOLDED_FILTERS = ("title", "author", "title_prefix", "author_prefix")
+# "ignore_case" folds ASCII letters only, like SQLite's lower() that ix_book_title_lower and
+# ix_book_author_lower are built on. Other letters are compared as given.
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+# Code points that can't be encoded on their own, so prefix_end() skips them
+SURROGATES = (0xD800, 0xDFFF)
+
 
+def book_statement_values(validated_params: dict) -> dict:
+    """
+    Bound parameter values of a GET /book request. Their names also give the shape of the
+    statement, so requests using the same filters share one statement.
     Args:
-        db_session: Session
         validated_params: dict
 
     Returns:
+        dict: values by bound parameter name
+    """
+    ignore_case = validated_params.get("ignore_case", False)
+    values = {}
+    for name in BOOK_FILTERS:
+        if name in validated_params:
+            value = validated_params[name]
+            values[name] = case_fold(value, ignore_case) if name in CASE_FOLDED_FILTERS else value
+            if name.endswith("_prefix") and prefix_end(values[name]) is not None:
+                values[name + "_end"] = prefix_end(values[name])
+    if "cursor" in validated_params:
+        values["cursor"] = validated_params["cursor"]
+    # One row more than the page size, so the caller can tell if there is a next page
+    values["page_limit"] = validated_params.get("limit", DEFAULT_PAGE_SIZE) + 1
+    return values
 
+
+def build_book_query(filters: tuple, ignore_case: bool = False, columns: list = None):
+    """
+    Builds the filtered book select on bound parameters named after the filters,
+    see book_statement_values for their values
+    Args:
+        filters: tuple
+            bound parameter names
+        ignore_case: bool
+            match title and author through lower()
+        columns: list
+            Book columns to select, for read-only row tuples. Selects Book instances when not given.
+
+    Returns:
+        Select: the statement
     """
-    query = db_session.query(Book)
-    if "id" in validated_params:
-        query = query.filter(Book.id == validated_params["id"])
-    if "title" in validated_params:
-        query = query.filter(Book.title == validated_params["title"])
-    if "author" in validated_params:
-        query = query.filter(Book.author == validated_params["author"])
-    if "publisher" in validated_params:
-        query = query.filter(Book.publisher == validated_params["publisher"])
-    if "year" in validated_params:
-        query = query.filter(Book.year == validated_params["year"])
-    return query
+    statement = select(*columns) if columns else select(Book)
+    title = func.lower(Book.title, type_=Book.title.type) if ignore_case else Book.title
+    author = func.lower(Book.author, type_=Book.author.type) if ignore_case else Book.author
+    conditions = {
+        "id": lambda: Book.id == bindparam("id"),
+        "title": lambda: title == bindparam("title"),
+        "author": lambda: author == bindparam("author"),
+        "publisher": lambda: Book.publisher == bindparam("publisher"),
+        "year": lambda: Book.year == bindparam("year"),
+        # Prefixes match as a half open range, ``prefix <= x < prefix_end``, which an index on
+        # the expression can serve. LIKE 'prefix%' can't use one in every database, e.g.
+        # SQLite's LIKE is case-insensitive so it skips case-sensitive indexes.
+        "title_prefix": lambda: title >= bindparam("title_prefix"),
+        "title_prefix_end": lambda: title < bindparam("title_prefix_end"),
+        "author_prefix": lambda: author >= bindparam("author_prefix"),
+        "author_prefix_end": lambda: author < bindparam("author_prefix_end"),
+        "year_from": lambda: Book.year >= bindparam("year_from"),
+        "year_to": lambda: Book.year <= bindparam("year_to"),
+    }
+    for name in filters:
+        if name in conditions:
+            statement = statement.where(conditions[name]())
+    return statement
+
 
+def case_fold(value: str, ignore_case: bool) -> str:
+    return value.translate(ASCII_LOWER) if ignore_case else value
 
-def insert_review(db_session: Session, params: dict) -> dict:
+
+def prefix_end(prefix: str) -> str or None:
+    """
+    Args:
+        prefix: str
+    Returns:
+        str or None: the smallest string after every string starting with ``prefix``,
+        None if there is none
+    """
+    if ord(prefix[-1]) < 0x10FFFF:
+        code_point = ord(prefix[-1]) + 1
+        if SURROGATES[0] <= code_point <= SURROGATES[1]:
+            code_point = SURROGATES[1] + 1
+        return prefix[:-1] + chr(code_point)
+    return None
+
+
+def paginate_book_query(statement, filters: tuple):
+    """
+    Restricts a book select to one keyset page, ordered by Book.id
+    Args:
+        statement: Select
+        filters: tuple
+            bound parameter names, "cursor" and "page_limit" select the page
+
+    Returns:
+        Select: the page statement
+    """
+    if "cursor" in filters:
+        statement = statement.where(Book.id > bindparam("cursor"))
+    return statement.order_by(Book.id).limit(bindparam("page_limit", type_=Integer))
+
+
+def insert_review(db_session: Session, params: dict, cache: ResultCache = None) -> dict:
     """
         Inserts a new Review
     Args:
         db_session: Session
         params: dict
+        cache: ResultCache
+            cached results holding the reviewed book are invalidated
 
     Returns:dict
 
     """
     validated_params, errors = validate_review_params(params)
-    if len(errors.keys()) > 0:
+    if len(errors) > 0:
         response: dict = Response(
             status_code=500,
             headers=headers,
@@ -166,18 +662,128 @@ def insert_review(db_session: Session, params: dict) -> dict:
         ).to_dict()
         return response
 
+    search_backend = get_search_backend(db_session)
     review = Review(**validated_params)
     db_session.add(review)
+    if search_backend is not None:
+        db_session.flush()
+        search_backend.add_reviews(db_session, [(review.book_id, review.review)])
+    add_ratings(db_session, [(review.book_id, review.rate)])
     db_session.commit()
+    if cache is not None:
+        cache.invalidate_books([review.book_id])
+    response: dict = Response(
+        status_code=200,
+        headers=headers,
+        body={"inserted": json.loads(json.dumps(review.as_dict()))},
+    ).to_dict()
+    return response
+
+
+def insert_reviews(db_session: Session, params: dict, body: list, cache: ResultCache = None) -> dict:
+    """
+        Inserts a JSON array of reviews with executemany inserts of "chunk_size" rows.
+        By default every chunk runs in one transaction, so one failing chunk inserts nothing.
+        With "transaction=chunk" each chunk is committed on its own.
+    Args:
+        db_session: Session
+        params: dict
+            "chunk_size" and "transaction" query params
+        body: list
+            reviews, validated like the query params of POST /review
+        cache: ResultCache
+            cached results holding any reviewed book are invalidated
+
+    Returns:dict
+
+    """
+    options, errors = validate_review_batch_params(params)
+    if type(body) != list:
+        errors.append({"field": "body", "message": "must be a JSON array of reviews"})
+    if len(errors) > 0:
+        response: dict = Response(
+            status_code=500,
+            headers=headers,
+            body={"errors": errors},
+        ).to_dict()
+        return response
+
+    results = [None] * len(body)
+    valid = []
+    for index, row in enumerate(body):
+        if type(row) != dict:
+            results[index] = {
+                "index": index, "status": "error", "errors": [{"field": "row", "message": "must be a JSON object"}]
+            }
+            continue
+        validated_params, row_errors = validate_review_params(row)
+        if len(row_errors) > 0:
+            results[index] = {"index": index, "status": "error", "errors": row_errors}
+        else:
+            valid.append((index, validated_params))
+
+    search_backend = get_search_backend(db_session)
+    start = time.perf_counter()
+    chunk_size = options["chunk_size"]
+    chunks = [valid[i:i + chunk_size] for i in range(0, len(valid), chunk_size)]
+    for chunk_number, chunk in enumerate(chunks):
+        try:
+            db_session.execute(insert(Review), [validated_params for _, validated_params in chunk])
+            if search_backend is not None:
+                search_backend.add_reviews(
+                    db_session, [(validated_params["book_id"], validated_params["review"]) for _, validated_params in chunk]
+                )
+            add_ratings(db_session, [(validated_params["book_id"], validated_params["rate"]) for _, validated_params in chunk])
+            if options["transaction"] == "chunk":
+                db_session.commit()
+        except SQLAlchemyError as e:
+            db_session.rollback()
+            logger.exception(e)
+            # A single transaction loses the earlier chunks as well
+            failed = chunk if options["transaction"] == "chunk" else [row for c in chunks for row in c]
+            for index, _ in failed:
+                results[index] = {
+                    "index": index, "status": "error", "errors": [{"field": "row", "message": "not inserted"}]
+                }
+            if options["transaction"] != "chunk":
+                break
+            continue
+        for index, validated_params in chunk:
+            results[index] = {"index": index, "status": "ok", "id": validated_params["id"]}
+    if options["transaction"] != "chunk":
+        db_session.commit()
+    seconds = time.perf_counter() - start
+    if cache is not None:
+        cache.invalidate_books(
+            {validated_params["book_id"] for index, validated_params in valid if results[index]["status"] == "ok"}
+        )
+
+    inserted = len([r for r in results if r["status"] == "ok"])
+    logger.info(
+        f"[REVIEW BATCH]: inserted {inserted} of {len(body)} rows in {seconds:.3f}s "
+        f"({inserted / seconds if seconds > 0 else 0:.0f} rows/s)"
+    )
     response: dict = Response(
         status_code=200,
         headers=headers,
-        body={"inserted": json.loads(json.dumps(Review.as_dict()))},
+        body={"results": results, "inserted": inserted, "failed": len(body) - inserted},
     ).to_dict()
     return response
 
 
-def validate_review_params(params: dict) -> Tuple[dict, dict]:
+def validate_review_batch_params(params: dict) -> Tuple[dict, list]:
+    """
+        validates the batch options of POST /review/batch
+    Args:
+        params: dict
+
+    Returns: dict
+
+    """
+    return REVIEW_BATCH_SCHEMA(params)
+
+
+def validate_review_params(params: dict) -> Tuple[dict, list]:
     """
         validates the review
     Args:
@@ -186,35 +792,61 @@ def validate_review_params(params: dict) -> Tuple[dict, dict]:
     Returns: dict
 
     """
-    validated_params = {}
-    errors = {}
-    if "id" in params and params["id"].strip() is not None and params["id"].strip() != "":
-        try:
-            validated_params["id"]: int = int(params["id"])
-        except:
-            errors["id"] = "not a valid integer"
-    else:
-        errors["id"] = "is required and was not included"
-    if "reviewer" in params and params["reviewer"].strip() is not None and params["reviewer"].strip() != "":
-        validated_params["reviewer"]: str = params["reviewer"]
-    else:
-        errors["reviewer"] = "is required and was not included"
-    if "rate" in params and params["rate"].strip() is not None and params["rate"].strip() != "":
-        try:
-            validated_params["rate"]: int = int(params["rate"])
-        except:
-            errors["rate"] = "not a valid integer"
-    else:
-        errors["rate"] = "is required and was not included"
-    if "review" in params and params["review"].strip() is not None and params["review"].strip() != "":
-        validated_params["review"]: str = params["review"]
-    else:
-        errors["review"] = "is required and was not included"
-    if "book_id" in params and params["book_id"].strip() is not None and params["book_id"].strip() != "":
-        try:
-            validated_params["book_id"]: int = int(params["book_id"])
-        except:
-            errors["book_id"] = "not a valid integer"
-    else:
-        errors["book_id"] = "is required and was not included"
-    return validated_params, errors
+    return REVIEW_SCHEMA(params)
+
+
+# Request schemas, compiled once per container. String lengths are the lengths of their columns.
+GET_BOOK_SCHEMA = compile_schema(
+    [
+        Field("id", int),
+        Field("title", max_length=Book.title.type.length),
+        Field("author", max_length=Book.author.type.length),
+        Field("publisher", max_length=Book.publisher.type.length),
+        Field("year", int),
+        Field("title_prefix", max_length=Book.title.type.length),
+        Field("author_prefix", max_length=Book.author.type.length),
+        Field("year_from", int),
+        Field("year_to", int),
+        Field("ignore_case", bool),
+        Field("limit", int, minimum=1, clamp=MAX_PAGE_SIZE),
+        Field("cursor", parse=decode_cursor, strip=True),
+        Field("fields", many=True, choices=BOOK_FIELDS),
+        Field("include", many=True, choices=BOOK_INCLUDES, messages={"unknown": "unknown includes: {unknown}"}),
+        Field("reviews_limit", int, minimum=0, clamp=MAX_REVIEWS_PER_BOOK),
+    ]
+)
+TOP_BOOKS_SCHEMA = compile_schema(
+    [
+        Field("n", int, minimum=1, clamp=MAX_TOP_BOOKS, default=DEFAULT_TOP_BOOKS),
+        # Books without reviews have no rating to rank them by
+        Field("min_reviews", int, minimum=1, default=1),
+    ]
+)
+SEARCH_SCHEMA = compile_schema(
+    [
+        Field("q", required=True, parse=parse_search_query, key="tokens"),
+        Field("limit", int, minimum=1, clamp=MAX_PAGE_SIZE, default=DEFAULT_SEARCH_PAGE_SIZE),
+        Field("offset", int, minimum=0, clamp=MAX_SEARCH_OFFSET, default=0),
+    ]
+)
+REVIEW_SCHEMA = compile_schema(
+    [
+        Field("id", int, required=True),
+        Field("reviewer", required=True, max_length=Review.reviewer.type.length),
+        Field("rate", int, required=True, minimum=1, maximum=5),
+        Field("review", required=True, max_length=Review.review.type.length),
+        Field("book_id", int, required=True),
+    ]
+)
+REVIEW_BATCH_SCHEMA = compile_schema(
+    [
+        Field("chunk_size", int, minimum=1, clamp=MAX_REVIEW_CHUNK_SIZE, default=DEFAULT_REVIEW_CHUNK_SIZE),
+        Field(
+            "transaction",
+            choices=("single", "chunk"),
+            strip=True,
+            default="single",
+            messages={"choices": "must be 'single' or 'chunk'"},
+        ),
+    ]
+)
@@ -0,0 +1,84 @@
+import argparse
+import json
+import sys
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book
+from sql_alchemy_lambda.utilities import get_db_session
+
+
+def add_book_updated_ts(db_session: Session) -> bool:
+    """
+    Adds Book.rec_updated_ts to a book table created before it, in the caller's transaction.
+    Existing books are stamped with the current time, so every ETag built before changes once.
+    The column can only be added as nullable to a filled SQLite table, books written through
+    the models always get a value.
+    Args:
+        db_session: Session
+    Returns:
+        bool: True if the column was added, False if it was already there
+    """
+    connection = db_session.connection()
+    if "rec_updated_ts" in {column["name"] for column in inspect(connection).get_columns(Book.__tablename__)}:
+        return False
+    column_type = Book.rec_updated_ts.type.compile(dialect=connection.dialect)
+    db_session.execute(text("ALTER TABLE book ADD COLUMN rec_updated_ts {}".format(column_type)))
+    db_session.execute(text("UPDATE book SET rec_updated_ts = CURRENT_TIMESTAMP WHERE rec_updated_ts IS NULL"))
+    if connection.dialect.name == "postgresql":
+        db_session.execute(text("ALTER TABLE book ALTER COLUMN rec_updated_ts SET NOT NULL"))
+    return True
+
+
+def migrate(db_session: Session) -> List[str]:
+    """
+    Brings a database created by an older version up to the models: creates the missing tables
+    and indexes, and adds the missing columns, in the caller's transaction. Safe to run again.
+    Args:
+        db_session: Session
+    Returns:
+        List[str]: the steps that changed something
+    """
+    connection = db_session.connection()
+    steps = []
+    existing = set(inspect(connection).get_table_names())
+    missing = [table.name for table in BaseModel.metadata.sorted_tables if table.name not in existing]
+    if len(missing) > 0:
+        BaseModel.metadata.create_all(connection, checkfirst=True)
+        steps += ["create table {}".format(name) for name in missing]
+    if add_book_updated_ts(db_session):
+        steps.append("add column book.rec_updated_ts")
+    # Indexes added to tables that already existed. Not every inspector lists expression indexes,
+    # so they are created IF NOT EXISTS and not reported.
+    for table in BaseModel.metadata.sorted_tables:
+        if table.name not in missing:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+    return steps
+
+
+def main(argv: list = None) -> List[str]:
+    """
+        Command line entry point, migrates SQLALCHEMY_DATABASE_URI
+    Args:
+        argv (list): command line arguments
+    Returns:
+        List[str]: the steps that changed something
+    """
+    parser = argparse.ArgumentParser(description="Bring the database up to the current models")
+    parser.parse_args(argv)
+    db_session = get_db_session()
+    try:
+        steps = migrate(db_session)
+        db_session.commit()
+    finally:
+        db_session.close()
+    print(json.dumps({"steps": steps}))
+    return steps
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
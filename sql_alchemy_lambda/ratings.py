@@ -0,0 +1,149 @@
+import argparse
+import importlib
+import json
+import sys
+from typing import Iterable, List, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from sql_alchemy_lambda.dbmodels import BookRating, Review
+from sql_alchemy_lambda.utilities import get_db_session
+
+RATES = (1, 2, 3, 4, 5)
+HISTOGRAM_COLUMNS = tuple("rate_{}".format(rate) for rate in RATES)
+AGGREGATE_COLUMNS = ("review_count", "rate_sum") + HISTOGRAM_COLUMNS
+
+# Dialects with INSERT ... ON CONFLICT, so a book's first reviews can't race on its row. Their
+# modules are imported on first use, the engine has loaded the one in use by then, so a cold
+# start doesn't import the postgresql dialect for sqlite.
+UPSERT_INSERTS = {"sqlite": "sqlalchemy.dialects.sqlite", "postgresql": "sqlalchemy.dialects.postgresql"}
+
+
+def rating_deltas(rates: Iterable[Tuple[int, int]]) -> List[dict]:
+    """
+    Args:
+        rates: (book_id, rate) pairs of new reviews
+    Returns:
+        List[dict]: what to add to the aggregates of each book, one row per book
+    """
+    deltas = {}
+    for book_id, rate in rates:
+        delta = deltas.get(book_id)
+        if delta is None:
+            delta = deltas[book_id] = dict(dict.fromkeys(AGGREGATE_COLUMNS, 0), book_id=book_id)
+        delta["review_count"] += 1
+        delta["rate_sum"] += rate
+        # Rates outside 1-5 still count towards the average, they just have no histogram bucket
+        if rate in RATES:
+            delta["rate_{}".format(rate)] += 1
+    return list(deltas.values())
+
+
+def add_ratings(db_session: Session, rates: Iterable[Tuple[int, int]]):
+    """
+    Adds new reviews to the rating aggregates of their books, in the caller's transaction
+    Args:
+        db_session: Session
+        rates: (book_id, rate) pairs of new reviews
+    """
+    deltas = rating_deltas(rates)
+    if len(deltas) == 0:
+        return
+    table = BookRating.__table__
+    dialect_module = UPSERT_INSERTS.get(db_session.get_bind().dialect.name)
+    if dialect_module is not None:
+        statement = importlib.import_module(dialect_module).insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.book_id],
+            set_={column: table.c[column] + statement.excluded[column] for column in AGGREGATE_COLUMNS},
+        )
+        db_session.execute(statement, deltas)
+        return
+
+    existing = set(
+        db_session.execute(
+            select(table.c.book_id).where(table.c.book_id.in_([delta["book_id"] for delta in deltas]))
+        ).scalars()
+    )
+    missing = [delta for delta in deltas if delta["book_id"] not in existing]
+    if len(missing) > 0:
+        db_session.execute(insert(table), missing)
+    changed = [
+        dict({"b_" + column: delta[column] for column in AGGREGATE_COLUMNS}, b_book_id=delta["book_id"])
+        for delta in deltas
+        if delta["book_id"] in existing
+    ]
+    if len(changed) > 0:
+        db_session.execute(
+            update(table)
+            .where(table.c.book_id == bindparam("b_book_id"))
+            .values({column: table.c[column] + bindparam("b_" + column) for column in AGGREGATE_COLUMNS}),
+            changed,
+        )
+
+
+def rebuild_ratings(db_session: Session) -> int:
+    """
+    Recomputes every book's rating aggregates from its reviews with a single GROUP BY,
+    in the caller's transaction
+    Args:
+        db_session: Session
+    Returns:
+        int: number of books with reviews
+    """
+    table = BookRating.__table__
+    aggregates = (
+        select(
+            Review.book_id,
+            func.count(Review.id),
+            func.coalesce(func.sum(Review.rate), 0),
+            *[func.sum(case((Review.rate == rate, 1), else_=0)) for rate in RATES],
+        )
+        .where(Review.book_id.is_not(None))
+        .group_by(Review.book_id)
+    )
+    db_session.execute(delete(table))
+    db_session.execute(insert(table).from_select(("book_id",) + AGGREGATE_COLUMNS, aggregates))
+    return db_session.execute(select(func.count()).select_from(table)).scalar()
+
+
+def rating_to_dict(rating: tuple or None) -> dict:
+    """
+    Args:
+        rating: the AGGREGATE_COLUMNS of a book, None if it has no reviews
+    Returns:
+        dict: count, average and histogram of the rates
+    """
+    if rating is None:
+        return {"count": 0, "average": None, "histogram": dict.fromkeys(map(str, RATES), 0)}
+    count, rate_sum = rating[0], rating[1]
+    return {
+        "count": count,
+        "average": round(rate_sum / count, 2) if count else None,
+        "histogram": {str(rate): value for rate, value in zip(RATES, rating[2:])},
+    }
+
+
+def main(argv: list = None) -> int:
+    """
+        Command line entry point, rebuilds the rating aggregates of SQLALCHEMY_DATABASE_URI
+    Args:
+        argv (list): command line arguments
+    Returns:
+        int: number of books with reviews
+    """
+    parser = argparse.ArgumentParser(description="Recompute the per book rating aggregates from the reviews")
+    parser.parse_args(argv)
+    db_session = get_db_session()
+    try:
+        books = rebuild_ratings(db_session)
+        db_session.commit()
+    finally:
+        db_session.close()
+    print(json.dumps({"books": books}))
+    return books
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
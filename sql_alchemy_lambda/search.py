@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from abc import ABC, abstractmethod
+from typing import List, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from sql_alchemy_lambda.utilities import get_db_session
+
+# Words of a search query, anything else (quotes, operators, punctuation) is dropped
+QUERY_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize_query(q: str) -> List[str]:
+    """
+    Args:
+        q: str
+            raw search query
+    Returns:
+        List[str]: the words to match, all of which must be present
+    """
+    return QUERY_TOKEN.findall(q.lower())
+
+
+def group_reviews(reviews: List[Tuple[int, str]]) -> dict:
+    """
+    Args:
+        reviews: (book_id, review text) pairs
+    Returns:
+        dict: the review texts of each book, so a book's document is updated once per batch
+    """
+    text_by_book = {}
+    for book_id, review in reviews:
+        text_by_book.setdefault(book_id, []).append(review or "")
+    return text_by_book
+
+
+class SearchBackend(ABC):
+    """
+    Full text index of books over Book.title, Book.author and the text of their reviews.
+    One document per book, ranked with title matches above author matches above review matches.
+    """
+
+    @abstractmethod
+    def index_exists(self, db_session: Session) -> bool:
+        """
+        Returns:
+            bool: True if the index has been created
+        """
+
+    @abstractmethod
+    def create_index(self, db_session: Session):
+        """
+        Creates the empty index
+        """
+
+    @abstractmethod
+    def rebuild(self, db_session: Session):
+        """
+        Re-indexes every book and review
+        """
+
+    @abstractmethod
+    def add_reviews(self, db_session: Session, reviews: List[Tuple[int, str]]):
+        """
+        Appends review text to the documents of their books, in the caller's transaction
+        Args:
+            reviews: (book_id, review text) pairs
+        """
+
+    @abstractmethod
+    def search(self, db_session: Session, tokens: List[str], limit: int, offset: int) -> List[tuple]:
+        """
+        Returns:
+            List[tuple]: (id, title, author, score) by descending relevance
+        """
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    SQLite FTS5 table keyed on the book id, used locally and in tests
+    """
+
+    # bm25 column weights for title, author, reviews
+    WEIGHTS = "10.0, 5.0, 1.0"
+
+    def index_exists(self, db_session: Session) -> bool:
+        return db_session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'book_search'")
+        ).first() is not None
+
+    def create_index(self, db_session: Session):
+        db_session.execute(text("CREATE VIRTUAL TABLE book_search USING fts5(title, author, reviews)"))
+
+    def rebuild(self, db_session: Session):
+        db_session.execute(text("DELETE FROM book_search"))
+        db_session.execute(
+            text(
+                "INSERT INTO book_search (rowid, title, author, reviews) "
+                "SELECT book.id, book.title, book.author, coalesce(reviews.text, '') FROM book "
+                "LEFT JOIN (SELECT book_id, group_concat(review, ' ') AS text FROM review GROUP BY book_id) AS reviews "
+                "ON reviews.book_id = book.id"
+            )
+        )
+
+    def add_reviews(self, db_session: Session, reviews: List[Tuple[int, str]]):
+        text_by_book = group_reviews(reviews)
+        indexed = {
+            row[0]
+            for row in db_session.execute(
+                text("SELECT rowid FROM book_search WHERE rowid IN :book_ids").bindparams(
+                    bindparam("book_ids", expanding=True)
+                ),
+                {"book_ids": list(text_by_book.keys())},
+            )
+        }
+        missing = [book_id for book_id in text_by_book if book_id not in indexed]
+        if len(missing) > 0:
+            # Books that were never indexed get their whole document, these reviews included
+            db_session.execute(
+                text(
+                    "INSERT INTO book_search (rowid, title, author, reviews) "
+                    "SELECT book.id, book.title, book.author, "
+                    "(SELECT coalesce(group_concat(review.review, ' '), '') FROM review WHERE review.book_id = book.id) "
+                    "FROM book WHERE book.id IN :book_ids"
+                ).bindparams(bindparam("book_ids", expanding=True)),
+                {"book_ids": missing},
+            )
+        appended = [
+            {"book_id": book_id, "review": " ".join(texts)} for book_id, texts in text_by_book.items() if book_id in indexed
+        ]
+        if len(appended) > 0:
+            db_session.execute(
+                text("UPDATE book_search SET reviews = reviews || ' ' || :review WHERE rowid = :book_id"), appended
+            )
+
+    def search(self, db_session: Session, tokens: List[str], limit: int, offset: int) -> List[tuple]:
+        # Every token is quoted so FTS5 reads it as a plain string, never as query syntax
+        match = " ".join('"{}"'.format(token) for token in tokens)
+        rows = db_session.execute(
+            text(
+                "SELECT book.id, book.title, book.author, -bm25(book_search, {}) AS score "
+                "FROM book_search JOIN book ON book.id = book_search.rowid "
+                "WHERE book_search MATCH :match "
+                "ORDER BY bm25(book_search, {}), book.id LIMIT :limit OFFSET :offset".format(self.WEIGHTS, self.WEIGHTS)
+            ),
+            {"match": match, "limit": limit, "offset": offset},
+        )
+        return [tuple(row) for row in rows]
+
+
+class PostgresTsvectorBackend(SearchBackend):
+    """
+    Postgres table of weighted tsvectors with a GIN index
+    """
+
+    def index_exists(self, db_session: Session) -> bool:
+        return db_session.execute(text("SELECT to_regclass('book_search')")).scalar() is not None
+
+    def create_index(self, db_session: Session):
+        db_session.execute(
+            text("CREATE TABLE book_search (book_id INTEGER PRIMARY KEY REFERENCES book (id), document TSVECTOR NOT NULL)")
+        )
+        db_session.execute(text("CREATE INDEX ix_book_search_document ON book_search USING GIN (document)"))
+
+    def rebuild(self, db_session: Session):
+        db_session.execute(text("DELETE FROM book_search"))
+        db_session.execute(
+            text(
+                "INSERT INTO book_search (book_id, document) "
+                "SELECT book.id, "
+                "setweight(to_tsvector('english', book.title), 'A') || "
+                "setweight(to_tsvector('english', book.author), 'B') || "
+                "setweight(to_tsvector('english', coalesce(reviews.text, '')), 'C') "
+                "FROM book LEFT JOIN "
+                "(SELECT book_id, string_agg(review, ' ') AS text FROM review GROUP BY book_id) AS reviews "
+                "ON reviews.book_id = book.id"
+            )
+        )
+
+    def add_reviews(self, db_session: Session, reviews: List[Tuple[int, str]]):
+        # Books that were never indexed get their whole document, these reviews included
+        db_session.execute(
+            text(
+                "INSERT INTO book_search (book_id, document) "
+                "SELECT book.id, "
+                "setweight(to_tsvector('english', book.title), 'A') || "
+                "setweight(to_tsvector('english', book.author), 'B') || "
+                "setweight(to_tsvector('english', coalesce("
+                "(SELECT string_agg(review.review, ' ') FROM review WHERE review.book_id = book.id), '')), 'C') "
+                "FROM book WHERE book.id = :book_id "
+                "ON CONFLICT (book_id) DO UPDATE SET document = book_search.document || "
+                "setweight(to_tsvector('english', :review), 'C')"
+            ),
+            [{"book_id": book_id, "review": " ".join(texts)} for book_id, texts in group_reviews(reviews).items()],
+        )
+
+    def search(self, db_session: Session, tokens: List[str], limit: int, offset: int) -> List[tuple]:
+        rows = db_session.execute(
+            text(
+                "SELECT book.id, book.title, book.author, ts_rank_cd(book_search.document, query) AS score "
+                "FROM book_search JOIN book ON book.id = book_search.book_id, "
+                "plainto_tsquery('english', :q) AS query "
+                "WHERE book_search.document @@ query "
+                "ORDER BY score DESC, book.id LIMIT :limit OFFSET :offset"
+            ),
+            {"q": " ".join(tokens), "limit": limit, "offset": offset},
+        )
+        return [tuple(row) for row in rows]
+
+
+SEARCH_BACKENDS = {"sqlite": SQLiteFTSBackend, "postgresql": PostgresTsvectorBackend}
+
+# Backends by engine, once their index was found, for the life of the container
+_search_backends = {}
+# Engines whose index was missing, with the time to look again, so requests don't check each time
+_missing_indexes = {}
+
+
+def search_supported(db_session: Session) -> bool:
+    """
+    Args:
+        db_session: Session
+    Returns:
+        bool: True if the session's database has a full text search backend
+    """
+    return db_session.get_bind().dialect.name in SEARCH_BACKENDS
+
+
+def get_search_backend(db_session: Session) -> SearchBackend or None:
+    """
+    Gets the search backend for the session's database. The index is never created or filled
+    here, see rebuild_search(), so no request pays for it.
+    Args:
+        db_session: Session
+    Returns:
+        SearchBackend or None: the backend, None if the database has no full text search support
+        or its index hasn't been built yet
+    """
+    bind = db_session.get_bind()
+    backend = _search_backends.get(bind)
+    if backend is None and bind.dialect.name in SEARCH_BACKENDS:
+        # A missing index is only remembered for SEARCH_MISSING_INDEX_TTL seconds, so containers
+        # pick it up once it is built
+        if _missing_indexes.get(bind, 0) > time.time():
+            return None
+        backend = SEARCH_BACKENDS[bind.dialect.name]()
+        if not backend.index_exists(db_session):
+            _missing_indexes[bind] = time.time() + float(os.environ.get("SEARCH_MISSING_INDEX_TTL", "60"))
+            return None
+        _missing_indexes.pop(bind, None)
+        _search_backends[bind] = backend
+    return backend
+
+
+def reset_search_backends():
+    """
+    Forgets the checked backends and missing indexes. Meant for tests.
+    """
+    _search_backends.clear()
+    _missing_indexes.clear()
+
+
+def rebuild_search(db_session: Session) -> int:
+    """
+    Creates the search index if it is missing and re-indexes every book and review, in the
+    caller's transaction. Run it after adding books any other way than POST /review.
+    Args:
+        db_session: Session
+    Returns:
+        int: number of indexed books
+    """
+    if not search_supported(db_session):
+        raise ValueError("search not supported by the {} database".format(db_session.get_bind().dialect.name))
+    backend = SEARCH_BACKENDS[db_session.get_bind().dialect.name]()
+    if not backend.index_exists(db_session):
+        backend.create_index(db_session)
+    backend.rebuild(db_session)
+    # Requests of this process may use it right away
+    _missing_indexes.pop(db_session.get_bind(), None)
+    return db_session.execute(text("SELECT count(*) FROM book_search")).scalar()
+
+
+def main(argv: list = None) -> int:
+    """
+        Command line entry point, rebuilds the search index of SQLALCHEMY_DATABASE_URI
+    Args:
+        argv (list): command line arguments
+    Returns:
+        int: number of indexed books
+    """
+    parser = argparse.ArgumentParser(description="Manage the full text search index of the books")
+    parser.add_argument("--rebuild", action="store_true", help="create the index if needed and re-index every book")
+    args = parser.parse_args(argv)
+    if not args.rebuild:
+        parser.error("nothing to do, pass --rebuild")
+    db_session = get_db_session()
+    try:
+        books = rebuild_search(db_session)
+        db_session.commit()
+    finally:
+        db_session.close()
+    print(json.dumps({"books": books}))
+    return books
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, Numeric, String
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import configure_mappers, synonym
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book
+from sql_alchemy_lambda.dbmodels.base import _encoder_plans, _serialization_plans
+from validation import Field, compile_schema
+
+
+class SerializationExample(BaseModel):
+    __tablename__ = "serialization_example"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100))
+    secret = Column(String(100))
+    price = Column(Numeric(10, 2))
+    rec_created_ts = Column(DateTime)
+    label = synonym("name")
+    _excluded_attributes = ["secret"]
+
+    @hybrid_property
+    def upper_name(self):
+        return self.name.upper()
+
+
+class FloatExample(BaseModel):
+    __tablename__ = "serialization_float_example"
+    _serialize_columns_only = True
+    _decimal_as_float = True
+
+    id = Column(Integer, primary_key=True)
+    price = Column(Numeric(10, 2))
+
+
+def test_book_as_dict():
+    book = Book(id=1, title="The Title", author="Joe Smith", publisher="Bobby Jones", year=1965)
+    assert book.as_dict() == {
+        "id": 1,
+        "title": "The Title",
+        "author": "Joe Smith",
+        "publisher": "Bobby Jones",
+        "year": 1965,
+    }
+    assert list(book.as_dict().keys()) == ["id", "title", "author", "publisher", "year"]
+
+
+def test_serialization_plan_is_cached():
+    assert Book.serialization_plan() is Book.serialization_plan()
+
+
+def test_serialization_plan_cleared_on_configure():
+    plan = Book.serialization_plan()
+    encoder_plan = Book.encoder_plan()
+    assert Book in _serialization_plans
+    assert Book in _encoder_plans
+
+    class ReconfigureExample(BaseModel):
+        __tablename__ = "serialization_reconfigure_example"
+        id = Column(Integer, primary_key=True)
+
+    configure_mappers()
+    assert Book not in _serialization_plans
+    assert Book not in _encoder_plans
+    assert Book.serialization_plan() == plan
+    assert Book.encoder_plan() == encoder_plan
+
+
+def test_encoder_plan_follows_serialization_plan():
+    columns, relationships = Book.encoder_plan()
+    assert columns == tuple(attribute for attribute, _ in Book.serialization_plan())
+    assert "rec_updated_ts" not in columns
+    assert set(relationships) == {"reviews", "rating"}
+
+
+def test_as_dict_converters_and_exclusions():
+    created = datetime.datetime(2022, 3, 30, 12, 15)
+    example = SerializationExample(id=1, name="widget", secret="hidden", price=Decimal("9.99"))
+    example.rec_created_ts = created
+    result = example.as_dict()
+
+    assert result == {
+        "id": 1,
+        "name": "widget",
+        "price": "9.99",
+        "rec_created_ts": "2022-03-30T12:15:00",
+        "upper_name": "WIDGET",
+    }
+    assert example.excluded_attributes == {"__mapper__", "_sa_instance_state", "label", "secret"}
+
+
+def test_as_dict_decimal_as_float_and_none():
+    assert FloatExample(id=1, price=Decimal("1.50")).as_dict() == {"id": 1, "price": 1.5}
+    assert FloatExample(id=2).as_dict() == {"id": 2, "price": None}
+
+
+def test_update_from_params_with_schema():
+    schema = compile_schema([Field("name", max_length=5), Field("price", int, minimum=0)])
+    example = SerializationExample(id=1, name="widget")
+
+    example.update_from_params({"name": "gear", "price": "3", "secret": "ignored"}, schema)
+    assert (example.name, example.price, example.secret) == ("gear", 3, None)
+
+    with pytest.raises(ValueError) as e_info:
+        example.update_from_params({"name": "too long"}, schema)
+    assert e_info.value.__str__() == "name: must be at most 5 characters"
+    assert example.name == "gear"
@@ -0,0 +1,137 @@
+import os
+from unittest.mock import patch
+
+import pytest
+
+from sql_alchemy_lambda.cache import (
+    MISS,
+    CacheBackend,
+    ResultCache,
+    SQLiteCacheBackend,
+    get_book_cache,
+    make_cache_key,
+    reset_book_cache,
+)
+
+
+@pytest.fixture
+def clock():
+    with patch("sql_alchemy_lambda.cache.time") as mock_time:
+        mock_time.time.return_value = 1000.0
+        yield mock_time.time
+
+
+def test_make_cache_key_is_normalized():
+    assert make_cache_key("book", {"year": 1965, "author": "Joe"}) == make_cache_key(
+        "book", {"author": "Joe", "year": 1965}
+    )
+    assert make_cache_key("book", {"fields": ("title",)}) == 'book?{"fields":["title"]}'
+
+
+def test_get_set(clock):
+    cache = ResultCache()
+    assert cache.get("key") is MISS
+    cache.set("key", {"data": []}, empty=True)
+    assert cache.get("key") == {"data": []}
+    assert cache.stats() == {
+        "hits": 1, "misses": 1, "evictions": 0, "expirations": 0, "invalidations": 0, "backend_hits": 0, "size": 1
+    }
+
+
+def test_ttl_and_negative_ttl(clock):
+    cache = ResultCache(ttl=60, negative_ttl=10)
+    cache.set("found", {"data": [1]}, book_ids=[1])
+    cache.set("empty", {"data": []}, empty=True)
+    clock.return_value = 1011.0
+    assert cache.get("empty") is MISS
+    assert cache.get("found") == {"data": [1]}
+    clock.return_value = 1061.0
+    assert cache.get("found") is MISS
+    assert cache.stats()["expirations"] == 2
+
+
+def test_lru_eviction(clock):
+    cache = ResultCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is MISS
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_books(clock):
+    cache = ResultCache()
+    cache.set("a", "a", book_ids=[1, 2])
+    cache.set("b", "b", book_ids=[3])
+    cache.set("empty", "empty", empty=True)
+    cache.invalidate_books([2])
+    assert cache.get("a") is MISS
+    assert cache.get("b") == "b"
+    assert cache.get("empty") == "empty"
+    cache.clear()
+    assert cache.get("b") is MISS
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_sqlite_backend(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    first = ResultCache(backend=SQLiteCacheBackend(path))
+    first.set("a", {"data": [{"id": 12}]}, book_ids=[12])
+    first.set("b", {"data": [{"id": 2}]}, book_ids=[2])
+
+    # A second container sees the entries through the shared backend
+    second = ResultCache(backend=SQLiteCacheBackend(path))
+    assert second.get("a") == {"data": [{"id": 12}]}
+    assert second.stats()["backend_hits"] == 1
+
+    second.invalidate_books([2])
+    assert ResultCache(backend=SQLiteCacheBackend(path)).get("b") is MISS
+    assert ResultCache(backend=SQLiteCacheBackend(path)).get("a") == {"data": [{"id": 12}]}
+
+    clock.return_value = 2000.0
+    assert ResultCache(backend=SQLiteCacheBackend(path)).get("a") is MISS
+
+
+def test_sqlite_backend_book_ids(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / "cache.db"))
+    backend.set("a", (100.0, {"data": []}, frozenset([1, 2, 3])))
+    backend.set("b", (100.0, {"data": []}, frozenset([3, 4])))
+    backend.set("c", (100.0, {"data": []}, frozenset()))
+    assert backend.get("a") == (100.0, {"data": []}, frozenset([1, 2, 3]))
+
+    # Replacing an entry replaces its book ids
+    backend.set("a", (200.0, {"data": [1]}, frozenset([1])))
+    assert backend.get("a") == (200.0, {"data": [1]}, frozenset([1]))
+    backend.delete_books([2])
+    assert backend.get("a") is not None
+
+    backend.delete_books(list(range(3, 1003)))
+    assert backend.get("b") is None
+    assert backend.get("a") is not None
+    assert backend.get("c") is not None
+    # The side table rows went with their entries
+    assert backend.connection.execute("SELECT key, book_id FROM result_cache_book").fetchall() == [("a", 1)]
+
+
+def test_get_book_cache(tmp_path):
+    reset_book_cache()
+    env = {"BOOK_CACHE_SIZE": "3", "BOOK_CACHE_TTL": "5", "BOOK_CACHE_SQLITE_PATH": str(tmp_path / "cache.db")}
+    with patch.dict(os.environ, env, clear=True):
+        cache = get_book_cache()
+        assert cache is get_book_cache()
+    assert cache.max_entries == 3
+    assert cache.ttl == 5
+    assert isinstance(cache.backend, SQLiteCacheBackend)
+    reset_book_cache()
+
+
+def test_cache_backend_is_abstract():
+    class IncompleteBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
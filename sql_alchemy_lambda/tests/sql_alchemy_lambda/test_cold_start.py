@@ -0,0 +1,36 @@
+import importlib
+import os
+import sys
+from unittest.mock import patch
+
+import pytest
+
+# Dialects are loaded by the first engine, for the database it connects to
+DIALECTS = ("sqlalchemy.dialects.sqlite", "sqlalchemy.dialects.postgresql")
+
+
+def test_import():
+    # sys.modules is restored on exit, so the rest of the suite keeps its modules
+    with patch.dict(sys.modules):
+        for module in list(sys.modules):
+            if module.split(".")[0] in ("sql_alchemy_lambda", "sqlite3") or module.startswith(DIALECTS):
+                del sys.modules[module]
+
+        importlib.import_module("sql_alchemy_lambda.lambda_handler")
+        dbmodels = importlib.import_module("sql_alchemy_lambda.dbmodels")
+
+        assert [module for module in sys.modules if module.startswith(DIALECTS)] == []
+        # Only SQLiteCacheBackend needs it, the in-process cache doesn't
+        assert "sqlite3" not in sys.modules
+        # Mappers are configured by the import rather than by the first query
+        assert all(model.__mapper__.configured for model in (dbmodels.Book, dbmodels.BookRating, dbmodels.Review))
+
+
+@pytest.mark.skipif(os.environ.get("COLD_START_BUDGET") != "1", reason="wall clock budget, set COLD_START_BUDGET=1")
+def test_cold_start_budget(tmp_path):
+    from benchmarks.bench_cold_start import BOOK_EVENT, BUDGETS_MS, cold_start, make_book_database, within_budget
+
+    uri = make_book_database(str(tmp_path / "books.db"))
+    report = cold_start("sql_alchemy_lambda.lambda_handler", BOOK_EVENT, {"SQLALCHEMY_DATABASE_URI": uri}, runs=3)
+    assert report["status_code"] == 200
+    assert within_budget(report), (BUDGETS_MS[report["module"]], report["first_response_ms"])
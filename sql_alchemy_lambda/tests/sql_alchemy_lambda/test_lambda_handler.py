@@ -1,13 +1,69 @@
 import json
 from unittest.mock import patch
-from sql_alchemy_lambda.dbmodels import Book
-from sql_alchemy_lambda.lambda_handler import get_book, build_book_query
 
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
 
+from sql_alchemy_lambda.cache import ResultCache, StatementCache, make_cache_key, reset_book_cache
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, Review
+from sql_alchemy_lambda.ratings import rebuild_ratings
+from sql_alchemy_lambda.lambda_handler import (
+    BOOK_COLUMNS,
+    YIELD_PER,
+    book_statement_values,
+    get_book,
+    build_book_query,
+    paginate_book_query,
+    prefix_end,
+    build_etag,
+    decode_cursor,
+    encode_cursor,
+    handler,
+    insert_review,
+    insert_reviews,
+    validate_get_book_params,
+)
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            Book(id=i, title="Title {}".format(i), author="Author {}".format(i % 3), publisher="Publisher", year=2000 + i % 5)
+            for i in range(1, 26)
+        ]
+    )
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture
+def count_statements(db_session):
+    """
+    The SQL statements run by the session's engine, cleared right before the calls to count. The
+    listener is removed on teardown, even if the test fails.
+    """
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_session.get_bind(), "before_cursor_execute", listener)
+    yield statements
+    event.remove(db_session.get_bind(), "before_cursor_execute", listener)
+
+
+@patch('sql_alchemy_lambda.lambda_handler.get_book_fingerprint')
+@patch('sql_alchemy_lambda.lambda_handler.paginate_book_query')
 @patch('sql_alchemy_lambda.lambda_handler.build_book_query')
 @patch('sql_alchemy_lambda.lambda_handler.validate_get_book_params')
 @patch('sql_alchemy_lambda.lambda_handler.Session')
-def test_get_book(mock_session, mock_validate_get_book_params, mock_build_book_query):
+def test_get_book(
+    mock_session, mock_validate_get_book_params, mock_build_book_query, mock_paginate_book_query, mock_fingerprint
+):
     validated_params = {
         "id": 1,
         "title": "The Title",
@@ -16,14 +72,15 @@ def test_get_book(mock_session, mock_validate_get_book_params, mock_build_book_q
         "year": 1965
     }
     mock_validate_get_book_params.return_value = (validated_params, {})
-    book = Book(**validated_params)
-    mock_build_book_query.return_value.all.return_value = [book]
+    mock_session.execute.return_value = [(1, "The Title", "Joe Smith", "Bobby Jones", 1965)]
+    mock_fingerprint.return_value = (1, 1, "2022-03-30 00:00:00")
     expected = {
         "statusCode": 200,
         'isBase64Encoded': False,
         "headers": {
                 "Access-Control-Allow-Origin": "*",
                 "Content-Type": "application/json",
+                "ETag": build_etag(make_cache_key("book", validated_params), (1, 1, "2022-03-30 00:00:00")),
             }
         ,
         "body": {"data": json.loads(json.dumps([
@@ -34,11 +91,23 @@ def test_get_book(mock_session, mock_validate_get_book_params, mock_build_book_q
              'year': 1965}
         ]))}
     }
-    result = get_book(mock_session, validated_params)
+    statements = StatementCache()
+    result = get_book(mock_session, validated_params, statements=statements)
     assert "body" in result
     assert expected["statusCode"] == result["statusCode"]
     assert expected["isBase64Encoded"] == result["isBase64Encoded"]
     assert expected["headers"] == result["headers"]
+    assert result["body"]["next_cursor"] is None
+    mock_build_book_query.assert_called_once_with(
+        ("id", "title", "author", "publisher", "year", "page_limit"),
+        False,
+        columns=[Book.id, Book.title, Book.author, Book.publisher, Book.year],
+    )
+    mock_session.execute.assert_called_once_with(
+        mock_paginate_book_query.return_value,
+        {"id": 1, "title": "The Title", "author": "Joe Smith", "publisher": "Bobby Jones", "year": 1965, "page_limit": 101},
+        execution_options={"yield_per": YIELD_PER},
+    )
 
     for (res, exp) in zip(result["body"]["data"], expected["body"]["data"]):
         assert res["author"] == exp["author"]
@@ -48,8 +117,7 @@ def test_get_book(mock_session, mock_validate_get_book_params, mock_build_book_q
         assert res["year"] == exp["year"]
 
 
-@patch('sql_alchemy_lambda.lambda_handler.Session')
-def test_build_book_query(mock_db_session):
+def test_build_book_query():
     validated_params = {
         "id": 1,
         "title": "The Title",
@@ -58,25 +126,354 @@ def test_build_book_query(mock_db_session):
         "year": 1965
     }
 
-    not_used = build_book_query(mock_db_session, validated_params)
-    mock_db_session.query.assert_called_once_with(Book)
-    mock_db_session.query().filter.assert_called_once()
-    assert mock_db_session.query().method_calls[0][0] == 'filter'
-    assert mock_db_session.query().method_calls[0][1][0].__str__() == 'book.id = :id_1'
+    statement = build_book_query(tuple(book_statement_values(validated_params)))
+    assert [condition.__str__() for condition in statement.whereclause.clauses] == [
+        'book.id = :id',
+        'book.title = :title',
+        'book.author = :author',
+        'book.publisher = :publisher',
+        'book.year = :year',
+    ]
+
+
+def test_book_statement_values():
+    values = book_statement_values({"title_prefix": "Ti", "author": "Ann", "ignore_case": True, "cursor": 4, "limit": 5})
+    assert values == {"author": "ann", "title_prefix": "ti", "title_prefix_end": "tj", "cursor": 4, "page_limit": 6}
+
+
+@pytest.mark.parametrize(
+    ("prefix", "expected"),
+    [("ab", "ac"), ("a\ud7ff", "a\ue000"), ("\U0010ffff", None)],
+)
+def test_prefix_end(prefix, expected):
+    assert prefix_end(prefix) == expected
+
+
+def test_get_book_non_ascii_prefix(db_session):
+    db_session.add_all(
+        [
+            Book(id=26, title="\u00c9mile", author="Rousseau", publisher="P", year=2000),
+            Book(id=27, title="\u00e9mile", author="Rousseau", publisher="P", year=2000),
+            Book(id=28, title="\ud7ff", author="Rousseau", publisher="P", year=2000),
+        ]
+    )
+    db_session.commit()
+
+    def ids(params):
+        return [book["id"] for book in get_book(db_session, dict(params, fields="id"))["body"]["data"]]
+
+    # Only ASCII letters are folded, like SQLite's lower()
+    assert ids({"title_prefix": "\u00c9MI", "ignore_case": "true"}) == [26]
+    assert ids({"title_prefix": "\u00e9mi", "ignore_case": "true"}) == [27]
+    assert ids({"title_prefix": "\ud7ff"}) == [28]
+
+
+def test_get_book_reuses_statements(db_session):
+    statements = StatementCache()
+    get_book(db_session, {"author": "Author 1", "limit": "2"}, statements=statements)
+    first = statements.stats()
+    get_book(db_session, {"author": "Author 2", "limit": "3", "cursor": encode_cursor(1)}, statements=statements)
+    result = get_book(db_session, {"author": "Author 2", "limit": "3"}, statements=statements)
+    # fingerprint and page, built once per filter shape
+    assert first == {"hits": 0, "misses": 2, "evictions": 0, "size": 2}
+    assert statements.stats() == {"hits": 2, "misses": 4, "evictions": 0, "size": 4}
+    assert [book["id"] for book in result["body"]["data"]] == [2, 5, 8]
+
+
+@pytest.mark.parametrize(
+    ("params", "expected_ids"),
+    [
+        ({"title_prefix": "Title 1"}, [1] + list(range(10, 20))),
+        ({"title_prefix": "title 2", "ignore_case": "true"}, [2, 20, 21, 22, 23, 24, 25]),
+        ({"title_prefix": "title 2"}, []),
+        ({"author": "AUTHOR 0", "ignore_case": "yes"}, [3, 6, 9, 12, 15, 18, 21, 24]),
+        ({"author_prefix": "Author 2", "year_from": "2001", "year_to": "2002"}, [2, 11, 17]),
+        ({"year_from": "2004"}, [4, 9, 14, 19, 24]),
+        ({"year_to": "2000", "author": "Author 1"}, [10, 25]),
+    ],
+)
+def test_get_book_search_filters(db_session, params, expected_ids):
+    result = get_book(db_session, dict(params, fields="id"))
+    assert [book["id"] for book in result["body"]["data"]] == expected_ids
+
+
+@pytest.mark.parametrize(
+    ("params", "index"),
+    [
+        ({"title_prefix": "Ti"}, "ix_book_title"),
+        ({"title": "title 1", "ignore_case": True}, "ix_book_title_lower"),
+        ({"title_prefix": "ti", "ignore_case": True}, "ix_book_title_lower"),
+        ({"author": "Author 1", "year_from": 2000, "year_to": 2002}, "ix_book_author_year"),
+        ({"author_prefix": "Auth"}, "ix_book_author_year"),
+        ({"author_prefix": "auth", "ignore_case": True}, "ix_book_author_lower"),
+        ({"year_from": 2000, "year_to": 2002}, "ix_book_year"),
+    ],
+)
+def test_build_book_query_uses_index(db_session, params, index):
+    values = book_statement_values(params)
+    query = paginate_book_query(
+        build_book_query(tuple(values), params.get("ignore_case", False), columns=list(BOOK_COLUMNS.values())),
+        tuple(values),
+    )
+    statement = query.params(values).compile(db_session.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = db_session.execute(text("EXPLAIN QUERY PLAN " + str(statement))).fetchall()
+    assert "USING INDEX {} ".format(index) in plan[0][3]
+
+
+def test_get_book_pages(db_session):
+    seen = []
+    params = {"limit": "10"}
+    while True:
+        result = get_book(db_session, params)
+        assert result["statusCode"] == 200
+        assert len(result["body"]["data"]) <= 10
+        seen.extend(book["id"] for book in result["body"]["data"])
+        if result["body"]["next_cursor"] is None:
+            break
+        params = {"limit": "10", "cursor": result["body"]["next_cursor"]}
+    assert seen == list(range(1, 26))
+
+
+def test_get_book_sparse_fields(db_session):
+    result = get_book(db_session, {"fields": "title, year", "limit": "2"})
+    assert result["body"]["data"] == [{"title": "Title 1", "year": 2001}, {"title": "Title 2", "year": 2002}]
+    result = get_book(db_session, {"fields": "title", "limit": "2", "cursor": result["body"]["next_cursor"]})
+    assert result["body"]["data"] == [{"title": "Title 3"}, {"title": "Title 4"}]
+
+
+def add_reviews(db_session, reviews_per_book: int):
+    db_session.execute(
+        Review.__table__.insert(),
+        [
+            {"reviewer": "Reviewer {}".format(r), "rate": 1 + r % 5, "review": "Review", "book_id": book_id}
+            for book_id in range(1, 26)
+            for r in range(book_id % 4 * reviews_per_book)
+        ],
+    )
+    # Bulk loaded behind the API's back, like a restore, so the aggregates are rebuilt
+    rebuild_ratings(db_session)
+    db_session.commit()
+
+
+def test_get_book_include_reviews(db_session):
+    add_reviews(db_session, 2)
+    result = get_book(db_session, {"include": "reviews", "reviews_limit": "3", "limit": "4", "fields": "title"})
+    books = result["body"]["data"]
+    assert [book["title"] for book in books] == ["Title 1", "Title 2", "Title 3", "Title 4"]
+    assert [len(book["reviews"]) for book in books] == [2, 3, 3, 0]
+    assert books[0]["reviews"][0] == {"id": 1, "reviewer": "Reviewer 0", "rate": 1, "review": "Review"}
+    assert [book["rating"] for book in books] == [
+        {"count": 2, "average": 1.5, "histogram": {"1": 1, "2": 1, "3": 0, "4": 0, "5": 0}},
+        {"count": 4, "average": 2.5, "histogram": {"1": 1, "2": 1, "3": 1, "4": 1, "5": 0}},
+        {"count": 6, "average": 2.67, "histogram": {"1": 2, "2": 1, "3": 1, "4": 1, "5": 1}},
+        {"count": 0, "average": None, "histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0}},
+    ]
+
+
+def test_get_book_include_rating(db_session, count_statements):
+    insert_review(db_session, {"id": "1", "reviewer": "Ann", "rate": "5", "review": "Great", "book_id": "2"})
+    insert_reviews(db_session, None, [review_row(2, rate="3", book_id=2), review_row(3, rate="4", book_id=3)])
+    count_statements.clear()
+    result = get_book(db_session, {"include": "rating", "limit": "3", "fields": "id"})
+    assert result["body"]["data"] == [
+        {"id": 1, "rating": {"count": 0, "average": None, "histogram": {"1": 0, "2": 0, "3": 0, "4": 0, "5": 0}}},
+        {"id": 2, "rating": {"count": 2, "average": 4.0, "histogram": {"1": 0, "2": 0, "3": 1, "4": 0, "5": 1}}},
+        {"id": 3, "rating": {"count": 1, "average": 4.0, "histogram": {"1": 0, "2": 0, "3": 0, "4": 1, "5": 0}}},
+    ]
+    # fingerprint, books, ratings, no review is read
+    assert len(count_statements) == 3
+    assert not any("FROM review" in statement for statement in count_statements[1:])
+
+
+@pytest.mark.parametrize("limit", ["2", "10", "25"])
+def test_get_book_include_reviews_statement_count(db_session, count_statements, limit):
+    add_reviews(db_session, 3)
+    count_statements.clear()
+    result = get_book(db_session, {"include": "reviews", "limit": limit})
+    assert len(result["body"]["data"]) == int(limit)
+    # fingerprint, books, ratings, capped reviews
+    assert len(count_statements) == 4
 
-    mock_db_session.query().filter().filter.assert_called_once()
-    assert mock_db_session.query().filter().method_calls[0][0] == 'filter'
-    assert mock_db_session.query().filter().method_calls[0][1][0].__str__() == 'book.title = :title_1'
 
-    mock_db_session.query().filter().filter().filter.assert_called_once()
-    assert mock_db_session.query().filter().filter().method_calls[0][0] == 'filter'
-    assert mock_db_session.query().filter().filter().method_calls[0][1][0].__str__() == 'book.author = :author_1'
+def test_get_book_cached(db_session):
+    cache = ResultCache()
+    first = get_book(db_session, {"limit": "2", "fields": "title"}, cache=cache)
+    db_session.query(Book).filter(Book.id == 1).update({"title": "Changed"})
+    db_session.commit()
+    second = get_book(db_session, {"fields": " title ", "limit": "2"}, cache=cache)
+    assert second == first
+    assert cache.stats()["hits"] == 1
 
-    mock_db_session.query().filter().filter().filter().filter.assert_called_once()
-    assert mock_db_session.query().filter().filter().filter().method_calls[0][0] == 'filter'
-    assert mock_db_session.query().filter().filter().filter().method_calls[0][1][0].__str__() == 'book.publisher = :publisher_1'
+    insert_review(db_session, {"id": "1", "reviewer": "Ann", "rate": "5", "review": "Great", "book_id": "1"}, cache=cache)
+    third = get_book(db_session, {"limit": "2", "fields": "title"}, cache=cache)
+    assert third["body"]["data"][0] == {"title": "Changed"}
+
+
+def test_get_book_cached_empty(db_session):
+    cache = ResultCache()
+    get_book(db_session, {"author": "Nobody"}, cache=cache)
+    insert_reviews(db_session, None, [review_row(1, book_id=2)], cache=cache)
+    result = get_book(db_session, {"author": "Nobody"}, cache=cache)
+    assert result["body"] == {"data": [], "next_cursor": None}
+    assert cache.stats()["hits"] == 1
+
+
+def test_get_book_etag(db_session, count_statements):
+    first = get_book(db_session, {"limit": "5", "include": "reviews"})
+    etag = first["headers"]["ETag"]
+    assert first["statusCode"] == 200
+
+    count_statements.clear()
+    not_modified = get_book(db_session, {"include": "reviews", "limit": "5"}, if_none_match='"other", W/' + etag)
+    assert not_modified["statusCode"] == 304
+    assert not_modified["body"] is None
+    assert not_modified["headers"]["ETag"] == etag
+    assert len(count_statements) == 1
+
+    assert get_book(db_session, {"limit": "6", "include": "reviews"}, if_none_match=etag)["statusCode"] == 200
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda session: session.query(Book).filter(Book.id == 3).update({"title": "Changed"}),
+        lambda session: session.add(Review(reviewer="Ann", rate=5, review="Great", book_id=2)),
+        lambda session: session.query(Book).filter(Book.id == 4).delete(),
+    ],
+)
+def test_get_book_etag_changes(db_session, change):
+    etag = get_book(db_session, {"limit": "5", "include": "reviews"})["headers"]["ETag"]
+    change(db_session)
+    db_session.commit()
+    result = get_book(db_session, {"limit": "5", "include": "reviews"}, if_none_match=etag)
+    assert result["statusCode"] == 200
+    assert result["headers"]["ETag"] != etag
+
+
+def test_get_book_etag_cached(db_session, count_statements):
+    cache = ResultCache()
+    etag = get_book(db_session, {"limit": "5"}, cache=cache)["headers"]["ETag"]
+    count_statements.clear()
+    result = get_book(db_session, {"limit": "5"}, cache=cache, if_none_match=etag)
+    assert result["statusCode"] == 304
+    assert count_statements == []
+
+
+def test_get_book_matches_as_dict(db_session):
+    result = get_book(db_session, {"limit": "25"})
+    expected = [book.as_dict() for book in db_session.query(Book).order_by(Book.id)]
+    assert result["body"]["data"] == expected
+
+
+def test_get_book_pages_with_filter(db_session):
+    result = get_book(db_session, {"author": "Author 1", "limit": "3"})
+    assert [book["id"] for book in result["body"]["data"]] == [1, 4, 7]
+    result = get_book(db_session, {"author": "Author 1", "limit": "3", "cursor": result["body"]["next_cursor"]})
+    assert [book["id"] for book in result["body"]["data"]] == [10, 13, 16]
+
+
+@pytest.mark.parametrize(
+    ("params", "expected"),
+    [
+        ({"limit": "20"}, ({"limit": 20}, [])),
+        ({"limit": "100000"}, ({"limit": 500}, [])),
+        ({"limit": "0"}, ({}, [{"field": "limit", "message": "must be greater than 0"}])),
+        ({"limit": "ten"}, ({}, [{"field": "limit", "message": "not a valid integer"}])),
+        ({"cursor": encode_cursor(42)}, ({"cursor": 42}, [])),
+        ({"cursor": "not-a-cursor"}, ({}, [{"field": "cursor", "message": "not a valid cursor"}])),
+        ({"fields": "title, author,title"}, ({"fields": ("title", "author")}, [])),
+        ({"fields": "title,isbn"}, ({}, [{"field": "fields", "message": "unknown fields: isbn"}])),
+        ({"include": "reviews", "reviews_limit": "99"}, ({"include": ("reviews",), "reviews_limit": 50}, [])),
+        ({"include": "authors"}, ({}, [{"field": "include", "message": "unknown includes: authors"}])),
+        ({"reviews_limit": "-1"}, ({}, [{"field": "reviews_limit", "message": "must not be negative"}])),
+        ({"title_prefix": "Ti", "year_from": "1990", "year_to": "x"}, ({"title_prefix": "Ti", "year_from": 1990}, [{"field": "year_to", "message": "not a valid integer"}])),
+        ({"ignore_case": "False"}, ({"ignore_case": False}, [])),
+        ({"ignore_case": "maybe"}, ({}, [{"field": "ignore_case", "message": "not a valid boolean"}])),
+        ({"title": "x" * 201, "id": 3}, ({"id": 3}, [{"field": "title", "message": "must be at most 200 characters"}])),
+        (None, ({}, [])),
+    ],
+)
+def test_validate_get_book_params_pagination(params, expected):
+    assert validate_get_book_params(params) == expected
+
+
+def test_decode_cursor():
+    assert decode_cursor(encode_cursor(7)) == 7
+    with pytest.raises(ValueError):
+        decode_cursor(encode_cursor("7"))
+
+
+def review_row(review_id, **overrides) -> dict:
+    row = {"id": review_id, "reviewer": "Reviewer", "rate": 4, "review": "Good", "book_id": 1}
+    row.update(overrides)
+    return row
+
+
+def test_insert_reviews_chunks(db_session, count_statements):
+    body = [review_row(1), review_row(2, rate="x"), "oops", review_row(3), review_row(4), review_row(5, reviewer=" ")]
+    result = insert_reviews(db_session, {"chunk_size": "2"}, body)
+
+    assert result["statusCode"] == 200
+    assert result["body"]["inserted"] == 3
+    assert result["body"]["failed"] == 3
+    assert result["body"]["results"] == [
+        {"index": 0, "status": "ok", "id": 1},
+        {"index": 1, "status": "error", "errors": [{"field": "rate", "message": "not a valid integer"}]},
+        {"index": 2, "status": "error", "errors": [{"field": "row", "message": "must be a JSON object"}]},
+        {"index": 3, "status": "ok", "id": 3},
+        {"index": 4, "status": "ok", "id": 4},
+        {"index": 5, "status": "error", "errors": [{"field": "reviewer", "message": "is required and was not included"}]},
+    ]
+    assert len([statement for statement in count_statements if statement.startswith("INSERT INTO review")]) == 2
+    assert [review.id for review in db_session.query(Review).order_by(Review.id)] == [1, 3, 4]
+
+
+@pytest.mark.parametrize(("transaction", "expected_ids"), [("single", []), ("chunk", [1, 2])])
+def test_insert_reviews_failed_chunk(db_session, transaction, expected_ids):
+    body = [review_row(1), review_row(2), review_row(3), review_row(3)]
+    result = insert_reviews(db_session, {"chunk_size": "2", "transaction": transaction}, body)
+
+    assert result["body"]["inserted"] == len(expected_ids)
+    assert result["body"]["results"][3] == {
+        "index": 3, "status": "error", "errors": [{"field": "row", "message": "not inserted"}]
+    }
+    assert [review.id for review in db_session.query(Review).order_by(Review.id)] == expected_ids
+
+
+@pytest.mark.parametrize(
+    ("params", "body", "expected"),
+    [
+        ({"chunk_size": "0"}, [], [{"field": "chunk_size", "message": "must be greater than 0"}]),
+        ({"transaction": "none"}, [], [{"field": "transaction", "message": "must be 'single' or 'chunk'"}]),
+        (None, {"id": 1}, [{"field": "body", "message": "must be a JSON array of reviews"}]),
+    ],
+)
+def test_insert_reviews_invalid(db_session, params, body, expected):
+    result = insert_reviews(db_session, params, body)
+    assert result["statusCode"] == 500
+    assert result["body"] == {"errors": expected}
+
+
+@patch('sql_alchemy_lambda.lambda_handler.get_db_session')
+def test_handler_review_batch(mock_get_db_session, db_session):
+    mock_get_db_session.return_value = db_session
+    event = {
+        "httpMethod": "POST",
+        "pathParameters": {"proxy": "review/batch"},
+        "queryStringParameters": None,
+        "body": json.dumps([review_row(1), review_row(2)]),
+    }
+    result = handler(event, None)
+    assert result["statusCode"] == 200
+    assert result["body"]["inserted"] == 2
 
-    mock_db_session.query().filter().filter().filter().filter().filter.assert_called_once()
-    assert mock_db_session.query().filter().filter().filter().filter().method_calls[0][0] == 'filter'
-    assert mock_db_session.query().filter().filter().filter().filter().method_calls[0][1][0].__str__() == 'book.year = :year_1'
 
+@patch('sql_alchemy_lambda.lambda_handler.get_db_session')
+def test_handler_get_book_without_params(mock_get_db_session, db_session):
+    mock_get_db_session.return_value = db_session
+    event = {"httpMethod": "GET", "pathParameters": {"proxy": "book"}, "queryStringParameters": None, "body": None}
+    reset_book_cache()
+    result = handler(event, None)
+    reset_book_cache()
+    assert result["statusCode"] == 200
+    assert len(result["body"]["data"]) == 25
@@ -0,0 +1,60 @@
+import os
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book
+from sql_alchemy_lambda.lambda_handler import get_book
+from sql_alchemy_lambda.migrations import main, migrate
+from sql_alchemy_lambda.utilities import reset_engines
+
+
+def create_old_database(uri: str):
+    # The book table as it was before rec_updated_ts, and no other table
+    engine = create_engine(uri)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE book (id INTEGER PRIMARY KEY, title VARCHAR(200) NOT NULL, "
+                "author VARCHAR(100) NOT NULL, publisher VARCHAR(100) NOT NULL, year INTEGER NOT NULL)"
+            )
+        )
+        connection.execute(text("INSERT INTO book VALUES (1, 'Old Title', 'Ann Lee', 'P', 2001)"))
+    return engine
+
+
+def test_migrate():
+    engine = create_old_database("sqlite://")
+    session = sessionmaker(bind=engine)()
+    try:
+        steps = migrate(session)
+        assert {"create table review", "create table book_rating"} <= set(steps)
+        assert steps[-1] == "add column book.rec_updated_ts"
+        session.commit()
+        assert session.execute(text("SELECT rec_updated_ts FROM book")).scalar() is not None
+        assert set(inspect(engine).get_table_names()) == set(BaseModel.metadata.tables)
+        indexes = session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'book'"))
+        assert {index.name for index in Book.__table__.indexes} <= set(indexes.scalars())
+
+        result = get_book(session, {})
+        assert result["statusCode"] == 200
+        assert [book["id"] for book in result["body"]["data"]] == [1]
+        # Already up to date
+        assert migrate(session) == []
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_main(tmp_path, capsys):
+    uri = "sqlite:///" + str(tmp_path / "books.db")
+    create_old_database(uri).dispose()
+    reset_engines()
+    try:
+        with patch.dict(os.environ, {"SQLALCHEMY_DATABASE_URI": uri}):
+            assert "add column book.rec_updated_ts" in main([])
+            assert main([]) == []
+        assert capsys.readouterr().out.strip().splitlines()[-1] == '{"steps": []}'
+    finally:
+        reset_engines()
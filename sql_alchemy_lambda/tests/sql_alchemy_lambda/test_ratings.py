@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, BookRating, Review
+from sql_alchemy_lambda.lambda_handler import get_top_books
+from sql_alchemy_lambda.ratings import AGGREGATE_COLUMNS, add_ratings, rebuild_ratings, rating_deltas
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([Book(id=i, title="Title", author="Author", publisher="P", year=2000) for i in range(1, 4)])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def ratings(db_session) -> dict:
+    return {
+        rating.book_id: tuple(getattr(rating, column) for column in AGGREGATE_COLUMNS)
+        for rating in db_session.query(BookRating)
+    }
+
+
+def test_rating_deltas():
+    assert rating_deltas([(1, 5), (2, 3), (1, 4), (1, 0)]) == [
+        {"book_id": 1, "review_count": 3, "rate_sum": 9, "rate_1": 0, "rate_2": 0, "rate_3": 0, "rate_4": 1, "rate_5": 1},
+        {"book_id": 2, "review_count": 1, "rate_sum": 3, "rate_1": 0, "rate_2": 0, "rate_3": 1, "rate_4": 0, "rate_5": 0},
+    ]
+
+
+@pytest.mark.parametrize("upsert", [True, False])
+def test_add_ratings_matches_rebuild(db_session, upsert, monkeypatch):
+    if not upsert:
+        monkeypatch.setattr("sql_alchemy_lambda.ratings.UPSERT_INSERTS", {})
+    rates = [(1, 5), (2, 1), (1, 3), (2, 2), (1, 5), (3, 4)]
+    for batch in (rates[:2], rates[2:3], rates[3:]):
+        db_session.execute(insert(Review), [{"reviewer": "R", "rate": rate, "book_id": book_id} for book_id, rate in batch])
+        add_ratings(db_session, batch)
+    db_session.commit()
+    incremental = ratings(db_session)
+    assert incremental[1] == (3, 13, 0, 0, 1, 0, 2)
+
+    assert rebuild_ratings(db_session) == 3
+    db_session.commit()
+    assert ratings(db_session) == incremental
+
+
+def test_rebuild_ratings_drops_stale(db_session):
+    add_ratings(db_session, [(1, 5)])
+    db_session.commit()
+    assert rebuild_ratings(db_session) == 0
+    assert ratings(db_session) == {}
+
+
+def test_get_top_books(db_session):
+    add_ratings(db_session, [(1, 5), (1, 4), (2, 5), (3, 4), (3, 5), (3, 5), (3, 3)])
+    db_session.commit()
+    result = get_top_books(db_session, {"n": "2"})
+    assert result["statusCode"] == 200
+    # 5.0 with one review, then 4.5 with two beats 4.25 with four
+    assert [(book["id"], book["rating"]["average"]) for book in result["body"]["data"]] == [(2, 5.0), (1, 4.5)]
+    assert result["body"]["data"][0]["title"] == "Title"
+    result = get_top_books(db_session, {"min_reviews": "3"})
+    assert [book["id"] for book in result["body"]["data"]] == [3]
+    assert result["body"]["data"][0]["rating"]["histogram"] == {"1": 0, "2": 0, "3": 1, "4": 1, "5": 2}
+
+
+def test_get_top_books_uses_index(db_session):
+    query = "SELECT book_id FROM book_rating WHERE review_count >= 2 ORDER BY {} DESC, review_count DESC, book_id DESC LIMIT 5"
+    average = str(BookRating.average.expression.compile(db_session.get_bind()))
+    plan = " ".join(row[3] for row in db_session.execute(text("EXPLAIN QUERY PLAN " + query.format(average))))
+    assert "ix_book_rating_average" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+@pytest.mark.parametrize(
+    ("params", "expected"),
+    [
+        ({"n": "0"}, [{"field": "n", "message": "must be greater than 0"}]),
+        (
+            {"n": "x", "min_reviews": "y"},
+            [{"field": "n", "message": "not a valid integer"}, {"field": "min_reviews", "message": "not a valid integer"}],
+        ),
+    ],
+)
+def test_get_top_books_invalid(db_session, params, expected):
+    result = get_top_books(db_session, params)
+    assert result["statusCode"] == 500
+    assert result["body"] == {"errors": expected}
@@ -0,0 +1,192 @@
+import os
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, Review
+from sql_alchemy_lambda.lambda_handler import get_search, insert_review, insert_reviews
+from sql_alchemy_lambda.search import (
+    SearchBackend,
+    SQLiteFTSBackend,
+    get_search_backend,
+    main,
+    rebuild_search,
+    reset_search_backends,
+    tokenize_query,
+)
+from sql_alchemy_lambda.utilities import reset_engines
+
+
+@pytest.fixture
+def unindexed_session():
+    reset_search_backends()
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            Book(id=1, title="The Dragon Road", author="Ann Lee", publisher="P", year=2001),
+            Book(id=2, title="Gardening", author="Bob Dragon", publisher="P", year=2002),
+            Book(id=3, title="Cooking", author="Cara Smith", publisher="P", year=2003),
+            Book(id=4, title="Sailing", author="Dan Jones", publisher="P", year=2004),
+        ]
+    )
+    session.add(Review(id=1, reviewer="Eve", rate=4, review="A dragon shows up in chapter two", book_id=3))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+    reset_search_backends()
+
+
+@pytest.fixture
+def db_session(unindexed_session):
+    assert rebuild_search(unindexed_session) == 4
+    unindexed_session.commit()
+    return unindexed_session
+
+
+@pytest.mark.parametrize(
+    ("q", "expected"),
+    [("Dragon road", ["dragon", "road"]), ('"dragon" OR title:* -x', ["dragon", "or", "title", "x"]), ("  ", [])],
+)
+def test_tokenize_query(q, expected):
+    assert tokenize_query(q) == expected
+
+
+def test_get_search_backend(db_session):
+    backend = get_search_backend(db_session)
+    assert isinstance(backend, SQLiteFTSBackend)
+    assert get_search_backend(db_session) is backend
+
+
+def test_search_backend_is_abstract():
+    class IncompleteBackend(SearchBackend):
+        def index_exists(self, db_session):
+            return True
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
+
+
+def test_requests_never_build_the_index(unindexed_session):
+    assert get_search_backend(unindexed_session) is None
+    result = get_search(unindexed_session, {"q": "dragon"})
+    assert result["statusCode"] == 503
+    assert result["body"] == {"error": "search index not built, run python -m sql_alchemy_lambda.search --rebuild"}
+    # Reviews are still written, the rebuild indexes them later
+    insert_review(unindexed_session, {"id": "2", "reviewer": "Fay", "rate": "5", "review": "Kraken", "book_id": "4"})
+    assert get_search_backend(unindexed_session) is None
+
+    rebuild_search(unindexed_session)
+    assert [book["id"] for book in get_search(unindexed_session, {"q": "kraken"})["body"]["data"]] == [4]
+
+
+@patch("sql_alchemy_lambda.search.time")
+def test_missing_index_is_remembered(mock_time, unindexed_session):
+    mock_time.time.return_value = 1000
+    with patch.object(SQLiteFTSBackend, "index_exists", return_value=False) as index_exists:
+        assert get_search_backend(unindexed_session) is None
+        assert get_search_backend(unindexed_session) is None
+        assert index_exists.call_count == 1
+
+        # Built by another process, found once the missing index is forgotten
+        mock_time.time.return_value = 1061
+        index_exists.return_value = True
+        assert isinstance(get_search_backend(unindexed_session), SQLiteFTSBackend)
+        assert index_exists.call_count == 2
+
+
+def test_get_search_not_supported():
+    db_session = MagicMock()
+    db_session.get_bind.return_value.dialect.name = "mysql"
+    result = get_search(db_session, {"q": "dragon"})
+    assert result["statusCode"] == 501
+    assert result["body"] == {"error": "search not supported"}
+    with pytest.raises(ValueError) as e_info:
+        rebuild_search(db_session)
+    assert e_info.value.__str__() == "search not supported by the mysql database"
+
+
+def test_main_rebuild(tmp_path, capsys):
+    uri = "sqlite:///" + str(tmp_path / "books.db")
+    engine = create_engine(uri)
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add(Book(id=1, title="Added Out Of Band", author="Ann Lee", publisher="P", year=2001))
+    session.commit()
+    reset_engines()
+    try:
+        with patch.dict(os.environ, {"SQLALCHEMY_DATABASE_URI": uri}):
+            assert main(["--rebuild"]) == 1
+        assert capsys.readouterr().out.strip() == '{"books": 1}'
+        assert [book["id"] for book in get_search(session, {"q": "band"})["body"]["data"]] == [1]
+    finally:
+        session.close()
+        engine.dispose()
+        reset_engines()
+
+
+def test_get_search_ranking(db_session):
+    result = get_search(db_session, {"q": "dragon"})
+    assert result["statusCode"] == 200
+    # title beats author beats review text
+    assert [book["id"] for book in result["body"]["data"]] == [1, 2, 3]
+    assert result["body"]["data"][0]["title"] == "The Dragon Road"
+    assert result["body"]["next_offset"] is None
+
+
+def test_get_search_all_words_and_syntax(db_session):
+    assert [book["id"] for book in get_search(db_session, {"q": "dragon road"})["body"]["data"]] == [1]
+    assert get_search(db_session, {"q": 'dragon" OR "sailing'})["body"]["data"] == []
+
+
+def test_get_search_pages(db_session):
+    first = get_search(db_session, {"q": "dragon", "limit": "2"})
+    assert [book["id"] for book in first["body"]["data"]] == [1, 2]
+    assert first["body"]["next_offset"] == 2
+    second = get_search(db_session, {"q": "dragon", "limit": "2", "offset": "2"})
+    assert [book["id"] for book in second["body"]["data"]] == [3]
+
+
+def test_insert_review_updates_index(db_session):
+    assert get_search(db_session, {"q": "kraken"})["body"]["data"] == []
+    insert_review(db_session, {"id": "2", "reviewer": "Fay", "rate": "5", "review": "Kraken attack", "book_id": "4"})
+    assert [book["id"] for book in get_search(db_session, {"q": "kraken"})["body"]["data"]] == [4]
+    assert [book["id"] for book in get_search(db_session, {"q": "sailing"})["body"]["data"]] == [4]
+
+
+def test_insert_reviews_updates_index(db_session):
+    get_search_backend(db_session)
+    db_session.add(Book(id=5, title="Unindexed", author="Gus", publisher="P", year=2005))
+    db_session.commit()
+    insert_reviews(
+        db_session,
+        {},
+        [
+            {"id": 2, "reviewer": "Fay", "rate": 5, "review": "Kraken attack", "book_id": 4},
+            {"id": 3, "reviewer": "Gil", "rate": 2, "review": "More kraken", "book_id": 4},
+            {"id": 4, "reviewer": "Hal", "rate": 3, "review": "Kraken again", "book_id": 5},
+        ],
+    )
+    assert [book["id"] for book in get_search(db_session, {"q": "kraken"})["body"]["data"]] == [4, 5]
+    assert [book["id"] for book in get_search(db_session, {"q": "unindexed"})["body"]["data"]] == [5]
+
+
+@pytest.mark.parametrize(
+    ("params", "expected"),
+    [
+        (None, [{"field": "q", "message": "is required and was not included"}]),
+        ({"q": "!!"}, [{"field": "q", "message": "is required and was not included"}]),
+        (
+            {"offset": "x", "q": "dragon", "limit": "0"},
+            [{"field": "limit", "message": "must be greater than 0"}, {"field": "offset", "message": "not a valid integer"}],
+        ),
+    ],
+)
+def test_get_search_invalid(db_session, params, expected):
+    result = get_search(db_session, params)
+    assert result["statusCode"] == 500
+    assert result["body"] == {"errors": expected}
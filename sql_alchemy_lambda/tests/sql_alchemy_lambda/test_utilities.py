@@ -0,0 +1,164 @@
+import datetime
+import enum
+import json
+import os
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from sql_alchemy_lambda.dbmodels import BaseModel, Book, Review
+from sql_alchemy_lambda import utilities
+from sql_alchemy_lambda.utilities import (
+    AlchemyEncoder,
+    dumps,
+    model_to_dict,
+    get_engine,
+    get_engine_options,
+    get_db_session,
+    get_connection_stats,
+    reset_engines,
+)
+
+
+@pytest.fixture
+def database_uri(tmp_path):
+    reset_engines()
+    yield "sqlite:///{}".format(tmp_path / "test.db")
+    reset_engines()
+
+
+def test_get_engine_options_default():
+    with patch.dict(os.environ, {}, clear=True):
+        options = get_engine_options()
+    assert options == {"pool_size": 1, "max_overflow": 0, "pool_pre_ping": True, "pool_recycle": 300}
+
+
+def test_get_engine_options_null_pool():
+    with patch.dict(os.environ, {"SQLALCHEMY_POOL_MODE": "null"}, clear=True):
+        options = get_engine_options()
+    assert options == {"poolclass": NullPool}
+
+
+def test_get_engine_options_query_cache_size():
+    with patch.dict(os.environ, {"SQLALCHEMY_POOL_MODE": "null", "SQLALCHEMY_QUERY_CACHE_SIZE": "50"}, clear=True):
+        options = get_engine_options()
+    assert options == {"poolclass": NullPool, "query_cache_size": 50}
+
+
+def test_get_engine_exception():
+    with patch.dict(os.environ, {}, clear=True):
+        with pytest.raises(ValueError) as e_info:
+            get_engine()
+    assert e_info.value.__str__() == "Unable to get 'SQLALCHEMY_DATABASE_URI' variable from environment"
+
+
+def test_get_engine_cached(database_uri):
+    with patch.dict(os.environ, {"SQLALCHEMY_DATABASE_URI": database_uri}, clear=True):
+        assert get_engine() is get_engine()
+
+
+def test_get_db_session_reuses_connection(database_uri):
+    with patch.dict(os.environ, {"SQLALCHEMY_DATABASE_URI": database_uri}, clear=True):
+        for _ in range(3):
+            db_session = get_db_session()
+            db_session.execute(text("select 1"))
+            db_session.close()
+    assert get_connection_stats() == {"opened": 1, "reused": 2}
+
+
+def test_get_db_session_null_pool(database_uri):
+    with patch.dict(
+        os.environ, {"SQLALCHEMY_DATABASE_URI": database_uri, "SQLALCHEMY_POOL_MODE": "null"}, clear=True
+    ):
+        for _ in range(2):
+            db_session = get_db_session()
+            db_session.execute(text("select 1"))
+            db_session.close()
+    assert get_connection_stats() == {"opened": 2, "reused": 0}
+
+
+JSON_BACKENDS = [
+    "stdlib",
+    pytest.param("orjson", marks=pytest.mark.skipif(utilities.orjson is None, reason="orjson is not installed")),
+]
+
+
+class Color(enum.Enum):
+    RED = "red"
+
+
+@pytest.fixture
+def book_session():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    book = Book(id=1, title="The Title", author="Joe Smith", publisher="Bobby Jones", year=1965)
+    book.reviews = [Review(id=1, reviewer="Ann", rate=5, review="Great"), Review(id=2, reviewer="Bob", rate=3, review="Fine")]
+    session.add(book)
+    session.commit()
+    session.expunge_all()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    yield session, statements
+    session.close()
+    engine.dispose()
+
+
+@pytest.mark.parametrize("backend", JSON_BACKENDS)
+def test_dumps_values(backend):
+    value = {
+        "when": datetime.datetime(2022, 3, 30, 12, 15, 1),
+        "day": datetime.date(2022, 3, 30),
+        "price": Decimal("9.99"),
+        "color": Color.RED,
+        "raw": b"abc",
+        "tags": {"a"},
+    }
+    with patch.dict(os.environ, {"JSON_BACKEND": backend}):
+        result = json.loads(dumps(value))
+    assert result == {
+        "when": "2022-03-30T12:15:01",
+        "day": "2022-03-30",
+        "price": "9.99",
+        "color": "red",
+        "raw": "YWJj",
+        "tags": ["a"],
+    }
+
+
+@pytest.mark.parametrize("backend", JSON_BACKENDS)
+def test_dumps_book_does_not_lazy_load(book_session, backend):
+    session, statements = book_session
+    book = session.get(Book, 1)
+    statements.clear()
+    with patch.dict(os.environ, {"JSON_BACKEND": backend}):
+        result = json.loads(dumps([book]))
+    assert statements == []
+    assert result == [{"id": 1, "title": "The Title", "author": "Joe Smith", "publisher": "Bobby Jones", "year": 1965}]
+
+
+@pytest.mark.parametrize("backend", JSON_BACKENDS)
+def test_dumps_book_with_reviews(book_session, backend):
+    session, statements = book_session
+    book = session.get(Book, 1)
+    with patch.dict(os.environ, {"JSON_BACKEND": backend}):
+        result = json.loads(dumps(book, include=("reviews", "book")))
+    assert [review["reviewer"] for review in result["reviews"]] == ["Ann", "Bob"]
+    assert "book" not in result["reviews"][0]
+
+
+def test_alchemy_encoder(book_session):
+    session, statements = book_session
+    review = session.get(Review, 2)
+    result = json.loads(json.dumps(review, cls=AlchemyEncoder, include=["book"]))
+    assert result["book"]["title"] == "The Title"
+    assert result == dict(model_to_dict(review), book=model_to_dict(review.book))
+
+
+def test_alchemy_encoder_unknown_type():
+    with pytest.raises(TypeError):
+        json.dumps(object(), cls=AlchemyEncoder)
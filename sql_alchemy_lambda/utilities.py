@@ -1,38 +1,201 @@
 import json
 import os
-from sqlalchemy import create_engine
+from typing import Sequence
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
+from sql_alchemy_lambda.dbmodels.base import JSON_CONVERTERS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Engines and sessionmakers live at module level so that they are created once per
+# lambda container and reused by every warm invocation.
+_engines = {}
+_session_makers = {}
+_connection_stats = {"opened": 0, "reused": 0}
+
+
+def model_to_dict(obj, include: Sequence[str] = (), _path: frozenset = frozenset()) -> dict:
+    """
+    Converts a model instance to a dict of its columns, plus the relationships named in ``include``.
+
+    Relationships that are not included are never touched, so they are not lazy loaded. An object
+    that is already being serialized further up the tree (a back reference) is skipped, so
+    ``include=("reviews", "book")`` can't recurse forever.
+    Args:
+        obj: model instance
+        include: relationship names to serialize, at every level
+    Returns:
+        dict: the serializable attributes of the instance
+    """
+    columns, relationships = obj.encoder_plan()
+    result = {key: getattr(obj, key) for key in columns}
+    path = _path | {id(obj)}
+    for name in relationships:
+        if name not in include:
+            continue
+        value = getattr(obj, name)
+        if value is None:
+            result[name] = None
+        elif isinstance(value, (list, tuple, set)):
+            result[name] = [model_to_dict(v, include, path) for v in value if id(v) not in path]
+        elif id(value) not in path:
+            result[name] = model_to_dict(value, include, path)
+    return result
+
+
+def _default(obj, include: Sequence[str] = ()):
+    if isinstance(obj.__class__, DeclarativeMeta):
+        return model_to_dict(obj, include)
+    for types, converter in JSON_CONVERTERS:
+        if isinstance(obj, types):
+            return converter(obj)
+    raise TypeError("Object of type {} is not JSON serializable".format(obj.__class__.__name__))
+
 
 class AlchemyEncoder(json.JSONEncoder):
+    """
+    JSON encoder for models, datetimes, Decimals, Enums and bytes.
+    Relationships are only serialized when named, e.g. ``json.dumps(book, cls=AlchemyEncoder, include=["reviews"])``.
+    """
+
+    def __init__(self, *args, include: Sequence[str] = (), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.include = tuple(include)
 
     def default(self, obj):
-        if isinstance(obj.__class__, DeclarativeMeta):
-            # an SQLAlchemy class
-            fields = {}
-            for field in [x for x in dir(obj) if not x.startswith('_') and x != 'metadata']:
-                data = obj.__getattribute__(field)
-                try:
-                    json.dumps(data)  # this will fail on non-encodable values, like other classes
-                    fields[field] = data
-                except TypeError:
-                    fields[field] = None
-            # a json-encodable dict
-            return fields
-
-        return json.JSONEncoder.default(self, obj)
+        return _default(obj, self.include)
+
+
+def get_json_backend() -> str:
+    """
+    Returns:
+        str: "orjson" when it is installed, unless JSON_BACKEND=stdlib, otherwise "stdlib"
+    """
+    if orjson is not None and os.environ.get("JSON_BACKEND", "orjson").strip().lower() != "stdlib":
+        return "orjson"
+    return "stdlib"
+
+
+def dumps(obj, include: Sequence[str] = ()) -> str:
+    """
+    Serializes models and plain values to a JSON string with the fastest available backend
+    Args:
+        obj: what to serialize
+        include: relationship names to serialize, see model_to_dict
+    Returns:
+        str: JSON
+    """
+    if get_json_backend() == "orjson":
+        return orjson.dumps(
+            obj, default=lambda value: _default(value, include), option=orjson.OPT_PASSTHROUGH_DATETIME
+        ).decode("utf-8")
+    return json.dumps(obj, cls=AlchemyEncoder, include=include)
+
+
+def get_engine_options() -> dict:
+    """
+    Builds the create_engine keyword arguments from the environment.
+
+    ``SQLALCHEMY_POOL_MODE=null`` keeps the previous NullPool behaviour, which is what you want
+    when an RDS proxy sits in front of the database. Otherwise a small bounded pool is used,
+    sized by ``SQLALCHEMY_POOL_SIZE``, ``SQLALCHEMY_MAX_OVERFLOW``, ``SQLALCHEMY_POOL_PRE_PING``
+    and ``SQLALCHEMY_POOL_RECYCLE``. ``SQLALCHEMY_QUERY_CACHE_SIZE`` sizes the compiled SQL cache.
+    Returns:
+        dict: create_engine keyword arguments
+    """
+    if os.environ.get("SQLALCHEMY_POOL_MODE", "queue").strip().lower() == "null":
+        options = {"poolclass": NullPool}
+    else:
+        options = {
+            "pool_size": int(os.environ.get("SQLALCHEMY_POOL_SIZE", "1")),
+            "max_overflow": int(os.environ.get("SQLALCHEMY_MAX_OVERFLOW", "0")),
+            "pool_pre_ping": os.environ.get("SQLALCHEMY_POOL_PRE_PING", "true").strip().lower() == "true",
+            "pool_recycle": int(os.environ.get("SQLALCHEMY_POOL_RECYCLE", "300")),
+        }
+    if os.environ.get("SQLALCHEMY_QUERY_CACHE_SIZE", "").strip() != "":
+        options["query_cache_size"] = int(os.environ["SQLALCHEMY_QUERY_CACHE_SIZE"])
+    return options
+
+
+def _on_connect(dbapi_connection, connection_record):
+    _connection_stats["opened"] += 1
+
+
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    if connection_record.info.get("checked_out"):
+        _connection_stats["reused"] += 1
+    connection_record.info["checked_out"] = True
+
+
+def get_engine(database_uri: str = None) -> Engine:
+    """
+    Gets the engine for the database, creating it on the first call in this container
+    Args:
+        database_uri: str
+            defaults to the SQLALCHEMY_DATABASE_URI environment variable
+    Returns:
+        Engine: the cached engine
+    """
+    database_uri = database_uri or os.environ.get("SQLALCHEMY_DATABASE_URI")
+    if database_uri is None or database_uri == "":
+        raise ValueError("Unable to get 'SQLALCHEMY_DATABASE_URI' variable from environment")
+    engine = _engines.get(database_uri)
+    if engine is None:
+        engine = create_engine(database_uri, **get_engine_options())
+        event.listen(engine, "connect", _on_connect)
+        event.listen(engine, "checkout", _on_checkout)
+        _engines[database_uri] = engine
+    return engine
+
+
+def get_session_maker(database_uri: str = None) -> sessionmaker:
+    """
+    Gets the sessionmaker bound to the cached engine
+    Args:
+        database_uri: str
+            defaults to the SQLALCHEMY_DATABASE_URI environment variable
+    Returns:
+        sessionmaker: the cached sessionmaker
+    """
+    engine = get_engine(database_uri)
+    session_maker = _session_makers.get(engine.url)
+    if session_maker is None:
+        session_maker = sessionmaker(bind=engine)
+        _session_makers[engine.url] = session_maker
+    return session_maker
 
 
 def get_db_session():
     """
-    Creates a session to the database after creating a connection
+    Creates a session to the database, reusing the engine and its connections across invocations
     :return: Session()
     """
-    Session = sessionmaker(
-        bind=create_engine(
-            os.environ.get("SQLALCHEMY_DATABASE_URI"), poolclass=NullPool
-        )
-    )
+    Session = get_session_maker()
     return Session()
+
+
+def get_connection_stats() -> dict:
+    """
+    Returns:
+        dict: how many database connections have been opened and how many checkouts reused one
+    """
+    return dict(_connection_stats)
+
+
+def reset_engines():
+    """
+    Disposes every cached engine and clears the registry and counters. Meant for tests.
+    """
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+    _session_makers.clear()
+    _connection_stats["opened"] = 0
+    _connection_stats["reused"] = 0
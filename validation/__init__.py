@@ -0,0 +1,2 @@
+# Request validation shared by lambdaCode and sql_alchemy_lambda
+from validation.schema import Field, MISSING, compile_schema
@@ -0,0 +1,298 @@
+from typing import Callable, Iterable, List, Tuple
+
+# Default of fields that are left out of the validated values when they are missing
+MISSING = object()
+
+TRUE_VALUES = ("true", "1", "yes")
+FALSE_VALUES = ("false", "0", "no")
+
+DEFAULT_MESSAGES = {
+    "required": "is required and was not included",
+    "int": "not a valid integer",
+    "bool": "not a valid boolean",
+    "max_length": "must be at most {max_length} characters",
+    "range": "must be between {minimum} and {maximum}",
+    "minimum": "must be at least {minimum}",
+    "positive": "must be greater than 0",
+    "non_negative": "must not be negative",
+    "maximum": "must be at most {maximum}",
+    "choices": "must be one of {choices}",
+    "unknown": "unknown {name}: {unknown}",
+    "type": "must be a string",
+}
+
+
+class Field(object):
+    """
+    Declares one request param: how it is read, checked and converted.
+
+    Values that are not strings, e.g. from a JSON body, are read as their str() unless
+    ``coerce=False``, except that bool fields take JSON booleans as they are. A value that is
+    only whitespace counts as missing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: type = str,
+        required: bool = False,
+        default=MISSING,
+        minimum: int = None,
+        maximum: int = None,
+        clamp: int = None,
+        max_length: int = None,
+        choices: Iterable[str] = None,
+        many: bool = False,
+        strip: bool = False,
+        parse: Callable = None,
+        key: str = None,
+        coerce: bool = True,
+        messages: dict = None,
+    ):
+        """
+        Args:
+            name: str
+                param name
+            kind: type
+                str, int or bool
+            required: bool
+            default:
+                value when the param is missing, it is left out of the values by default
+            minimum: int
+            maximum: int
+                inclusive bounds of an int, out of bounds values are errors
+            clamp: int
+                caps an int at this value instead
+            max_length: int
+                of a str, e.g. the length of its String column
+            choices: Iterable[str]
+                allowed values
+            many: bool
+                a comma separated list, read into a tuple without blanks or duplicates
+            strip: bool
+                strip the whitespace around a str
+            parse: Callable
+                converts the str itself, raising ValueError with the error message
+            key: str
+                name of the validated value, defaults to the param name
+            coerce: bool
+                read values that are not strings as their str(), they are errors otherwise
+            messages: dict
+                overrides DEFAULT_MESSAGES for this field
+        """
+        self.name = name
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.clamp = clamp
+        self.max_length = max_length
+        self.choices = tuple(choices) if choices is not None else None
+        self.many = many
+        self.strip = strip
+        self.parse = parse
+        self.key = key or name
+        self.coerce = coerce
+        self.messages = dict(DEFAULT_MESSAGES, **(messages or {}))
+
+    def message(self, name: str, **kwargs) -> str:
+        return self.messages[name].format(
+            name=self.name,
+            minimum=self.minimum,
+            maximum=self.maximum,
+            max_length=self.max_length,
+            choices=", ".join(self.choices or ()),
+            **kwargs
+        )
+
+
+def _bounds_message(field: Field) -> str:
+    if field.minimum is not None and field.maximum is not None:
+        return field.message("range")
+    if field.minimum is not None:
+        if field.minimum == 0:
+            return field.message("non_negative")
+        if field.minimum == 1:
+            return field.message("positive")
+        return field.message("minimum")
+    return field.message("maximum")
+
+
+def _compile_many(field: Field) -> Callable[[str], tuple]:
+    """
+    Builds the converter of a ``many`` field, which reads the stripped value into a tuple and
+    raises ValueError with the error message. Every other kind is inlined by _field_source().
+    Args:
+        field: Field
+    Returns:
+        Callable: converter
+    """
+    choices = frozenset(field.choices) if field.choices is not None else None
+
+    def convert_many(stripped: str) -> tuple:
+        items = tuple(dict.fromkeys(item.strip() for item in stripped.split(",") if item.strip() != ""))
+        if choices is not None:
+            unknown = [item for item in items if item not in choices]
+            if len(unknown) > 0:
+                raise ValueError(field.message("unknown", unknown=", ".join(unknown)))
+        return items
+
+    return convert_many
+
+
+def _field_source(index: int, field: Field, namespace: dict) -> List[str]:
+    """
+    Writes the statements that validate the str ``raw`` of one field. They are inlined for str,
+    int and bool so the common case is a few comparisons, and blank values are skipped as
+    missing. Constants go through ``namespace`` rather than the source.
+    """
+    name, key = repr(field.name), repr(field.key)
+    constant = "_{}_{}".format
+
+    def error(message: str) -> str:
+        return "errors.append({{'field': {}, 'message': {}}})".format(name, message)
+
+    lines = []
+    if field.parse is not None:
+        namespace[constant("parse", index)] = field.parse
+        lines += [
+            "if raw != '' and not raw.isspace():",
+            "    try:",
+            "        values[{}] = {}({})".format(key, constant("parse", index), "raw.strip()" if field.strip else "raw"),
+            "    except ValueError as e:",
+            "        " + error("e.__str__()"),
+        ]
+    elif field.many:
+        namespace[constant("convert", index)] = _compile_many(field)
+        lines += [
+            "stripped = raw.strip()",
+            "if stripped != '':",
+            "    try:",
+            "        values[{}] = {}(stripped)".format(key, constant("convert", index)),
+            "    except ValueError as e:",
+            "        " + error("e.__str__()"),
+        ]
+    elif field.kind is bool:
+        namespace[constant("bool", index)] = field.message("bool")
+        lines += [
+            "lowered = raw.strip().lower()",
+            "if lowered in TRUE_VALUES:",
+            "    values[{}] = True".format(key),
+            "elif lowered in FALSE_VALUES:",
+            "    values[{}] = False".format(key),
+            "elif lowered != '':",
+            "    " + error(constant("bool", index)),
+        ]
+    elif field.kind is int:
+        # int() ignores surrounding whitespace itself, only a failed conversion needs strip(). It
+        # also reads "1_000" and non-ASCII digits, which are not valid here.
+        namespace[constant("int", index)] = field.message("int")
+        lines += [
+            "try:",
+            "    value = int(raw)",
+            "except ValueError:",
+            "    if raw.strip() != '':",
+            "        " + error(constant("int", index)),
+            "else:",
+            "    if '_' in raw or not raw.isascii():",
+            "        " + error(constant("int", index)),
+        ]
+        bounds = []
+        if field.minimum is not None:
+            bounds.append("value < {!r}".format(field.minimum))
+        if field.maximum is not None:
+            bounds.append("value > {!r}".format(field.maximum))
+        if len(bounds) > 0:
+            namespace[constant("bounds", index)] = _bounds_message(field)
+            lines += ["    elif {}:".format(" or ".join(bounds)), "        " + error(constant("bounds", index))]
+        if field.clamp is not None:
+            lines += ["    elif value > {!r}:".format(field.clamp), "        values[{}] = {!r}".format(key, field.clamp)]
+        lines += ["    else:", "        values[{}] = value".format(key)]
+    else:
+        lines += ["if raw != '' and not raw.isspace():", "    value = {}".format("raw.strip()" if field.strip else "raw")]
+        branch = "if"
+        if field.max_length is not None:
+            namespace[constant("length", index)] = field.message("max_length")
+            lines += ["    if len(value) > {!r}:".format(field.max_length), "        " + error(constant("length", index))]
+            branch = "elif"
+        if field.choices is not None:
+            namespace[constant("choices", index)] = frozenset(field.choices)
+            namespace[constant("choices_message", index)] = field.message("choices")
+            lines += [
+                "    {} value not in {}:".format(branch, constant("choices", index)),
+                "        " + error(constant("choices_message", index)),
+            ]
+            branch = "elif"
+        if branch == "if":
+            lines.append("    values[{}] = value".format(key))
+        else:
+            lines += ["    else:", "        values[{}] = value".format(key)]
+    return lines
+
+
+def _add_required(values: dict, errors: list, required: tuple, order: dict):
+    """
+    Reports the required fields that are missing, unless they already have an error, keeping
+    the errors in field order
+    """
+    invalid = {error["field"] for error in errors}
+    for index, name, key, message in required:
+        if key not in values and name not in invalid:
+            errors.append({"field": name, "message": message})
+    errors.sort(key=lambda error: order[error["field"]])
+
+
+def compile_schema(fields: List[Field]) -> Callable[[dict], Tuple[dict, list]]:
+    """
+    Compiles field specs into a validator function.
+
+    The source of the validator is generated once per schema, with every field's checks inlined,
+    so a call costs about what hand written checks would.
+    Args:
+        fields: List[Field]
+    Returns:
+        Callable: validator, taking the params (None is read as no params) and returning the
+        validated values and a list of {"field", "message"} errors in field order
+    """
+    namespace = {"TRUE_VALUES": TRUE_VALUES, "FALSE_VALUES": FALSE_VALUES, "_add_required": _add_required}
+    namespace["_defaults"] = {field.key: field.default for field in fields if field.default is not MISSING}
+    namespace["_required"] = tuple(
+        (index, field.name, field.key, field.message("required")) for index, field in enumerate(fields) if field.required
+    )
+    namespace["_order"] = {field.name: index for index, field in enumerate(fields)}
+    body = [
+        "def validate(params):",
+        "    values = dict(_defaults)" if len(namespace["_defaults"]) > 0 else "    values = {}",
+        "    errors = []",
+        "    if params is None:",
+        "        params = {}",
+    ]
+    for index, field in enumerate(fields):
+        name = repr(field.name)
+        body += ["    if {} in params:".format(name), "        raw = params[{}]".format(name)]
+        indent = "        "
+        is_bool = field.kind is bool and field.parse is None
+        if is_bool:
+            # JSON booleans are taken as they are
+            body += [indent + "if raw is True or raw is False:", indent + "    values[{!r}] = raw".format(field.key), indent + "else:"]
+            indent += "    "
+        body.append(indent + "if type(raw) is not str:")
+        # None and blank values are skipped as missing
+        if field.coerce:
+            body.append(indent + "    raw = '' if raw is None else str(raw)")
+        else:
+            # A bool field only takes booleans and their strings, so the bool message says more
+            namespace["_type_{}".format(index)] = field.message("bool" if is_bool else "type")
+            body += [
+                indent + "    if raw is not None:",
+                indent + "        errors.append({{'field': {}, 'message': _type_{}}})".format(name, index),
+                indent + "    raw = ''",
+            ]
+        body += [indent + line for line in _field_source(index, field, namespace)]
+    if len(namespace["_required"]) > 0:
+        missing = " or ".join("{!r} not in values".format(key) for _, _, key, _ in namespace["_required"])
+        body += ["    if {}:".format(missing), "        _add_required(values, errors, _required, _order)"]
+    body.append("    return values, errors")
+    exec(compile("\n".join(body), "<schema {}>".format(", ".join(field.name for field in fields)), "exec"), namespace)
+    return namespace["validate"]
@@ -0,0 +1,95 @@
+import pytest
+
+from validation import Field, compile_schema
+
+REVIEW = compile_schema(
+    [
+        Field("id", int, required=True),
+        Field("reviewer", required=True, max_length=5),
+        Field("rate", int, required=True, minimum=1, maximum=5),
+        Field("limit", int, minimum=1, clamp=10, default=3),
+        Field("tags", many=True, choices=("a", "b")),
+        Field("mode", strip=True, choices=("x", "y"), default="x"),
+        Field("flag", bool),
+        Field("strict", coerce=False),
+        Field("exact", bool, coerce=False),
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    ("params", "expected"),
+    [
+        (
+            {"id": " 7 ", "reviewer": "Ann", "rate": 5, "flag": "Yes", "tags": "b, a,b", "mode": " y "},
+            {"id": 7, "reviewer": "Ann", "rate": 5, "limit": 3, "flag": True, "tags": ("b", "a"), "mode": "y"},
+        ),
+        ({"id": "1", "reviewer": "Bob", "rate": "1", "limit": "99", "flag": "false"}, {"id": 1, "reviewer": "Bob", "rate": 1, "limit": 10, "mode": "x", "flag": False}),
+        ({"id": 2, "reviewer": "Cy", "rate": 3, "flag": True, "exact": False}, {"id": 2, "reviewer": "Cy", "rate": 3, "limit": 3, "mode": "x", "flag": True, "exact": False}),
+    ],
+)
+def test_valid(params, expected):
+    assert REVIEW(params) == (expected, [])
+
+
+@pytest.mark.parametrize(
+    ("params", "expected"),
+    [
+        (
+            None,
+            [
+                {"field": "id", "message": "is required and was not included"},
+                {"field": "reviewer", "message": "is required and was not included"},
+                {"field": "rate", "message": "is required and was not included"},
+            ],
+        ),
+        (
+            {"id": "x", "reviewer": "  ", "rate": "6", "limit": "0", "tags": "a,c", "mode": "z", "flag": "maybe", "strict": 1, "exact": 0},
+            [
+                {"field": "id", "message": "not a valid integer"},
+                {"field": "reviewer", "message": "is required and was not included"},
+                {"field": "rate", "message": "must be between 1 and 5"},
+                {"field": "limit", "message": "must be greater than 0"},
+                {"field": "tags", "message": "unknown tags: c"},
+                {"field": "mode", "message": "must be one of x, y"},
+                {"field": "flag", "message": "not a valid boolean"},
+                {"field": "strict", "message": "must be a string"},
+                {"field": "exact", "message": "not a valid boolean"},
+            ],
+        ),
+        ({"id": 1, "reviewer": "Annabel", "rate": None}, [
+            {"field": "reviewer", "message": "must be at most 5 characters"},
+            {"field": "rate", "message": "is required and was not included"},
+        ]),
+    ],
+)
+def test_errors(params, expected):
+    values, errors = REVIEW(params)
+    assert errors == expected
+    assert "id" not in values or type(values["id"]) == int
+
+
+@pytest.mark.parametrize("value", ["1_000", "\u0661\u0662", "1.5"])
+def test_int_only_plain_digits(value):
+    values, errors = REVIEW({"id": value, "reviewer": "Ann", "rate": "1"})
+    assert "id" not in values
+    assert errors == [{"field": "id", "message": "not a valid integer"}]
+
+
+def test_strict_bool_message():
+    validate = compile_schema([Field("ok", bool, coerce=False, messages={"bool": "must be a bool"})])
+    assert validate({"ok": "yes"}) == ({"ok": True}, [])
+    assert validate({"ok": 1}) == ({}, [{"field": "ok", "message": "must be a bool"}])
+    assert validate({"ok": [True]}) == ({}, [{"field": "ok", "message": "must be a bool"}])
+
+
+def test_parse_and_key():
+    def parse_words(value: str) -> list:
+        words = value.split()
+        if len(words) == 0:
+            raise ValueError("needs a word")
+        return words
+
+    validate = compile_schema([Field("q", required=True, parse=parse_words, key="words")])
+    assert validate({"q": "two words"}) == ({"words": ["two", "words"]}, [])
+    assert validate({"q": "   "}) == ({}, [{"field": "q", "message": "is required and was not included"}])